@@ -1,60 +1,109 @@
 import json
-import openai
 import os
-from typing import List, Dict, Any, Optional, Union
+from typing import Callable, List, Dict, Any, Optional, Union
 from tools.tool_functions import TOOL_FUNCTIONS
-from memory.memory import Memory
+from tools.tools import get_registry, get_tools, refresh as refresh_tools
+from agent.llm import get_client
+from memory.memory import Memory, MemoryStore, MEMORY_STORE
+
+# Receives the progress events of a run: {"type": "tool", "name": ...} for every tool call, and
+# {"type": "dataframe", "name": ..., "data": DataFrame} for tables meant for the user
+EventHandler = Callable[[Dict[str, Any]], None]
+
+def streamlit_events(event: Dict[str, Any]):
+    """Render the progress events of a run in the current Streamlit page."""
+    import streamlit as st
+    # Steps of the pre-planning path (see handle_question), tool calls of the ReAct agent
+    label = event["name"] if event["type"] == "step" else f"Tool called: {event['name']}"
+    st.markdown(f"<span style='color:#00a0b0'>**{label}**</span>", unsafe_allow_html=True)
+    if event["type"] == "dataframe":
+        st.write("### Dataset Preview:")
+        st.dataframe(event["data"])
 
 class ReActAgent:
     """
     ReAct agent that uses function calling to answer questions about the dataset.
     """
     
-    def __init__(self, tools: List[Dict[str, Any]]):
+    def __init__(self, tools: Optional[List[Dict[str, Any]]] = None, session_id: Optional[str] = None,
+                 memory_store: Optional[MemoryStore] = None, client=None):
         """
         Initialize the ReAct agent with tools.
         
         Args:
-            tools: List of tools available to the agent
+            tools: List of tools available to the agent (defaults to the shared
+                schemas of the current dataset, looked up on every run)
+            session_id: Session or user id selecting the memory partition
+            memory_store: Partitioned memory store (defaults to the process-wide store)
+            client: OpenAI client (defaults to the process-wide client)
         """
-        self.tools = tools
-        self.tool_map = {tool["function"]["name"]: tool for tool in tools if "function" in tool}
+        self._tools = tools
         
         # Get API key from environment variable
         self.api_key = os.environ.get("NEBIUS_API_KEY")
         if not self.api_key:
             raise ValueError("NEBIUS_API_KEY environment variable not set")
         
-        # Initialize OpenAI client with Nebius API endpoint
-        self.client = openai.OpenAI(
-            base_url="https://api.studio.nebius.com/v1/",
-            api_key=self.api_key
-        )
+        # OpenAI client of the Nebius API endpoint; the process-wide one is created on first use
+        self._client = client
         
-        # Initialize memory
-        self.memory = Memory()
+        # Memory is partitioned per session and loaded lazily on first use
+        self.session_id = session_id
+        self.memory_store = memory_store or MEMORY_STORE
         
         # Track tools used in the last run
         self._last_tools_used = []
         
-    def run(self, query: str) -> str:
+        # Cursor of the last paged tool result, so the UI can fetch further pages without the LLM
+        self.last_pager: Optional[Dict[str, Any]] = None
+        
+        # Last file exported by the export_data tool, offered for download by the UI
+        self.last_export: Optional[Dict[str, Any]] = None
+    
+    @property
+    def client(self):
+        """OpenAI client of the Nebius API endpoint"""
+        return self._client if self._client is not None else get_client()
+    
+    @property
+    def tools(self) -> List[Dict[str, Any]]:
+        """Tools available to the agent"""
+        return self._tools if self._tools is not None else get_tools()
+    
+    @property
+    def last_tools_used(self) -> List[str]:
+        """Tools called during the last run, in order of first use"""
+        return self._last_tools_used
+    
+    @property
+    def memory(self) -> Memory:
+        """Memory partition of this agent's session"""
+        return self.memory_store.get(self.session_id)
+        
+    def run(self, query: str, on_event: Optional[EventHandler] = streamlit_events) -> str:
         """
         Run the agent to answer the user's query using ReActive approach.
         
         Args:
             query: User's question
+            on_event: Receiver of the progress events (rendered in Streamlit by default, None to drop them)
             
         Returns:
             Agent's response
         """
         # Reset tools used tracking
         self._last_tools_used = []
+        self.last_pager = None
+        self.last_export = None
+        
+        # Pick up rows ingested since the last question
+        refresh_tools()
         
         # Get relevant memories
         relevant_memories = self.memory.get_relevant_memories(query, self.client)
         
         # Run the agent with ReActive approach
-        response = self._run_reactive(query, relevant_memories)
+        response = self._run_reactive(query, relevant_memories, on_event)
         
         # Add tools used to the response, each on a separate line with green-blue marking
         if self._last_tools_used:
@@ -72,13 +121,15 @@ class ReActAgent:
         
         return response
     
-    def _run_reactive(self, query: str, relevant_memories: str = "") -> str:
+    def _run_reactive(self, query: str, relevant_memories: str = "",
+                      on_event: Optional[EventHandler] = None) -> str:
         """
         Run the agent in ReActive mode (dynamic planning).
         
         Args:
             query: User's question
             relevant_memories: Relevant information from past interactions
+            on_event: Optional receiver of the progress events
             
         Returns:
             Agent's response
@@ -130,17 +181,21 @@ class ReActAgent:
                     # Call the appropriate tool function
                     tool_result = self._execute_tool(function_name, function_args)
                     
+                    if "next_cursor" in tool_result:
+                        self.last_pager = {"tool": function_name, "cursor": tool_result["next_cursor"],
+                                           "total": tool_result.get("total_matching")}
+                    if "export_path" in tool_result:
+                        self.last_export = {"path": tool_result.pop("export_path"), "rows": tool_result["rows"],
+                                            "format": tool_result["format"]}
+                    
                     # Special handling for show_dataframe to display pandas dataframe
-                    if function_name == "show_dataframe" and "pandas_df" in tool_result:
-                        import streamlit as st
-                        st.markdown(f"<span style='color:#00a0b0'>**Tool called: {function_name}**</span>", unsafe_allow_html=True)
-                        st.write("### Dataset Preview:")
-                        st.dataframe(tool_result["pandas_df"])
-                        # Remove the pandas_df from the result to avoid serialization issues
-                        del tool_result["pandas_df"]
-                    else:
-                        import streamlit as st
-                        st.markdown(f"<span style='color:#00a0b0'>**Tool called: {function_name}**</span>", unsafe_allow_html=True)
+                    # (removed from the result to avoid serialization issues)
+                    pandas_df = tool_result.pop("pandas_df", None)
+                    if on_event is not None:
+                        if function_name == "show_dataframe" and pandas_df is not None:
+                            on_event({"type": "dataframe", "name": function_name, "data": pandas_df})
+                        else:
+                            on_event({"type": "tool", "name": function_name})
                     
                     # Add the function response to messages
                     messages.append({
@@ -169,6 +224,12 @@ class ReActAgent:
         if function_name not in TOOL_FUNCTIONS:
             return {"error": f"Function {function_name} not implemented"}
         
+        # Intent/category names are validated here rather than by enums in the schema
+        try:
+            function_args = get_registry().validate_arguments(function_name, function_args)
+        except ValueError as e:
+            return {"error": str(e)}
+        
         try:
             return TOOL_FUNCTIONS[function_name](**function_args)
         except Exception as e:
@@ -191,8 +252,7 @@ Follow these steps:
 5. When you have the final answer, call the finish tool
 
 The dataset contains customer service conversations with intents and categories.
-The dataset includes various intents like edit_account, switch_account, check_invoice, etc.
-Categories include ACCOUNT, ORDER, REFUND, INVOICE, etc.
+""" + get_registry().vocabulary_prompt() + """
 
 For out-of-scope questions not related to the dataset, politely explain that you can only answer questions about the customer service dataset.
 """
@@ -0,0 +1,29 @@
+import os
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Get the process-wide OpenAI client of the Nebius endpoint, created on first use.
+
+    The client is thread-safe and keeps a pool of connections, so every
+    session, job and tool of the process shares it instead of opening its own.
+
+    Returns:
+        The OpenAI client
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+
+            api_key = os.environ.get("NEBIUS_API_KEY")
+            if not api_key:
+                raise ValueError("NEBIUS_API_KEY environment variable is not set")
+            _client = OpenAI(
+                base_url="https://api.studio.nebius.com/v1/",
+                api_key=api_key
+            )
+    return _client
@@ -3,34 +3,35 @@ import pandas as pd
 import os
 from dotenv import load_dotenv
 import json
-from typing import Literal
+from typing import Literal, Optional
 from pydantic import BaseModel, Field
-from openai import OpenAI
 import re
+from engine.query_plan import QueryPlan
 # Removed global streamlit import
 
 class CodeResponse(BaseModel):
     thoughts: str = Field(..., description="Step-by-step reasoning about the query")
     scope: bool = Field(..., description='boolean value. True if the user question is in-scope. False if the user question is out-of-scope') 
-    pandas_code: str = Field(..., description="A complete pandas code snippet that assigns to variable 'result'")
+    query_plan: Optional[QueryPlan] = Field(None, description="Query plan answering the question. null if out-of-scope or if the question can't be expressed as a plan")
+    pandas_code: str = Field("", description="Only when query_plan is null: a complete pandas code snippet that assigns to variable 'result'")
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client with API key from environment
-api_key = os.environ.get("NEBIUS_API_KEY")
-if not api_key:
-    raise ValueError("NEBIUS_API_KEY environment variable is not set")
+# Shared with the ReActive agent and the tools
+from agent.llm import get_client
 
-client = OpenAI(
-    base_url="https://api.studio.nebius.com/v1/",
-    api_key=api_key
-)
+# Datasets are loaded by the catalog; every question runs on the dataset of the current session
+from data.catalog import current_dataset
+from engine.jobs import JobCancelledError
+from engine.sandbox import SANDBOX_WORKERS, SANDBOX_MAX_ROWS, get_sandbox_executor
+from engine.render import render_result
+from memory.code_cache import CodeCache
 
-# Load Bitext dataset from CSV
-from data.download_dataset import load_dataset_df
+# Validated code of previously answered questions
+code_cache = CodeCache()
 
-df = load_dataset_df()
+OUT_OF_SCOPE_MESSAGE = "Sorry, that question is out of scope for this dataset. If you're not sure what kind of data I have, feel free to ask me."
 
 def remove_think_tags(text):
     """Remove all content between <think> and </think> tags, including the tags."""
@@ -43,78 +44,102 @@ def fix_non_ascii_operators(code):
             .replace("≠", "!=")
     )
 
+def check_code(code, plan):
+    """Reject generated code that has no query plan and doesn't assign to 'result'."""
+    if plan is None and not code.strip().startswith("result ="):
+        raise SyntaxError("Code must assign to variable 'result'")
+
 # Prompt
 
 def make_prompt(user_query, history, mode):
+    # Rendered once per dataset (or prebuilt in the warm-start bundle)
+    fragments = current_dataset().prompt_fragments
     messages = [{"role": "system", "content": f"""You are a helpful data analyst assistant working on a customer support dataset.
-        The schema of the dataset is: {str(df.dtypes.to_dict())}.
-        The unique values of the category column are: {str(list(df['category'].unique()))}.
-        The unique values of the intent column are: {str(list(df['intent'].unique()))}.
+        The schema of the dataset is: {fragments['dtypes']}.
+        The unique values of the category column are: {fragments['categories']}.
+        The unique values of the intent column are: {fragments['intents']}.
 
-        Given a user question, respond in strict JSON format with three fields:
-        - 'thoughts': a string explaining your reasoning before the decision about the scope and generating the code.
+        Given a user question, respond in strict JSON format with four fields:
+        - 'thoughts': a string explaining your reasoning before the decision about the scope and generating the query.
         - 'scope': a boolean. True if the user question is in-scope. False if the user question is out-of-scope.
-        - 'pandas_code': a single valid Python statement that assigns a DataFrame or Series to a variable named 'result'. If the scope field is False the pandas_code field will contain an empty string ''.
+        - 'query_plan': a query plan answering the question, or null if the scope field is False or the question can't be expressed as a plan.
+        - 'pandas_code': only when query_plan is null and scope is True, a single valid Python statement that assigns a DataFrame or Series to a variable named 'result'. Otherwise an empty string ''.
+
+        A query plan has the fields:
+        - 'filters': list of {{"column", "op", "value"}}, all of which must match. 'op' is one of eq, ne, in, not_in (value is a list), contains, not_contains (case-insensitive text search; 'column' may be a list of columns, matching if any of them contains the value).
+        - 'operation': 'rows' (the filtered rows), 'unique' (unique values of 'column'), 'value_counts' (counts of 'column', most frequent first), 'count' (number of filtered rows) or 'first_per_group' (first row of every 'group_by' group).
+        - 'column': target column of 'unique' and 'value_counts'.
+        - 'columns': columns to return for 'rows' and 'first_per_group', all columns if omitted.
+        - 'group_by': grouping columns of 'first_per_group'.
+        - 'limit': maximum number of rows to return.
+        - 'sample': true to return a random sample of the rows instead of the first ones. Samples are deterministic.
+        - 'stratify_by': with 'sample', 'category' or 'intent' to spread the sample over all their values in proportion to their share.
 
         Examples:
         
         1. For questions like 'what are all the categories' or 'What categories exist?' 
         or 'What are all the values in the category column?' or 'Show examples of category':
            scope: True
-           pandas_code: result = pd.Series(df['category'].unique()).reset_index(drop=True)
+           query_plan: {{"operation": "unique", "column": "category"}}
 
         2. For questions like 'provide 10 examples of Category order':
            scope: True
-           pandas_code: result = df[df['category']=='ORDER'].reset_index(drop=True).sample(10)
+           query_plan: {{"filters": [{{"column": "category", "op": "eq", "value": "ORDER"}}], "operation": "rows", "sample": true, "limit": 10}}
 
         3. For questions like 'Summarize Category invoice':
            scope: True
-           pandas_code: result = df[df['category']=='INVOICE'].reset_index(drop=True).sample(15)
+           query_plan: {{"filters": [{{"column": "category", "op": "eq", "value": "INVOICE"}}], "operation": "rows", "sample": true, "limit": 15}}
            
         4. For questions like 'which intents exist when category is account?':
            scope: True
-           pandas_code: result = pd.Series(df.loc[df['category']=='ACCOUNT', 'intent'].unique()).reset_index(drop=True)
+           query_plan: {{"filters": [{{"column": "category", "op": "eq", "value": "ACCOUNT"}}], "operation": "unique", "column": "intent"}}
 
         5. For questions like 'do we have category order with intent other than cancel order?':
            scope: True
-           pandas_code: result = pd.Series(df.loc[(df['category'] == 'ORDER') & (df['intent'] != 'cancel_order'), 'intent'].unique()).reset_index(drop=True)
+           query_plan: {{"filters": [{{"column": "category", "op": "eq", "value": "ORDER"}}, {{"column": "intent", "op": "ne", "value": "cancel_order"}}], "operation": "unique", "column": "intent"}}
         
         6. For questions like 'What are the most frequent categories?' or 'Which categories are most frequent?':
            scope: True
-           pandas_code: result = df['category'].value_counts().reset_index(name='count').rename(columns={{'index': 'category'}})
+           query_plan: {{"operation": "value_counts", "column": "category"}}
 
         7. For questions like 'Show 5 examples of intent View invoice':
            scope: True
-           pandas_code: result = df[(df['intent']=='get_invoice') | (df['intent']=='check_invoice')].reset_index(drop=True).sample(5)
+           query_plan: {{"filters": [{{"column": "intent", "op": "in", "value": ["get_invoice", "check_invoice"]}}], "operation": "rows", "sample": true, "limit": 5}}
 
         8. For questions like 'Summarize how agent respond to Intent Delivery options':
            scope: True
-           pandas_code: result = df.loc[df['intent'] == 'delivery_options'), ['intent', 'response']].reset_index(drop=True).sample(15)
+           query_plan: {{"filters": [{{"column": "intent", "op": "eq", "value": "delivery_options"}}], "operation": "rows", "columns": ["intent", "response"], "sample": true, "limit": 15}}
 
         9. For questions like 'what customers ask or request regarding Newsletter subscription':
            scope: True
-           pandas_code: result = df.loc[df['intent'] == 'newsletter_subscription'), ['intent', 'instruction']].reset_index(drop=True).sample(15)
+           query_plan: {{"filters": [{{"column": "intent", "op": "eq", "value": "newsletter_subscription"}}], "operation": "rows", "columns": ["intent", "instruction"], "sample": true, "limit": 15}}
 
         10. For questions like 'give 6 examples of customer questions or requests about contact':
             scope: True
-            pandas_code: result = df.loc[df['category'] == 'CONTACT'), ['category', 'instruction']].reset_index(drop=True).sample(6)
+            query_plan: {{"filters": [{{"column": "category", "op": "eq", "value": "CONTACT"}}], "operation": "rows", "columns": ["category", "instruction"], "sample": true, "limit": 6}}
 
         11. For questions like 'what kind of data do we have in the dataset?' or 'what data do we have?' or "what is the data" 
         or "what is in scope" or "are you connected to a dataset" or "any suggestion for a question i can ask you":
             scope: True
-            pandas_code: result = df.groupby(['category', 'intent'], as_index=False).agg({{'instruction': 'first', 'response': 'first'}}).sort_values('category').reset_index(drop=True)
+            query_plan: {{"operation": "first_per_group", "group_by": ["category", "intent"], "columns": ["category", "intent", "instruction", "response"]}}
 
         12. For questions like 'Who is Magnus Carlson?' or "What is Serj's rating?" or 'do u know the name of the company':
             scope: False
+            query_plan: null
             pandas_code: ""
 
         13. For questions like 'do you have prices in the dataset?'
             scope: True
-            pandas_code: result = df[df['instruction'].str.contains('price', case=False, na=False) | df['response'].str.contains('price', case=False, na=False)]
+            query_plan: {{"filters": [{{"column": ["instruction", "response"], "op": "contains", "value": "price"}}], "operation": "rows"}}
         
         14. For questions like 'can you find requests that have replies which are inadequate':
             scope: True
-            pandas_code: result = df[['instruction', 'response']].reset_index(drop=True).sample(15)
+            query_plan: {{"operation": "rows", "columns": ["instruction", "response"], "sample": true, "stratify_by": "intent", "limit": 15}}
+
+        15. For questions that need other computations, like 'what is the average response length per category':
+            scope: True
+            query_plan: null
+            pandas_code: result = df.assign(length=df['response'].str.len()).groupby('category', as_index=False)['length'].mean()
 
 
             
@@ -134,17 +159,15 @@ def make_prompt(user_query, history, mode):
 
 def describe_result_with_llm(result, user_query):
     """Send the result to the LLM for a natural language description."""
-    if isinstance(result, (pd.DataFrame, pd.Series)):
-        result_str = result.to_string()
-    else:
-        result_str = str(result)
+    # Compact rendering under a hard token budget, whatever the result holds
+    result_str = render_result(result, user_query)
     messages = [
         {"role": "system", "content": """You are a helpful data analyst assistant.
             Given the following data analysis result and the user's original query, describe the results in clear, non-technical language.
             Keep your answer concise and focused on what the user asked."""},
         {"role": "user", "content": f"User's question: {user_query}\n\nAnalysis result:\n{result_str}"}
     ]
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="Qwen/Qwen3-30B-A3B",
         temperature=0,
         messages=messages
@@ -156,17 +179,31 @@ def describe_result_with_llm(result, user_query):
 
 def ask_llm_to_fix_code(user_query, messages, history, mode, error_msg, code):
     """Ask the LLM to fix the code based on the error."""
-    messages.append({"role": "user", "content": f"Fix this pandas code that is related to the user question: {user_query}.\n\nThe Code you generated:\n{code} \n\nThe error: {error_msg}"})
-    response = client.chat.completions.create(
+    messages.append({"role": "user", "content": f"Fix this query plan or pandas code that is related to the user question: {user_query}.\n\nThe Code you generated:\n{code} \n\nThe error: {error_msg}"})
+    response = get_client().chat.completions.create(
         model="Qwen/Qwen3-30B-A3B",
         temperature=0,
         messages=messages
     )
     return response.choices[0].message.content.strip()
 
+def generate_code_response(messages):
+    """Ask the LLM to write the pandas code. Returns the cleaned reply and the parsed response."""
+    response = get_client().chat.completions.create(
+        model="Qwen/Qwen3-30B-A3B",
+        temperature=0,
+        messages=messages,
+        extra_body={"guided_json": CodeResponse.model_json_schema()}
+        )
+
+    reply_raw = response.choices[0].message.content.strip()
+    reply_cleaned = remove_think_tags(reply_raw)
+    return reply_cleaned, CodeResponse.model_validate_json(reply_cleaned)
+
 
 # Execute structured question
-def handle_question(query, history, mode, streamlit_available=True, return_full_results=False, max_retries=3):
+def handle_question(query, history, mode, streamlit_available=True, return_full_results=False, max_retries=3,
+                    on_event=None):
     """
     Handle a question using the pre-planning approach.
     
@@ -177,56 +214,85 @@ def handle_question(query, history, mode, streamlit_available=True, return_full_
         streamlit_available: Whether streamlit is available for UI display
         return_full_results: Whether to return full results dict instead of just description
         max_retries: Maximum number of retries for code execution
+        on_event: Optional callback receiving a progress event before every LLM call and execution;
+            a background job stops there once it is cancelled (see engine/jobs.py)
         
     Returns:
         If return_full_results is False: Returns just the description string
         If return_full_results is True: Returns a dict with all results
     """
+    # Pick up rows ingested since the last question
+    dataset = current_dataset()
+    dataset.refresh()
+    # Query plans are executed by the dataset's query backend instead of exec; free-text
+    # intent/category names ("View invoice") are resolved locally, so a misspelled
+    # value doesn't cost an LLM retry
+    resolver = dataset.resolver
+    # Cached code is keyed by the schema and vocabularies, so it never crosses datasets
+    schema_hash = dataset.schema_hash
+    
     q = query.lower()
     messages = make_prompt(q, history, mode)
     retry_count = 0
     not_executed = True
 
-    
-    response = client.chat.completions.create(
-        model="Qwen/Qwen3-30B-A3B",
-        temperature=0,
-        messages=messages,
-        extra_body={"guided_json": CodeResponse.model_json_schema()}
-        )
+    # Follow-up questions depend on the history, so only standalone questions use the cache
+    cached = code_cache.lookup(q, schema_hash) if not history else None
 
-    reply_raw = response.choices[0].message.content.strip()
-    reply_cleaned = remove_think_tags(reply_raw)
+    def step(name):
+        if on_event is not None:
+            on_event({"type": "step", "name": name})
 
-    
-    parsed = CodeResponse.model_validate_json(reply_cleaned)
-    code = parsed.pandas_code
-    thoughts = parsed.thoughts
-    scope = parsed.scope
-   
-    
-    if scope == False:
-        return "Sorry, that question is out of scope for this dataset. If you're not sure what kind of data I have, feel free to ask me."
+    if cached is not None:
+        code = cached["pandas_code"]
+        plan = QueryPlan.model_validate(cached["query_plan"]) if cached.get("query_plan") else None
+        thoughts = cached["thoughts"]
+        reply_cleaned = code
+    else:
+        step("Planning the query")
+        reply_cleaned, parsed = generate_code_response(messages)
+        code = parsed.pandas_code
+        plan = parsed.query_plan
+        thoughts = parsed.thoughts
+        scope = parsed.scope
 
-    code = fix_non_ascii_operators(code)
+        if scope == False:
+            return OUT_OF_SCOPE_MESSAGE
 
-    if not code.strip().startswith("result ="):
-        raise SyntaxError("Code must assign to variable 'result'")
+        code = fix_non_ascii_operators(code)
+        check_code(code, plan)
 
-    exec_env = {'df': df.copy(), 'pd': pd}
+    # Generated code runs in sandbox worker processes unless SANDBOX_WORKERS=0
+    exec_env = {'df': dataset.query_engine().df.copy(), 'pd': pd} if SANDBOX_WORKERS == 0 else None
     while retry_count < max_retries and not_executed:
         try:    
-            exec(code, exec_env)
-            result = exec_env.get('result')
+            if plan is None:
+                # Unknown intent/category literals are fixed locally instead of by a retry
+                code = resolver.rewrite_code(code)
+
+            step("Running the query plan" if plan is not None else "Running the code")
+            if plan is not None:
+                # The row limit is pushed down into the plan execution
+                result = dataset.backend.execute(plan, max_rows=SANDBOX_MAX_ROWS)
+            elif exec_env is None:
+                result = get_sandbox_executor().execute(code, dataset_path=dataset.path)
+            else:
+                exec(code, exec_env)
+                result = exec_env.get('result')
 
-            # Limit to 20 rows if DataFrame or Series is too long to avoid reaching token limit of the model 
-            if isinstance(result, (pd.DataFrame, pd.Series)) and len(result) > 20:
-                result = result.sample(20, random_state=42).reset_index(drop=True)
+            # Sandbox workers already cap results; in-process code can only be capped afterwards
+            if exec_env is not None and plan is None and isinstance(result, (pd.DataFrame, pd.Series)) and len(result) > SANDBOX_MAX_ROWS:
+                result = result.sample(SANDBOX_MAX_ROWS, random_state=42).reset_index(drop=True)
             
             if result is not None:
+                if cached is None and not history:
+                    code_cache.store(q, schema_hash, code, thoughts,
+                                     query_plan=plan.model_dump() if plan is not None else None)
+
                 results_data = {
                     "thoughts": thoughts,
                     "code": code,
+                    "query_plan": plan.model_dump(exclude_defaults=True) if plan is not None else None,
                     "result": result,
                     "result_type": "dataframe" if isinstance(result, (pd.DataFrame, pd.Series)) else "scalar"
                 }
@@ -237,13 +303,17 @@ def handle_question(query, history, mode, streamlit_available=True, return_full_
                     # Show thought process as requested
                     st.markdown("**LLM Thought Process:**")
                     st.write(thoughts) 
-                    st.write("code:", code)
+                    if plan is not None:
+                        st.write("query plan:", plan.model_dump(exclude_defaults=True))
+                    else:
+                        st.write("code:", code)
                     
                     if isinstance(result, (pd.DataFrame, pd.Series)):
                         st.dataframe(result)
                 
                 if isinstance(result, (pd.DataFrame, pd.Series)):
                     not_executed = False
+                    step("Describing the result")
                     description = describe_result_with_llm(result, query)
                     results_data["description"] = description
                     return results_data if return_full_results else description
@@ -257,19 +327,39 @@ def handle_question(query, history, mode, streamlit_available=True, return_full_
             else:
                 return "No results generated - check code formatting"
 
+        except JobCancelledError:
+            # Raised by on_event: the job was cancelled, not the code
+            raise
         except Exception as e:
-            error_type = type(e).__name__
-            error_msg = f"{error_type}: {str(e)}, code: {code if 'code' in locals() else reply_cleaned}"
+            if cached is not None:
+                # The cached code no longer works: drop it and generate fresh code
+                code_cache.invalidate(q, schema_hash)
+                cached = None
+                step("Planning the query")
+                reply_cleaned, parsed = generate_code_response(messages)
+                if parsed.scope == False:
+                    return OUT_OF_SCOPE_MESSAGE
+                code = fix_non_ascii_operators(parsed.pandas_code)
+                plan = parsed.query_plan
+                thoughts = parsed.thoughts
+                check_code(code, plan)
+                continue
+
+            error_type = getattr(e, "error_type", type(e).__name__)
+            failed = plan.model_dump_json(exclude_defaults=True) if plan is not None else code
+            error_msg = f"{error_type}: {str(e)}, code: {failed}"
             retry_count += 1
             
             if streamlit_available:
                 import streamlit as st
                 st.write(f"Attempt {retry_count}: {error_msg}")
 
+            step(f"Fixing the query (attempt {retry_count})")
             fixed_code_reply = ask_llm_to_fix_code(query, messages, history, mode, error_msg, reply_cleaned)
             try:
                 parsed = CodeResponse.model_validate_json(fixed_code_reply)
-                code = parsed.pandas_code
+                code = fix_non_ascii_operators(parsed.pandas_code)
+                plan = parsed.query_plan
             except Exception as parse_error:
                 return f"There was an error that I could not fix. Please try to rephrase your question.\nParse error: {str(parse_error)}\nResponse: {fixed_code_reply}"
 
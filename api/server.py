@@ -0,0 +1,329 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Literal, Optional
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from data.catalog import DATASET_CATALOG, use_dataset
+from engine.jobs import JobCancelledError
+
+# Server processes (uvicorn workers); each one holds its own copy of the datasets and indexes
+API_WORKERS = int(os.environ.get("API_WORKERS", "1"))
+# Questions answered at once per process; the agents block on the LLM, so this bounds the threads
+API_CONCURRENCY = int(os.environ.get("API_CONCURRENCY", "8"))
+# Questions waiting for a thread before new ones are turned away with 503
+API_QUEUE_SIZE = int(os.environ.get("API_QUEUE_SIZE", "64"))
+# Seconds allowed per question, queueing included
+API_TIMEOUT = float(os.environ.get("API_TIMEOUT", "120"))
+# Sessions whose agent is kept between requests, least recently used dropped first
+API_SESSIONS = int(os.environ.get("API_SESSIONS", "1024"))
+
+class AskRequest(BaseModel):
+    question: str = Field(..., description="Question about the dataset")
+    session_id: Optional[str] = Field(None, description="Session whose memory the question uses (a new one if omitted)")
+    mode: Literal["react", "pre-planning"] = Field("react", description="ReActive agent or pre-planning approach")
+    dataset: Optional[str] = Field(None, description="Registered dataset (the built-in one if omitted)")
+
+class Session:
+    """Agent (with its memory partition) of one API session."""
+
+    def __init__(self, session_id: str):
+        from agent.agent import ReActAgent
+
+        self.id = session_id
+        # Tools follow the dataset of each question; the client and memory store are shared
+        self.agent = ReActAgent(session_id=session_id)
+        # One question at a time per session: the agent keeps per-run state
+        self.lock = threading.Lock()
+
+class QueueFullError(Exception):
+    """Every thread is busy and the queue is full."""
+
+class Dispatcher:
+    """
+    Runs blocking agent calls on a bounded thread pool.
+
+    Requests beyond the pool wait in a bounded queue; when that is full they
+    are rejected at once instead of piling up. The datasets, indexes and tool
+    schemas are process-wide, so every request shares them.
+    """
+
+    def __init__(self, concurrency: int = API_CONCURRENCY, queue_size: int = API_QUEUE_SIZE,
+                 max_sessions: int = API_SESSIONS):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_sessions = max_sessions
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="api")
+        self._pending = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Questions running or queued."""
+        return self._pending
+
+    def session(self, session_id: Optional[str]) -> Session:
+        """Get a session, creating it on first use."""
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def start(self, function: Callable[[], Any]) -> "asyncio.Future":
+        """
+        Queue a blocking function on the pool, or raise QueueFullError at once.
+
+        Args:
+            function: Function to run
+
+        Returns:
+            Future of the function's result
+        """
+        with self._lock:
+            if self._pending >= self.concurrency + self.queue_size:
+                raise QueueFullError()
+            self._pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, function)
+        future.add_done_callback(self._release)
+        return future
+
+    async def submit(self, function: Callable[[], Any], timeout: float = API_TIMEOUT) -> Any:
+        """
+        Run a blocking function on the pool.
+
+        Args:
+            function: Function to run
+            timeout: Seconds allowed, queueing included
+
+        Returns:
+            The function's result
+        """
+        # A timed-out call isn't interrupted here: it stops at its next progress event (see stop_at)
+        return await asyncio.wait_for(asyncio.shield(self.start(function)), timeout)
+
+    def _release(self, future: "asyncio.Future"):
+        with self._lock:
+            self._pending -= 1
+        if not future.cancelled():
+            # Retrieved here, since nobody awaits the result of a timed-out call
+            future.exception()
+
+def stop_at(deadline: float, on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Callable[[Dict[str, Any]], None]:
+    """
+    Event callback that stops a run once its deadline has passed.
+
+    The agents call it before every LLM call or after every tool call, so a
+    question whose client already got a 504 frees its thread, its session
+    and its queue slot at its next step instead of running to the end.
+
+    Args:
+        deadline: time.monotonic() after which the run stops
+        on_event: Optional receiver of the events before the deadline
+
+    Returns:
+        The callback, raising JobCancelledError after the deadline
+    """
+    def check(event: Dict[str, Any]):
+        if time.monotonic() > deadline:
+            raise JobCancelledError()
+        if on_event is not None:
+            on_event(event)
+    return check
+
+def _json_value(value: Any) -> Any:
+    """Make tool and plan results JSON-serializable."""
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient="records"))
+    if isinstance(value, pd.Series):
+        return json.loads(value.to_json())
+    if isinstance(value, (np.generic, np.ndarray)):
+        # e.g. (df.intent == 'x').sum() is an np.int64
+        return value.tolist()
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    return value
+
+def answer(request: AskRequest, session: Session, on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+           deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Answer a question in the calling thread, on the requested dataset.
+
+    Args:
+        request: The question
+        session: Session of the question
+        on_event: Optional receiver of the agent's progress events
+        deadline: Optional time.monotonic() after which the run stops at its next step
+
+    Returns:
+        The answer, with the tools used and any result table, export or next page
+    """
+    from agent_analyst_task import handle_question
+
+    dataset = request.dataset or DATASET_CATALOG.names()[0]
+    if deadline is not None:
+        on_event = stop_at(deadline, on_event)
+    with session.lock, use_dataset(dataset):
+        if deadline is not None and time.monotonic() > deadline:
+            # Timed out while queued or waiting for the session's previous question
+            raise JobCancelledError()
+        if request.mode == "react":
+            text = session.agent.run(request.question, on_event=on_event)
+            response = {"answer": text, "tools_used": list(session.agent.last_tools_used)}
+            if session.agent.last_pager:
+                response["pager"] = session.agent.last_pager
+            if session.agent.last_export:
+                export = dict(session.agent.last_export)
+                export["file"] = os.path.basename(export.pop("path"))
+                response["export"] = export
+        else:
+            # Standalone questions, as in the app, so validated code is reused from the cache
+            result = handle_question(request.question, [], "Pre-planning", streamlit_available=False,
+                                     return_full_results=True, on_event=on_event)
+            if isinstance(result, dict):
+                response = {"answer": result.get("description", str(result["result"])),
+                            "query_plan": result["query_plan"], "code": result["code"],
+                            "result": _json_value(result["result"])}
+            else:
+                response = {"answer": result}
+    return {"session_id": session.id, "dataset": dataset, **response}
+
+def create_app(dispatcher: Optional[Dispatcher] = None) -> FastAPI:
+    """
+    Create the HTTP API.
+
+    Args:
+        dispatcher: Pool running the agents (a new one if omitted)
+
+    Returns:
+        The FastAPI application
+    """
+    dispatcher = dispatcher or Dispatcher()
+    app = FastAPI(title="Customer Service Dataset Q&A API")
+
+    def check_dataset(name: Optional[str]):
+        if name is not None and name not in DATASET_CATALOG.specs:
+            raise HTTPException(404, f"Unknown dataset '{name}'. Valid datasets are: {', '.join(DATASET_CATALOG.names())}")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "pending": dispatcher.pending, "concurrency": dispatcher.concurrency}
+
+    @app.post("/ask")
+    async def ask(request: AskRequest):
+        check_dataset(request.dataset)
+        session = dispatcher.session(request.session_id)
+        try:
+            deadline = time.monotonic() + API_TIMEOUT
+            return await dispatcher.submit(lambda: answer(request, session, deadline=deadline), API_TIMEOUT)
+        except QueueFullError:
+            raise HTTPException(503, "Too many questions in progress, please retry", headers={"Retry-After": "1"})
+        except asyncio.TimeoutError:
+            raise HTTPException(504, f"The question took longer than {API_TIMEOUT:g} seconds")
+
+    @app.post("/stream")
+    async def stream(request: AskRequest):
+        """Answer a question as newline-delimited JSON: progress events, then the answer."""
+        check_dataset(request.dataset)
+        session = dispatcher.session(request.session_id)
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def on_event(event: Dict[str, Any]):
+            event = {key: _json_value(value) for key, value in event.items()}
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        deadline = time.monotonic() + API_TIMEOUT
+        try:
+            future = dispatcher.start(lambda: answer(request, session, on_event, deadline))
+        except QueueFullError:
+            raise HTTPException(503, "Too many questions in progress, please retry", headers={"Retry-After": "1"})
+
+        async def lines():
+            while not future.done() or not events.empty():
+                getter = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait([getter, future], timeout=deadline - time.monotonic(),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield json.dumps(getter.result()) + "\n"
+                    continue
+                getter.cancel()
+                if not done:
+                    yield json.dumps({"type": "error", "error": f"The question took longer than {API_TIMEOUT:g} seconds"}) + "\n"
+                    return
+            try:
+                yield json.dumps({"type": "answer", **future.result()}) + "\n"
+            except Exception as e:
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    # Plain functions: FastAPI runs them on its thread pool, so loading a dataset doesn't block the event loop
+    @app.get("/tools")
+    def tools(dataset: Optional[str] = None, compact: bool = True):
+        """Tool schemas, and the intent/category vocabularies of the dataset."""
+        from tools.tools import get_registry
+
+        check_dataset(dataset)
+        with use_dataset(dataset or DATASET_CATALOG.names()[0]):
+            registry = get_registry()
+            return {"tools": registry.get_tool_schemas(compact), "vocabularies": registry.vocabularies}
+
+    @app.get("/datasets")
+    async def datasets():
+        return {"datasets": [{"name": name, "description": spec["description"]}
+                             for name, spec in DATASET_CATALOG.specs.items()],
+                "loaded": DATASET_CATALOG.loaded_datasets()}
+
+    @app.get("/memory/{session_id}")
+    def memory(session_id: str, n: int = 5):
+        """The latest interactions of a session."""
+        from memory.memory import MEMORY_STORE
+        return {"session_id": session_id, "interactions": MEMORY_STORE.get(session_id).get_recent_interactions(n)}
+
+    @app.post("/memory/{session_id}/summary")
+    async def memory_summary(session_id: str):
+        """Summarize all interactions of a session with the LLM."""
+        session = dispatcher.session(session_id)
+        try:
+            summary = await dispatcher.submit(session.agent.summarize_interactions)
+        except QueueFullError:
+            raise HTTPException(503, "Too many questions in progress, please retry", headers={"Retry-After": "1"})
+        except asyncio.TimeoutError:
+            raise HTTPException(504, f"The summary took longer than {API_TIMEOUT:g} seconds")
+        return {"session_id": session_id, "summary": summary}
+
+    return app
+
+# Module-level application for `uvicorn api.server:app`
+app = create_app()
+
+if __name__ == "__main__":
+    # python -m api.server --port 8000 --workers 4
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the agents over HTTP")
+    parser.add_argument("--host", default=os.environ.get("API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("API_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help="Server processes (can be set with API_WORKERS env var)")
+    args = parser.parse_args()
+    uvicorn.run("api.server:app", host=args.host, port=args.port, workers=args.workers)
@@ -1,18 +1,25 @@
 import streamlit as st
 import json
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import sys
 import os
+import time
+import uuid
+from typing import Any, Dict
 
 # Add the parent directory to the path to import modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from tools.tools import get_tools
-from agent.agent import ReActAgent
-from data.download_dataset import load_dataset_df
+from tools.tool_functions import TOOL_FUNCTIONS
+from data.catalog import DATASET_CATALOG, current_dataset, set_dataset, use_dataset
+from engine.export import export_to_file
+from engine.jobs import CANCELLED, FAILED, QUEUED, get_job_queue
+from engine.query_plan import Filter
+from agent.agent import ReActAgent, streamlit_events
 from agent_analyst_task import handle_question
 
+# Seconds between two looks at the questions being answered in the background
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1"))
+
 st.set_page_config(page_title="Customer Service Dataset Q&A", layout="wide")
 
 st.title("Customer Service Dataset Q&A")
@@ -21,13 +28,99 @@ st.title("Customer Service Dataset Q&A")
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# The dataset, indexes, tool schemas, LLM client and memory store are process-wide and shared by
+# every session; the agent only holds the state of its current run
 if "agent" not in st.session_state:
-    tools = get_tools()
-    st.session_state.agent = ReActAgent(tools=tools)
+    st.session_state.agent = ReActAgent(session_id=st.session_state.session_id)
+
+# Ids of the background jobs answering this session's questions; the jobs outlive reruns
+if "jobs" not in st.session_state:
+    st.session_state.jobs = []
+
+def submit_question(question: str, mode: str, dataset: str):
+    """Answer a question in the background and show it as pending in the chat"""
+    st.session_state.messages.append({"role": "user", "content": question})
+    agent = st.session_state.agent
+    history = st.session_state.setdefault("history", [])
+    
+    def answer(emit):
+        # Job threads don't see the session's dataset selection, so it is passed along
+        with use_dataset(dataset):
+            if mode == "ReActive":
+                response = agent.run(question, on_event=emit)
+                return {"answer": response, "pager": agent.last_pager, "export": agent.last_export}
+            # Use the pre-planning approach from agent_analyst_task.py
+            result = handle_question(question, history, "Pre-planning", streamlit_available=False,
+                                     return_full_results=True, on_event=emit)
+            if not isinstance(result, dict):
+                return {"answer": result}
+            return {"answer": result.get("description", str(result["result"])), "plan": result}
+    
+    # Jobs of one session run in order, so its agent answers one question at a time
+    job = get_job_queue().submit(answer, key=st.session_state.session_id, description=question)
+    st.session_state.jobs.append(job.id)
+
+def submit_summary():
+    """Summarize the session's interactions in the background"""
+    agent = st.session_state.agent
+    job = get_job_queue().submit(lambda emit: agent.summarize_interactions(),
+                                 key=st.session_state.session_id, description="Summary of all interactions")
+    st.session_state.summary_job = job.id
+    st.session_state.summary = None
+
+def collect_jobs():
+    """Move the answers of finished jobs into the chat"""
+    queue = get_job_queue()
+    for job_id in list(st.session_state.jobs):
+        job = queue.get(job_id)
+        if job is not None and not job.done:
+            continue
+        st.session_state.jobs.remove(job_id)
+        if job is None or job.status == CANCELLED:
+            continue
+        if job.status == FAILED:
+            st.session_state.messages.append({"role": "assistant", "content": f"Error: {job.error}"})
+            continue
+        st.session_state.messages.append({"role": "assistant", "content": job.result["answer"],
+                                          "events": job.events, "plan": job.result.get("plan")})
+        if "pager" in job.result:
+            st.session_state.pager = job.result["pager"]
+            st.session_state.export = job.result["export"] or st.session_state.get("export")
+    
+    job = queue.get(st.session_state.get("summary_job") or "")
+    if job is None or job.done:
+        st.session_state.summary_job = None
+        if job is not None:
+            st.session_state.summary = job.result if job.status != FAILED else f"Error: {job.error}"
+
+def job_finished() -> bool:
+    """Whether a job of this session finished since its answer was collected"""
+    job_ids = st.session_state.jobs + list(filter(None, [st.session_state.get("summary_job")]))
+    return any(job is None or job.done for job in map(get_job_queue().get, job_ids))
+
+collect_jobs()
 
 # Sidebar
 st.sidebar.title("Settings")
 
+# Dataset of this session; tools, prompts and exports all read the selected one
+def _reset_dataset_views():
+    st.session_state.pager = None
+    st.session_state.export = None
+
+dataset_name = st.sidebar.selectbox(
+    "Dataset",
+    DATASET_CATALOG.names(),
+    format_func=lambda name: DATASET_CATALOG.specs[name]["description"] or name,
+    key="dataset",
+    on_change=_reset_dataset_views
+)
+set_dataset(dataset_name)
+backend = current_dataset().backend
+
 # Toggle for planning mode
 planning_mode = st.sidebar.radio(
     "Planning Mode",
@@ -38,16 +131,77 @@ planning_mode = st.sidebar.radio(
 # Memory features
 st.sidebar.title("Memory")
 if st.sidebar.button("Summarize All Interactions"):
-    with st.spinner("Generating summary of all interactions..."):
-        summary = st.session_state.agent.summarize_interactions()
-        st.sidebar.write(summary)
+    # Runs in the background like the questions, so the chat stays usable meanwhile
+    submit_summary()
+if st.session_state.get("summary_job"):
+    st.sidebar.caption("Generating summary of all interactions...")
+elif st.session_state.get("summary"):
+    st.sidebar.write(st.session_state.summary)
 
 # Dataset info
 st.sidebar.title("Dataset Info")
-df = load_dataset_df()
-st.sidebar.write(f"Total conversations: {len(df)}")
-st.sidebar.write(f"Unique intents: {df['intent'].nunique()}")
-st.sidebar.write(f"Unique categories: {df['category'].nunique()}")
+# Computed once per dataset (and after ingested rows), not on every rerun
+stats = current_dataset().stats
+st.sidebar.write(f"Total conversations: {stats['rows']}")
+st.sidebar.write(f"Unique intents: {stats['intents']}")
+st.sidebar.write(f"Unique categories: {stats['categories']}")
+
+# Export a slice of the dataset without going through the LLM
+st.sidebar.title("Export")
+with st.sidebar.form("export_form"):
+    export_category = st.selectbox("Category", ["(all)"] + backend.vocab['category'])
+    export_intent = st.selectbox("Intent", ["(all)"] + backend.vocab['intent'])
+    export_contains = st.text_input("Instruction or response contains")
+    export_format = st.radio("Format", ["csv.gz", "parquet"], horizontal=True)
+    if st.form_submit_button("Export"):
+        filters = []
+        if export_category != "(all)":
+            filters.append(Filter(column="category", op="eq", value=export_category))
+        if export_intent != "(all)":
+            filters.append(Filter(column="intent", op="eq", value=export_intent))
+        if export_contains:
+            filters.append(Filter(column=["instruction", "response"], op="contains", value=export_contains))
+        with st.spinner("Exporting..."):
+            st.session_state.export = {"path": export_to_file(backend, filters, file_format=export_format),
+                                       "rows": backend.count(filters), "format": export_format}
+
+def render_details(message: Dict[str, Any]):
+    """Show the tables or the query plan behind an answer (the tools used are listed in the answer)"""
+    for event in message.get("events", []):
+        if event["type"] == "dataframe":
+            streamlit_events(event)
+    plan = message.get("plan")
+    if plan:
+        with st.expander("LLM Thought Process"):
+            st.write(plan["thoughts"])
+            if plan["query_plan"] is not None:
+                st.write("query plan:", plan["query_plan"])
+            else:
+                st.write("code:", plan["code"])
+            if plan["result_type"] == "dataframe":
+                st.dataframe(plan["result"])
+
+def render_jobs():
+    """Show the questions still being answered, with their progress so far"""
+    if job_finished():
+        # Redraw the page so the answer joins the chat
+        st.rerun()
+    for job_id in st.session_state.jobs:
+        job = get_job_queue().get(job_id)
+        if job is None:
+            # Dropped from the queue; collect_jobs removes it on the next rerun
+            continue
+        with st.chat_message("assistant"):
+            st.caption(f"{'Waiting to answer' if job.status == QUEUED else 'Answering'}: {job.description}")
+            for event in list(job.events):
+                streamlit_events(event)
+            if st.button("Cancel", key=f"cancel_{job.id}"):
+                job.cancel()
+                st.rerun()
+
+# Poll the running jobs without rerunning the whole page (st.fragment needs Streamlit 1.37)
+if hasattr(st, "fragment"):
+    render_jobs = st.fragment(run_every=JOB_POLL_INTERVAL)(render_jobs)
 
 # Example questions
 st.sidebar.title("Example Questions")
@@ -63,52 +217,76 @@ for question in example_questions:
         # Clear previous messages if this is a new conversation
         if len(st.session_state.messages) > 0 and not question.startswith("Tell me more"):
             st.session_state.messages = []
-        
-        # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": question})
-        
-        # Get response based on planning mode
-        with st.spinner("Thinking..."):
-            if planning_mode == "ReActive":
-                response = st.session_state.agent.run(question)
-            else:
-                # Use the pre-planning approach from agent_analyst_task.py
-                if "history" not in st.session_state:
-                    st.session_state.history = []
-                response = handle_question(question, st.session_state.history, "Pre-planning", streamlit_available=True, return_full_results=False)
-        
-        # Add assistant response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        submit_question(question, planning_mode, dataset_name)
         
         # Rerun to update the UI
         st.rerun()
 
+def render_pager():
+    """Page through the rows of the last paged tool result without calling the LLM"""
+    pager = st.session_state.get("pager")
+    if not pager:
+        return
+    
+    st.markdown(f"#### Browse results ({pager['total']} rows)" if pager.get("total") else "#### Browse results")
+    if pager.get("rows"):
+        st.caption(f"Page {pager['page_number']}")
+        st.dataframe(pd.DataFrame(pager["rows"]))
+    if pager.get("cursor") and st.button("Next page", key="pager_next"):
+        # The cursor carries the filters and offset, so this is a plain tool call
+        result = TOOL_FUNCTIONS[pager["tool"]](cursor=pager["cursor"])
+        if "error" in result:
+            st.error(result["error"])
+            return
+        st.session_state.pager = {
+            "tool": pager["tool"],
+            "cursor": result.get("next_cursor"),
+            "total": result.get("total_matching", pager.get("total")),
+            "rows": result.get("examples", result.get("dataframe")),
+            "page_number": pager.get("page_number", 1) + 1,
+        }
+        st.rerun()
+
+def _export_downloaded():
+    st.session_state.export["prepared"] = False
+
+def render_export():
+    """Offer the last exported file for download"""
+    export = st.session_state.get("export")
+    if not export or not os.path.exists(export["path"]):
+        return
+    
+    label = f"{export['rows']} rows ({export['format']})"
+    # The download button holds the whole file, so it is only created once the user asks
+    # for the download instead of re-reading the file on every rerun of the page
+    if not export.get("prepared"):
+        if st.button(f"Prepare download of {label}", key="export_prepare"):
+            export["prepared"] = True
+            st.rerun()
+        return
+    mime = "application/gzip" if export["format"] == "csv.gz" else "application/vnd.apache.parquet"
+    with open(export["path"], "rb") as file:
+        st.download_button(f"Download {label}", file, file_name=os.path.basename(export["path"]), mime=mime,
+                           on_click=_export_downloaded)
+
 # Display chat messages
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.write(message["content"])
+        render_details(message)
+
+# Questions still being answered; the page stays usable meanwhile
+render_jobs()
 
 # Get user input
 if prompt := st.chat_input("Ask a question about the customer service dataset"):
-    # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    
-    # Display user message
-    with st.chat_message("user"):
-        st.write(prompt)
-    
-    # Display assistant response
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            # Get response based on planning mode
-            if planning_mode == "ReActive":
-                response = st.session_state.agent.run(prompt)
-            else:
-                # Use the pre-planning approach from agent_analyst_task.py
-                if "history" not in st.session_state:
-                    st.session_state.history = []
-                response = handle_question(prompt, st.session_state.history, "Pre-planning", streamlit_available=True, return_full_results=False)
-            st.write(response)
-    
-    # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": response})
+    submit_question(prompt, planning_mode, dataset_name)
+    st.rerun()
+
+render_pager()
+render_export()
+
+if not hasattr(st, "fragment") and (st.session_state.jobs or st.session_state.get("summary_job")):
+    # Older Streamlit: poll by rerunning the page; any interaction cuts the wait short
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
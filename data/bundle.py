@@ -0,0 +1,202 @@
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from data.download_dataset import get_csv_path, get_schema_hash, load_dataset_df
+
+# Directory of the warm-start bundles, one subdirectory per version, next to the dataset
+BUNDLE_DIR = os.environ.get("BUNDLE_DIR", os.path.join(os.path.dirname(__file__), "customer_service_data.bundle"))
+# File naming the version workers load
+CURRENT_NAME = "CURRENT"
+# Bumped whenever the layout of a bundle changes, so old bundles are ignored
+BUNDLE_FORMAT = 1
+
+def prompt_fragments(df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Render the dataset-dependent parts of the pre-planning system prompt.
+
+    Args:
+        df: The dataset
+
+    Returns:
+        Dictionary with the rendered dtypes and the category and intent values
+    """
+    return {
+        "dtypes": str(df.dtypes.to_dict()),
+        "categories": str(list(df['category'].unique())),
+        "intents": str(list(df['intent'].unique())),
+    }
+
+def _source_stamp() -> Optional[List[int]]:
+    """Size and modification time of the dataset CSV, or None if there is no local copy."""
+    try:
+        stat = os.stat(get_csv_path())
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+class WarmBundle:
+    """
+    Prebuilt state of the built-in dataset, so a cold process starts without
+    parsing the CSV or building any index.
+
+    A bundle holds the rows as an uncompressed Arrow IPC file, the dataset
+    index, text statistics, near-duplicate clusters and response tactics, the
+    vocabularies and the rendered prompt fragments. The arrays are
+    memory-mapped, so worker processes on one host share a single copy.
+    Segments ingested after the build are applied on top as usual.
+    """
+
+    def __init__(self, directory: str, manifest: Dict[str, Any]):
+        """
+        Open a built bundle.
+
+        Args:
+            directory: Directory of the bundle version
+            manifest: Its manifest
+        """
+        self.directory = directory
+        self.manifest = manifest
+        self.version: str = manifest["version"]
+        with open(self._path("prompt.json")) as file:
+            self.prompt: Dict[str, str] = json.load(file)
+        self.schema_hash: str = self.prompt.pop("schema_hash")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def frame(self) -> pd.DataFrame:
+        """The rows, read from the memory-mapped Arrow file."""
+        import pyarrow as pa
+        from data.ingest import SEGMENTS_ATTR
+
+        df = pa.ipc.open_file(pa.memory_map(self._path("data.arrow"))).read_all().to_pandas()
+        df.attrs[SEGMENTS_ATTR] = len(self.manifest["segments"])
+        return df
+
+    def dataset_index(self, df: pd.DataFrame):
+        """The DatasetIndex of the rows returned by frame()."""
+        from data.indexes import DatasetIndex
+        return DatasetIndex.load(self._path("index"), df)
+
+    def text_stats(self):
+        """The TextStats of the rows."""
+        from data.text_stats import TextStats
+        return TextStats.load(self._path("text_stats"))
+
+    def duplicate_index(self):
+        """The near-duplicate clusters of the rows."""
+        from data.dedup import DuplicateIndex
+        return DuplicateIndex.load(self._path("minhash.npz"))
+
+    def tactic_index(self):
+        """The response tactics of the rows."""
+        from data.tactics import TacticIndex
+        return TacticIndex.load(self._path("tactics.npz"))
+
+def _read_current() -> Optional[str]:
+    try:
+        with open(os.path.join(BUNDLE_DIR, CURRENT_NAME)) as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+def load_bundle() -> Optional[WarmBundle]:
+    """
+    Open the current warm-start bundle if it matches the dataset.
+
+    A bundle is stale when the CSV changed or the ingested segments it
+    includes were rewritten; segments ingested after the build don't make
+    it stale.
+
+    Returns:
+        The bundle, or None if there is none or it is stale
+    """
+    from data.ingest import read_manifest
+
+    version = _read_current()
+    if version is None:
+        return None
+    directory = os.path.join(BUNDLE_DIR, version)
+    try:
+        with open(os.path.join(directory, "manifest.json")) as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return None
+    if manifest["format"] != BUNDLE_FORMAT:
+        return None
+    stamp = _source_stamp()
+    if stamp is not None and stamp != manifest["source"]:
+        print(f"Warm-start bundle {version} is stale (the dataset CSV changed); rebuild it with python -m data.bundle")
+        return None
+    included = manifest["segments"]
+    if [segment["sha1"] for segment in read_manifest()["segments"][:len(included)]] != included:
+        print(f"Warm-start bundle {version} is stale (the ingested segments changed); rebuild it with python -m data.bundle")
+        return None
+    return WarmBundle(directory, manifest)
+
+def build_bundle() -> str:
+    """
+    Build a warm-start bundle of the built-in dataset (with the segments
+    ingested so far) and make it the current one.
+
+    Returns:
+        Directory of the bundle
+    """
+    import pyarrow as pa
+    from data.dedup import build_duplicate_index
+    from data.indexes import DatasetIndex
+    from data.ingest import read_manifest
+    from data.tactics import build_tactic_index
+    from data.text_stats import TextStats
+
+    df = load_dataset_df()
+    source, segments = _source_stamp(), [segment["sha1"] for segment in read_manifest()["segments"]]
+    key = json.dumps({"format": BUNDLE_FORMAT, "source": source, "segments": segments})
+    version = hashlib.sha1(key.encode()).hexdigest()[:16]
+    directory = os.path.join(BUNDLE_DIR, version)
+    tmp_directory = f"{directory}.{os.getpid()}.tmp"
+    os.makedirs(os.path.join(tmp_directory, "index"))
+    os.makedirs(os.path.join(tmp_directory, "text_stats"))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(os.path.join(tmp_directory, "data.arrow"), "wb") as sink, \
+            pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    DatasetIndex(df).save(os.path.join(tmp_directory, "index"))
+    TextStats(df).save(os.path.join(tmp_directory, "text_stats"))
+    # Reused from the standalone offline builds when they cover the same rows
+    build_duplicate_index(df).save(os.path.join(tmp_directory, "minhash.npz"), df)
+    build_tactic_index(df).save(os.path.join(tmp_directory, "tactics.npz"), df)
+    with open(os.path.join(tmp_directory, "prompt.json"), "w") as file:
+        json.dump({**prompt_fragments(df), "schema_hash": get_schema_hash(df)}, file)
+    with open(os.path.join(tmp_directory, "manifest.json"), "w") as file:
+        json.dump({"format": BUNDLE_FORMAT, "version": version, "source": source, "segments": segments,
+                   "rows": len(df), "created": time.time()}, file, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    previous = _read_current()
+    tmp_path = os.path.join(BUNDLE_DIR, f"{CURRENT_NAME}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as file:
+        file.write(version)
+    os.replace(tmp_path, os.path.join(BUNDLE_DIR, CURRENT_NAME))
+
+    # Keep the previous version for processes that still map it, drop the older ones
+    keep = {version, previous}
+    for name in os.listdir(BUNDLE_DIR):
+        path = os.path.join(BUNDLE_DIR, name)
+        if os.path.isdir(path) and name not in keep and not name.endswith(".tmp"):
+            shutil.rmtree(path, ignore_errors=True)
+    return directory
+
+if __name__ == "__main__":
+    # python -m data.bundle: build the bundle after deploying or ingesting data, before starting workers
+    start = time.perf_counter()
+    path = build_bundle()
+    print(f"Built warm-start bundle {os.path.basename(path)} in {time.perf_counter() - start:.1f}s: {path}")
@@ -0,0 +1,366 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+import threading
+
+import pandas as pd
+
+from data.bundle import load_bundle, prompt_fragments
+from data.download_dataset import REQUIRED_COLUMNS, get_schema_hash, load_dataset_df
+
+# Name of the built-in Bitext dataset
+DEFAULT_DATASET = "bitext"
+# JSON file of further datasets: {"name": {"path": "...csv|.parquet", "description": "..."}}
+DATASETS_FILE = os.environ.get("DATASETS_FILE", os.path.join(os.path.dirname(__file__), "datasets.json"))
+# Memory budget of the loaded datasets; least recently used ones are evicted beyond it
+DATASET_MEMORY_MB = int(os.environ.get("DATASET_MEMORY_MB", "4096"))
+
+# Dataset of the current session or request
+_current_dataset: ContextVar[str] = ContextVar("current_dataset", default=DEFAULT_DATASET)
+
+class Dataset:
+    """
+    A loaded dataset with everything the tools and the pre-planning path need:
+    the query backend, the per-row indexes, the vocabularies and the resolver.
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, description: str = ""):
+        """
+        Load a dataset and build its indexes.
+
+        Args:
+            name: Registered name
+            path: CSV or Parquet file (None for the built-in dataset)
+            description: Short description shown in the UI
+        """
+        from data.dedup import get_duplicate_index
+        from data.indexes import DatasetIndex
+        from data.ingest import SegmentWatcher
+        from data.tactics import get_tactic_index
+        from data.text_stats import TextStats
+        from engine.backends import PandasBackend, QUERY_BACKEND, create_backend
+
+        self.name = name
+        self.path = path
+        self.description = description
+        # Datasets larger than RAM stay on disk and are scanned in chunks (QUERY_BACKEND=streaming);
+        # the per-row indexes are only built for in-memory datasets
+        self.in_memory = QUERY_BACKEND != "streaming"
+
+        # Prebuilt state of the built-in dataset (python -m data.bundle), so nothing is parsed or built here
+        bundle = load_bundle() if path is None and self.in_memory else None
+        if bundle is not None:
+            self.df = bundle.frame()
+            self.backend = create_backend(QUERY_BACKEND, self.df, index=bundle.dataset_index(self.df))
+            self.segment_watcher: Optional[SegmentWatcher] = SegmentWatcher(self.df)
+        elif path is None:
+            self.df = load_dataset_df() if self.in_memory else None
+            self.backend = create_backend(QUERY_BACKEND, self.df)
+            # Segments only extend the built-in dataset (see data/ingest.py)
+            self.segment_watcher = SegmentWatcher(self.df)
+            dedup_path = tactics_path = None
+        else:
+            is_parquet = path.endswith(".parquet")
+            self.in_memory = self.in_memory or not is_parquet
+            self.df = _read_dataset(path) if self.in_memory else None
+            backend = QUERY_BACKEND if is_parquet or QUERY_BACKEND == "pandas" else "pandas"
+            self.backend = create_backend(backend, self.df, [path] if is_parquet else None)
+            self.segment_watcher = None
+            dedup_path, tactics_path = f"{path}.minhash.npz", f"{path}.tactics.npz"
+
+        self.index = None
+        self.dedup_index = self.tactic_index = self.text_stats = None
+        if bundle is not None:
+            self.index = self.backend.engine.index if isinstance(self.backend, PandasBackend) else \
+                bundle.dataset_index(self.df)
+            self.dedup_index = bundle.duplicate_index()
+            self.tactic_index = bundle.tactic_index()
+            self.text_stats = bundle.text_stats()
+        elif self.in_memory:
+            # Codes and flag bitmasks of every row; the pandas backend already has them
+            self.index = (self.backend.engine.index if isinstance(self.backend, PandasBackend)
+                          else DatasetIndex(self.df))
+            # Near-duplicate clusters and response tactics, built offline with python -m data.dedup / data.tactics
+            self.dedup_index = get_duplicate_index(self.df, dedup_path)
+            self.tactic_index = get_tactic_index(self.df, tactics_path)
+            # Per-row lengths and placeholder counts of the instructions and responses
+            self.text_stats = TextStats(self.df)
+
+        self._engine = None
+        self._lock = threading.Lock()
+        self._update_vocabularies()
+        if bundle is not None:
+            self._schema_hash, self._prompt_fragments = bundle.schema_hash, bundle.prompt
+        self._measure()
+
+    def _update_vocabularies(self):
+        from data.resolver import VocabularyResolver
+
+        self.vocabularies = {column: list(self.backend.vocab[column]) for column in ("intent", "category")}
+        # Resolves free-text intent/category names locally, without an LLM round trip
+        self.resolver = VocabularyResolver(self.vocabularies)
+        self.backend.resolver = self.resolver
+        if self._engine is not None:
+            self._engine.resolver = self.resolver
+        self._schema_hash: Optional[str] = None
+        self._prompt_fragments: Optional[Dict[str, str]] = None
+        self._stats: Optional[Dict[str, int]] = None
+
+    def _measure(self):
+        """Measure the memory held by the frames, for the eviction budget."""
+        frames = {id(df): df for df in (self.df, self._engine.df if self._engine is not None else None)
+                  if df is not None}
+        self.memory_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in frames.values())
+
+    def query_engine(self):
+        """
+        Get the in-memory query engine, sharing the backend's indexes when it has
+        them. Its frame feeds in-process code execution (SANDBOX_WORKERS=0) and
+        the schema hash; it is loaded here for datasets the backend scans from
+        disk. Query plans run on the backend (see QueryBackend.execute).
+
+        Returns:
+            The QueryEngine
+        """
+        from data.indexes import DatasetIndex
+        from engine.backends import PandasBackend
+        from engine.query_engine import QueryEngine
+
+        with self._lock:
+            if self._engine is None:
+                if isinstance(self.backend, PandasBackend):
+                    self._engine = self.backend.engine
+                else:
+                    df = self.df
+                    if df is None:
+                        df = load_dataset_df() if self.path is None else _read_dataset(self.path)
+                    self._engine = QueryEngine(df, self.index or DatasetIndex(df))
+                self._engine.resolver = self.resolver
+                self._measure()
+            return self._engine
+
+    @property
+    def schema_hash(self) -> str:
+        """Hash of the schema and vocabularies, keying the code cache."""
+        if self._schema_hash is None:
+            self._schema_hash = get_schema_hash(self.query_engine().df)
+        return self._schema_hash
+
+    @property
+    def prompt_fragments(self) -> Dict[str, str]:
+        """Dataset-dependent parts of the pre-planning prompt: the dtypes and the category and intent values."""
+        if self._prompt_fragments is None:
+            self._prompt_fragments = prompt_fragments(self.query_engine().df)
+        return self._prompt_fragments
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Number of conversations, intents and categories, shown on every page of the app."""
+        if self._stats is None:
+            # Answered by the query backend, so datasets scanned from disk are never loaded here
+            self._stats = {"rows": self.backend.count(), "intents": len(self.vocabularies["intent"]),
+                           "categories": len(self.vocabularies["category"])}
+        return self._stats
+
+    def _append_rows(self, rows: Optional[pd.DataFrame]):
+        """Extend the dataset and every index with ingested rows."""
+        from engine.backends import PandasBackend
+
+        self.backend.append(rows)
+        # Query engine of the pre-planning path, when it isn't the backend's own
+        engine = self._engine if self._engine is not getattr(self.backend, "engine", None) else None
+        if self.in_memory:
+            if isinstance(self.backend, PandasBackend):
+                self.df = self.backend.engine.df
+            elif engine is not None and engine.index is self.index:
+                # The engine shares the index and extends it along with its frame
+                engine.append(rows)
+                self.df, engine = engine.df, None
+            else:
+                self.df = pd.concat([self.df, rows], ignore_index=True)
+                self.index.append(rows, self.df)
+            if self.dedup_index is not None:
+                self.dedup_index.append(len(rows))
+            self.text_stats.append(rows)
+        if engine is not None:
+            engine.append(rows)
+        self._update_vocabularies()
+        self._measure()
+
+    def refresh(self) -> bool:
+        """
+        Pick up the rows ingested since the last call, without reloading the dataset.
+
+        Cheap when nothing was ingested, so it runs before every question.
+        Near-duplicate clusters and response tactics of the new rows are computed
+        by the next offline build.
+
+        Returns:
+            Whether new rows were added
+        """
+        if self.segment_watcher is None:
+            return False
+        read_rows = self.in_memory or self._engine is not None
+        return self.segment_watcher.poll(self._append_rows, read_rows=read_rows)
+
+    def close(self):
+        """Release the resources held outside the Python heap (worker processes, mapped files)."""
+        scanner = getattr(getattr(self.backend, "engine", None), "scanner", None)
+        if scanner is not None:
+            scanner.shutdown()
+
+def _read_dataset(path: str) -> pd.DataFrame:
+    """Read a registered dataset file, checking the required columns."""
+    df = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Dataset {path} is missing required columns: {', '.join(missing_columns)}")
+    return df
+
+class DatasetCatalog:
+    """
+    Registry of the datasets a deployment serves.
+
+    Datasets are only loaded when a session first uses them, and whole
+    datasets (with their indexes) are evicted, least recently used first,
+    when the loaded ones exceed the memory budget. The dataset of the current
+    session or request is selected with use_dataset() and read with
+    current_dataset().
+    """
+
+    def __init__(self, specs: Optional[Dict[str, Dict[str, str]]] = None,
+                 memory_budget_mb: int = DATASET_MEMORY_MB):
+        """
+        Initialize the catalog.
+
+        Args:
+            specs: Map of dataset name to {"path": ..., "description": ...}
+            memory_budget_mb: Memory budget of the loaded datasets in megabytes
+        """
+        self.specs: Dict[str, Dict[str, Any]] = {
+            DEFAULT_DATASET: {"path": None, "description": "Bitext customer service conversations"}
+        }
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._loaded: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        for name, spec in (specs or {}).items():
+            self.register(name, spec["path"], spec.get("description", ""))
+
+    @classmethod
+    def from_file(cls, path: str = DATASETS_FILE) -> "DatasetCatalog":
+        """Create a catalog of the datasets listed in a JSON file (only the built-in one if it doesn't exist)."""
+        specs = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                specs = json.load(file)
+        return cls(specs)
+
+    def register(self, name: str, path: str, description: str = ""):
+        """
+        Register a dataset; it is loaded on first use.
+
+        Args:
+            name: Dataset name
+            path: CSV or Parquet file with at least the required columns
+            description: Short description shown in the UI
+        """
+        with self._lock:
+            if name in self.specs:
+                raise ValueError(f"Dataset '{name}' is already registered")
+            self.specs[name] = {"path": path, "description": description}
+
+    def names(self) -> List[str]:
+        """Names of the registered datasets, the built-in one first."""
+        return list(self.specs)
+
+    def get(self, name: str) -> Dataset:
+        """
+        Get a dataset, loading it on first use and evicting inactive ones if needed.
+
+        Args:
+            name: Dataset name
+
+        Returns:
+            The loaded dataset
+        """
+        if name not in self.specs:
+            raise ValueError(f"Unknown dataset '{name}'. Valid datasets are: {', '.join(self.specs)}")
+        with self._lock:
+            dataset = self._loaded.get(name)
+            if dataset is not None:
+                self._loaded.move_to_end(name)
+                return dataset
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        # One loader per dataset; sessions using other datasets aren't blocked
+        with loading:
+            with self._lock:
+                dataset = self._loaded.get(name)
+            if dataset is None:
+                spec = self.specs[name]
+                # Checked here rather than at registration, so a missing file doesn't break importing the tools
+                if spec["path"] is not None and not os.path.exists(spec["path"]):
+                    raise ValueError(f"Dataset file not found: {spec['path']}")
+                dataset = Dataset(name, spec["path"], spec["description"])
+                with self._lock:
+                    self._loaded[name] = dataset
+                    self._evict(keep=name)
+        return dataset
+
+    def _evict(self, keep: str):
+        """Drop least recently used datasets until the loaded ones fit the budget."""
+        while len(self._loaded) > 1 and sum(d.memory_bytes for d in self._loaded.values()) > self.memory_budget:
+            name = next(name for name in self._loaded if name != keep)
+            self._loaded.pop(name).close()
+
+    def evict(self, name: str):
+        """Drop a dataset from RAM"""
+        with self._lock:
+            dataset = self._loaded.pop(name, None)
+        if dataset is not None:
+            dataset.close()
+
+    def loaded_datasets(self) -> List[str]:
+        """Names of the datasets currently held in RAM, least recently used first"""
+        with self._lock:
+            return list(self._loaded)
+
+# Shared by all sessions in the process
+DATASET_CATALOG = DatasetCatalog.from_file()
+
+def current_dataset() -> Dataset:
+    """The dataset of the current session or request, loaded on first use."""
+    return DATASET_CATALOG.get(_current_dataset.get())
+
+def set_dataset(name: str):
+    """
+    Select the dataset of the current context (e.g. a Streamlit script run).
+
+    Args:
+        name: Dataset name
+    """
+    if name not in DATASET_CATALOG.specs:
+        raise ValueError(f"Unknown dataset '{name}'. Valid datasets are: {', '.join(DATASET_CATALOG.specs)}")
+    _current_dataset.set(name)
+
+@contextmanager
+def use_dataset(name: str) -> Iterator[Dataset]:
+    """
+    Select the dataset of a block of code, restoring the previous one afterwards.
+
+    Args:
+        name: Dataset name
+
+    Returns:
+        The dataset
+    """
+    dataset = DATASET_CATALOG.get(name)
+    token = _current_dataset.set(name)
+    try:
+        yield dataset
+    finally:
+        _current_dataset.reset(token)
@@ -0,0 +1,311 @@
+from typing import Dict, List, Optional, Tuple
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Text columns that get near-duplicate clusters
+DEDUP_COLUMNS = ["instruction", "response"]
+
+# Words per shingle
+SHINGLE_SIZE = 3
+# MinHash signature length, split into LSH bands of NUM_PERM // NUM_BANDS rows;
+# 16 bands of 8 rows catch pairs above ~0.7 Jaccard similarity
+NUM_PERM = 128
+NUM_BANDS = 16
+# Estimated Jaccard similarity above which two texts are near-duplicates
+SIMILARITY_THRESHOLD = 0.8
+# Documents hashed per chunk, to bound memory on large datasets
+CHUNK_SIZE = 50000
+SEED = 1
+
+def get_dedup_path() -> str:
+    """
+    Get the path of the persisted near-duplicate clusters.
+
+    Returns:
+        Path next to the dataset cache
+    """
+    return os.path.join(os.path.dirname(__file__), "customer_service_data.minhash.npz")
+
+def fingerprint(df: pd.DataFrame, columns: List[str] = DEDUP_COLUMNS) -> int:
+    """Content hash of the deduplicated columns, to detect a stale index."""
+    return int(pd.util.hash_pandas_object(df[columns], index=False).sum())
+
+def _shingle_hashes(texts: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hash the word shingles of a batch of texts.
+
+    Returns:
+        32-bit shingle hashes of all texts concatenated, and the offset of
+        each text's first shingle. Every text has at least one shingle.
+    """
+    words = texts.fillna("").astype(str).str.lower().str.findall(r"\w+")
+    lengths = words.str.len().to_numpy()
+    flat = words.explode().dropna().to_numpy(dtype=object)
+    doc_of_word = np.repeat(np.arange(len(texts)), lengths)
+    word_hashes = pd.util.hash_array(flat) if len(flat) else np.empty(0, dtype=np.uint64)
+
+    # A shingle starts at every word followed by SHINGLE_SIZE - 1 words of the same text
+    shingles = word_hashes.copy()
+    starts = np.ones(len(word_hashes), dtype=bool)
+    for k in range(1, SHINGLE_SIZE):
+        shifted = np.zeros(len(word_hashes), dtype=np.uint64)
+        shifted[:-k] = word_hashes[k:]
+        same_text = np.zeros(len(word_hashes), dtype=bool)
+        same_text[:-k] = doc_of_word[k:] == doc_of_word[:-k]
+        shingles = shingles * np.uint64(0x9E3779B97F4A7C15) + shifted
+        starts &= same_text
+    hashes, docs = [shingles[starts]], [doc_of_word[starts]]
+
+    # Texts shorter than a shingle (including empty ones) are a single shingle
+    short = np.flatnonzero(lengths < SHINGLE_SIZE)
+    if len(short):
+        hashes.append(pd.util.hash_array(words.iloc[short].str.join(" ").to_numpy(dtype=object)))
+        docs.append(short)
+
+    hashes, docs = np.concatenate(hashes), np.concatenate(docs)
+    order = np.argsort(docs, kind="stable")
+    offsets = np.searchsorted(docs[order], np.arange(len(texts)))
+    return hashes[order] >> np.uint64(32), offsets
+
+def minhash_signatures(texts: pd.Series, num_perm: int = NUM_PERM, seed: int = SEED) -> np.ndarray:
+    """
+    Compute the MinHash signatures of texts.
+
+    Each permutation is a multiply-shift hash of the 32-bit shingle hashes,
+    evaluated over all shingles of a chunk at once and reduced per text.
+
+    Args:
+        texts: Texts to sign
+        num_perm: Signature length
+        seed: Seed of the hash permutations
+
+    Returns:
+        uint32 array of shape (len(texts), num_perm)
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for start in range(0, len(texts), CHUNK_SIZE):
+        hashes, offsets = _shingle_hashes(texts.iloc[start:start + CHUNK_SIZE])
+        for j in range(num_perm):
+            permuted = ((a[j] * hashes + b[j]) >> np.uint64(32)).astype(np.uint32)
+            signatures[start:start + len(offsets), j] = np.minimum.reduceat(permuted, offsets)
+    return signatures
+
+def lsh_clusters(signatures: np.ndarray, num_bands: int = NUM_BANDS,
+                 threshold: float = SIMILARITY_THRESHOLD) -> np.ndarray:
+    """
+    Group near-duplicate rows with locality-sensitive hashing.
+
+    Rows whose signatures agree on a whole band land in the same bucket. Each
+    row is only compared with the first row of its bucket, so the work is
+    linear in the number of rows per band, and pairs whose estimated similarity
+    passes the threshold are merged by label propagation.
+
+    Args:
+        signatures: MinHash signatures, one row per text
+        num_bands: Number of LSH bands
+        threshold: Minimum estimated Jaccard similarity of a duplicate pair
+
+    Returns:
+        Cluster label of every row: the smallest row position in its cluster
+    """
+    num_rows, num_perm = signatures.shape
+    rows_per_band = num_perm // num_bands
+    sources, targets = [], []
+    for band in range(num_bands):
+        block = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        keys = pd.util.hash_pandas_object(pd.DataFrame(block), index=False).to_numpy()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        leaders = first[inverse]
+        candidates = np.flatnonzero(leaders != np.arange(num_rows))
+        if not len(candidates):
+            continue
+        similarity = (signatures[candidates] == signatures[leaders[candidates]]).mean(axis=1)
+        keep = similarity >= threshold
+        sources.append(candidates[keep])
+        targets.append(leaders[candidates][keep])
+
+    labels = np.arange(num_rows)
+    if not sources:
+        return labels
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, sources, labels[targets])
+        np.minimum.at(labels, targets, labels[sources])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+class DuplicateIndex:
+    """
+    Near-duplicate clusters of the text columns, built with MinHash and LSH.
+
+    Every row of a deduplicated column has a cluster label (the first row of
+    its cluster). The samplers of engine/sampling.py use the labels to pick
+    at most one row per cluster, so templated texts don't use up a sample.
+    """
+
+    def __init__(self, labels: Dict[str, np.ndarray]):
+        """
+        Initialize the index.
+
+        Args:
+            labels: Map of column name to the cluster label of every row
+        """
+        self.labels = labels
+        # Rows clustered by the build; rows appended later are clusters of their own
+        self.num_built = len(next(iter(labels.values()))) if labels else 0
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: List[str] = DEDUP_COLUMNS) -> "DuplicateIndex":
+        """
+        Build the clusters of the given columns.
+
+        Args:
+            df: The dataset
+            columns: Text columns to deduplicate
+
+        Returns:
+            The index
+        """
+        return cls({column: lsh_clusters(minhash_signatures(df[column])) for column in columns})
+
+    def append(self, num_rows: int):
+        """
+        Label rows appended to the dataset as clusters of their own.
+
+        Their near-duplicates are found by the next offline build (python -m data.dedup).
+
+        Args:
+            num_rows: Number of new rows
+        """
+        self.labels = {
+            column: np.concatenate([labels, np.arange(len(labels), len(labels) + num_rows, dtype=labels.dtype)])
+            for column, labels in self.labels.items()
+        }
+
+    def save(self, path: str, df: pd.DataFrame):
+        """Persist the labels of the rows of df they were built from, replacing the file atomically."""
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_path, fingerprint=np.uint64(fingerprint(df)),
+                            **{f"labels_{column}": labels for column, labels in self.labels.items()})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, df: Optional[pd.DataFrame] = None) -> Optional["DuplicateIndex"]:
+        """
+        Load persisted labels.
+
+        Args:
+            path: File of the labels
+            df: The dataset; the labels must have been built from its first rows,
+                and its later (ingested) rows are appended as clusters of their own.
+                Not checked if None.
+
+        Returns:
+            The index, or None if missing or built from other data
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as stored:
+            index = cls({key[len("labels_"):]: stored[key] for key in stored.files if key.startswith("labels_")})
+            stored_fingerprint = int(stored["fingerprint"])
+        if df is not None:
+            if index.num_built > len(df) or fingerprint(df.iloc[:index.num_built]) != stored_fingerprint:
+                return None
+            index.append(len(df) - index.num_built)
+        return index
+
+    def clusters(self, column: str, positions: Optional[np.ndarray] = None, top_n: int = 10,
+                 min_size: int = 2) -> List[Dict[str, object]]:
+        """
+        Get the largest near-duplicate clusters among some rows.
+
+        Args:
+            column: Deduplicated column
+            positions: Optional row positions to restrict the clusters to
+            top_n: Number of clusters
+            min_size: Minimum number of rows in a cluster
+
+        Returns:
+            Clusters, largest first, with their size and first row positions
+        """
+        positions = np.arange(len(self.labels[column])) if positions is None else positions
+        labels = self.labels[column][positions]
+        order = np.argsort(labels, kind="stable")
+        values, starts, sizes = np.unique(labels[order], return_index=True, return_counts=True)
+        ranked = np.lexsort((values, -sizes))
+        result = []
+        for i in ranked[:top_n]:
+            if sizes[i] < min_size:
+                break
+            members = positions[order[starts[i]:starts[i] + sizes[i]]]
+            result.append({"size": int(sizes[i]), "positions": members[:5]})
+        return result
+
+    def duplicate_ratio(self, column: str, positions: Optional[np.ndarray] = None) -> float:
+        """Share of rows that are a near-duplicate of an earlier row."""
+        labels = self.labels[column] if positions is None else self.labels[column][positions]
+        return 0.0 if len(labels) == 0 else 1 - len(np.unique(labels)) / len(labels)
+
+def get_duplicate_index(df: pd.DataFrame, path: Optional[str] = None) -> Optional[DuplicateIndex]:
+    """
+    Load the near-duplicate index of the dataset. It is only built offline
+    (python -m data.dedup or data.bundle); rows ingested since the build are
+    clusters of their own until the next build.
+
+    Args:
+        df: The dataset
+        path: Where the index is persisted (the cache of the built-in dataset if omitted)
+
+    Returns:
+        The index, or None if none was built from this data
+    """
+    path = path or get_dedup_path()
+    index = DuplicateIndex.load(path, df)
+    if index is None:
+        print(f"No near-duplicate index matches the data in {path}; build it with python -m data.dedup")
+    return index
+
+def build_duplicate_index(df: pd.DataFrame, path: Optional[str] = None) -> DuplicateIndex:
+    """
+    Offline build: reuse the persisted index if it covers exactly these rows,
+    otherwise build and persist it.
+
+    Args:
+        df: The dataset
+        path: Where the index is persisted (the cache of the built-in dataset if omitted)
+
+    Returns:
+        The index
+    """
+    path = path or get_dedup_path()
+    index = DuplicateIndex.load(path, df)
+    if index is None or index.num_built != len(df):
+        index = DuplicateIndex.build(df)
+        index.save(path, df)
+    return index
+
+if __name__ == "__main__":
+    # Offline build: python -m data.dedup [--dataset NAME]
+    import argparse
+    from data.catalog import DATASET_CATALOG, DEFAULT_DATASET, _read_dataset
+    from data.download_dataset import load_dataset_df
+
+    parser = argparse.ArgumentParser(description="Build the near-duplicate clusters of a dataset")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Registered dataset (the built-in one by default)")
+    args = parser.parse_args()
+    path = DATASET_CATALOG.specs[args.dataset]["path"]
+    df = load_dataset_df() if path is None else _read_dataset(path)
+    index = DuplicateIndex.build(df)
+    index.save(get_dedup_path() if path is None else f"{path}.minhash.npz", df)
+    for column in index.labels:
+        print(f"{column}: {index.duplicate_ratio(column):.1%} near-duplicate rows, "
+              f"{len(index.clusters(column, top_n=len(df)))} clusters with duplicates", file=sys.stdout)
@@ -1,15 +1,31 @@
 import pandas as pd
 import os
-from datasets import load_dataset
+import hashlib
+import json
 
-def load_dataset_df():
+# Columns every row of the dataset must have
+REQUIRED_COLUMNS = ["category", "intent", "instruction", "response"]
+
+def get_csv_path():
+    """
+    Get the path of the local CSV copy of the dataset.
+    
+    Returns:
+        str: Path of the CSV file
+    """
+    return os.path.join(os.path.dirname(__file__), "customer_service_data.csv")
+
+def load_dataset_df(include_segments=True):
     """
     Load the dataset from a local CSV file or from Hugging Face if the CSV doesn't exist.
     
+    Args:
+        include_segments: Whether to append the rows ingested since (see data/ingest.py)
+    
     Returns:
         pandas.DataFrame: The loaded dataset
     """
-    csv_path = os.path.join(os.path.dirname(__file__), "customer_service_data.csv")
+    csv_path = get_csv_path()
     
     # Check if the CSV file exists
     if os.path.exists(csv_path):
@@ -19,7 +35,8 @@ def load_dataset_df():
     else:
         print("Local CSV file not found. Loading dataset from Hugging Face...")
         try:
-            # Fall back to loading from Hugging Face
+            # Fall back to loading from Hugging Face; `datasets` is slow to import, so only here
+            from datasets import load_dataset
             df = load_dataset("bitext/Bitext-customer-support-llm-chatbot-training-dataset", split="train").to_pandas()
             
             # Save to CSV for future use
@@ -29,10 +46,90 @@ def load_dataset_df():
             raise Exception(f"Failed to load dataset from Hugging Face: {str(e)}")
     
     # Ensure required columns exist
-    required_columns = ["category", "intent", "instruction", "response"]
-    missing_columns = [col for col in required_columns if col not in df.columns]
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
     
     if missing_columns:
         raise ValueError(f"Dataset is missing required columns: {', '.join(missing_columns)}")
     
+    if include_segments:
+        df = _append_segments(df)
     return df
+
+def _append_segments(df):
+    """Append the ingested segments to the base dataset, recording how many in df.attrs."""
+    from data.ingest import SEGMENTS_ATTR, read_manifest, read_segments
+    
+    segments = read_manifest()["segments"]
+    if segments:
+        df = pd.concat([df, read_segments(segments)], ignore_index=True)
+    df.attrs[SEGMENTS_ATTR] = len(segments)
+    return df
+
+def get_parquet_path():
+    """
+    Get the path of the columnar (Parquet) cache of the dataset.
+    
+    Returns:
+        str: Path of the Parquet cache next to the CSV file
+    """
+    return os.path.join(os.path.dirname(__file__), "customer_service_data.parquet")
+
+def ensure_parquet_cache():
+    """
+    Write the Parquet cache of the dataset if it doesn't exist yet.
+    
+    Returns:
+        str: Path of the Parquet cache, or None if pyarrow is not available
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    
+    parquet_path = get_parquet_path()
+    if not os.path.exists(parquet_path):
+        # The cache only holds the base dataset, segments stay in their own files
+        df = load_dataset_df(include_segments=False)
+        print(f"Saving dataset to Parquet cache: {parquet_path}")
+        # Write to a temporary file first so concurrent readers never see a partial file
+        tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+def load_dataset_mmap():
+    """
+    Load the dataset from the warm-start bundle or the Parquet cache using memory mapping.
+    Falls back to load_dataset_df() when pyarrow is not available.
+    
+    Returns:
+        pandas.DataFrame: The loaded dataset
+    """
+    from data.bundle import load_bundle
+    
+    bundle = load_bundle()
+    if bundle is not None:
+        return bundle.frame()
+    parquet_path = ensure_parquet_cache()
+    if parquet_path is None:
+        return load_dataset_df()
+    
+    import pyarrow.parquet as pq
+    return _append_segments(pq.read_table(parquet_path, memory_map=True).to_pandas())
+
+def get_schema_hash(df):
+    """
+    Get a hash of the dataset schema: columns, dtypes and the category/intent vocabularies.
+    
+    Args:
+        df: The dataset
+        
+    Returns:
+        str: Hex digest identifying the schema
+    """
+    schema = {
+        "dtypes": {column: str(dtype) for column, dtype in df.dtypes.items()},
+        "categories": sorted(df['category'].dropna().unique().tolist()),
+        "intents": sorted(df['intent'].dropna().unique().tolist())
+    }
+    return hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,407 @@
+from typing import Dict, List, Iterable, Optional
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Low-cardinality columns that get precomputed indexes
+INDEXED_COLUMNS = ["category", "intent"]
+
+class DatasetIndex:
+    """
+    Precomputed indexes and aggregates over the dataset.
+
+    For every indexed column this keeps the dictionary-encoded codes of each
+    row, the sorted vocabulary, the row positions of every value and the value
+    counts, so filters and counts on these columns never scan the strings.
+    The linguistic flags are kept as a per-row bitmask (see FlagIndex).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Build the indexes.
+
+        Args:
+            df: The dataset
+        """
+        self.df = df
+        self.num_rows = len(df)
+        self.codes: Dict[str, np.ndarray] = {}
+        self.vocab: Dict[str, List[str]] = {}
+        self.positions: Dict[str, Dict[str, np.ndarray]] = {}
+        self.counts: Dict[str, np.ndarray] = {}
+
+        for column in INDEXED_COLUMNS:
+            codes, uniques = pd.factorize(df[column], sort=True)
+            codes = codes.astype(np.int32)
+            vocab = [str(value) for value in uniques]
+
+            # Group row positions by code with one stable sort
+            order = np.argsort(codes, kind="stable").astype(np.int64)
+            bounds = np.searchsorted(codes[order], np.arange(len(vocab) + 1))
+
+            self.codes[column] = codes
+            self.vocab[column] = vocab
+            self.positions[column] = {
+                value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(vocab)
+            }
+            self.counts[column] = np.diff(bounds)
+
+        # Bitmask of the linguistic flags of every row
+        self.flags: Optional[FlagIndex] = FlagIndex(df["flags"]) if "flags" in df.columns else None
+
+    def append(self, rows: pd.DataFrame, df: Optional[pd.DataFrame] = None):
+        """
+        Extend the indexes with rows appended to the end of the dataset.
+
+        Only the new rows are encoded; the old codes are remapped with one
+        lookup when a new value enters the (sorted) vocabulary.
+
+        Args:
+            rows: The new rows
+            df: The dataset including the new rows (concatenated here if not given)
+        """
+        start = self.num_rows
+        codes, vocab, positions, counts = {}, {}, {}, {}
+        for column in INDEXED_COLUMNS:
+            old_vocab = self.vocab[column]
+            merged = sorted(set(old_vocab) | {str(value) for value in rows[column].dropna().unique()})
+            old_codes = self.codes[column]
+            if len(merged) != len(old_vocab):
+                # Old code -> new code; -1 (missing) maps to the last slot and stays -1
+                lookup = np.append(np.searchsorted(merged, old_vocab), -1).astype(np.int32)
+                old_codes = lookup[old_codes]
+            values = rows[column].astype(str).where(rows[column].notna())
+            new_codes = pd.Index(merged).get_indexer(values).astype(np.int32)
+
+            order = np.argsort(new_codes, kind="stable").astype(np.int64)
+            bounds = np.searchsorted(new_codes[order], np.arange(len(merged) + 1))
+            column_positions = {}
+            for i, value in enumerate(merged):
+                old = self.positions[column].get(value)
+                new = order[bounds[i]:bounds[i + 1]] + start
+                column_positions[value] = new if old is None else np.concatenate([old, new])
+
+            codes[column] = np.concatenate([old_codes, new_codes])
+            vocab[column] = merged
+            positions[column] = column_positions
+            counts[column] = np.array([len(column_positions[value]) for value in merged], dtype=np.int64)
+
+        if self.flags is not None:
+            self.flags.append(rows["flags"])
+        # Swap everything in at once, so readers never mix old and new structures
+        self.codes, self.vocab, self.positions, self.counts = codes, vocab, positions, counts
+        self.df = pd.concat([self.df, rows], ignore_index=True) if df is None else df
+        self.num_rows = start + len(rows)
+
+    def save(self, directory: str):
+        """
+        Write the index as .npy files that load() memory-maps, plus a JSON file of the vocabularies.
+
+        Args:
+            directory: Existing directory to write to
+        """
+        for column in INDEXED_COLUMNS:
+            order = [self.positions[column][value] for value in self.vocab[column]]
+            np.save(os.path.join(directory, f"codes_{column}.npy"), self.codes[column])
+            np.save(os.path.join(directory, f"order_{column}.npy"),
+                    np.concatenate(order) if order else np.empty(0, dtype=np.int64))
+            np.save(os.path.join(directory, f"counts_{column}.npy"), self.counts[column])
+        meta = {"num_rows": self.num_rows, "vocab": self.vocab, "flag_bits": None}
+        if self.flags is not None:
+            np.save(os.path.join(directory, "flag_masks.npy"), self.flags.masks)
+            meta["flag_bits"] = self.flags.bits
+        with open(os.path.join(directory, "index.json"), "w") as file:
+            json.dump(meta, file)
+
+    @classmethod
+    def load(cls, directory: str, df: pd.DataFrame) -> "DatasetIndex":
+        """
+        Load an index written by save(), memory-mapping its arrays.
+
+        Args:
+            directory: Directory written by save()
+            df: The dataset the index was built from
+
+        Returns:
+            The index
+        """
+        with open(os.path.join(directory, "index.json")) as file:
+            meta = json.load(file)
+        index = cls.__new__(cls)
+        index.df = df
+        index.num_rows = meta["num_rows"]
+        index.codes, index.vocab, index.positions, index.counts = {}, {}, {}, {}
+        for column in INDEXED_COLUMNS:
+            counts = np.load(os.path.join(directory, f"counts_{column}.npy"))
+            order = np.load(os.path.join(directory, f"order_{column}.npy"), mmap_mode="r")
+            bounds = np.concatenate([[0], np.cumsum(counts)])
+            vocab = meta["vocab"][column]
+            index.codes[column] = np.load(os.path.join(directory, f"codes_{column}.npy"), mmap_mode="r")
+            index.vocab[column] = vocab
+            index.positions[column] = {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(vocab)}
+            index.counts[column] = counts
+        index.flags = None
+        if meta["flag_bits"] is not None:
+            index.flags = FlagIndex.from_masks(np.load(os.path.join(directory, "flag_masks.npy"), mmap_mode="r"),
+                                               meta["flag_bits"])
+        return index
+
+    def code_of(self, column: str, value: str) -> int:
+        """
+        Get the code of a value in an indexed column.
+
+        Args:
+            column: Indexed column name
+            value: Value to look up
+
+        Returns:
+            The code, or -1 if the value doesn't exist
+        """
+        vocab = self.vocab[column]
+        i = int(np.searchsorted(vocab, value))
+        return i if i < len(vocab) and vocab[i] == value else -1
+
+    def mask_for(self, column: str, values: Iterable[str]) -> np.ndarray:
+        """
+        Get a boolean row mask of the rows whose column is one of the values.
+
+        Args:
+            column: Indexed column name
+            values: Values to match
+
+        Returns:
+            Boolean array with one entry per row
+        """
+        codes = [self.code_of(column, value) for value in values]
+        lookup = np.zeros(len(self.vocab[column]) + 1, dtype=bool)
+        for code in codes:
+            if code >= 0:
+                lookup[code] = True
+        # Missing values have code -1, which maps to the last (always False) slot
+        return lookup[self.codes[column]]
+
+    def positions_for(self, column: str, values: Iterable[str]) -> np.ndarray:
+        """
+        Get the sorted row positions of the rows whose column is one of the values.
+
+        Args:
+            column: Indexed column name
+            values: Values to match
+
+        Returns:
+            Sorted array of row positions
+        """
+        parts = [self.positions[column][value] for value in values if value in self.positions[column]]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def value_counts(self, column: str, positions: np.ndarray = None) -> pd.Series:
+        """
+        Count the values of an indexed column, optionally within a subset of rows.
+
+        Args:
+            column: Indexed column name
+            positions: Optional row positions to restrict the counts to
+
+        Returns:
+            Series of counts indexed by value, most frequent first
+        """
+        if positions is None:
+            counts = self.counts[column]
+        else:
+            codes = self.codes[column][positions]
+            counts = np.bincount(codes[codes >= 0], minlength=len(self.vocab[column]))
+        series = pd.Series(counts, index=pd.Index(self.vocab[column], name=column), name="count")
+        series = series[series > 0]
+        return series.sort_values(ascending=False, kind="stable")
+
+    def flag_crosstab(self, column: str, positions: Optional[np.ndarray] = None,
+                      per_flag: bool = False) -> pd.DataFrame:
+        """
+        Cross-tabulate the flags of the rows against an indexed column.
+
+        Args:
+            column: Indexed column name (intent or category)
+            positions: Optional row positions to restrict the counts to
+            per_flag: Count every flag on its own instead of whole flag combinations
+
+        Returns:
+            DataFrame with flags, column value and count, most frequent first
+        """
+        if self.flags is None:
+            raise ValueError("The dataset has no flags column")
+        masks = self.flags.masks if positions is None else self.flags.masks[positions]
+        codes = self.codes[column] if positions is None else self.codes[column][positions]
+        valid = codes >= 0
+        masks, codes = masks[valid], codes[valid].astype(np.int64)
+        num_values = len(self.vocab[column])
+
+        if per_flag:
+            groups, labels = [], []
+            for letter in self.flags.letters:
+                has_flag = (masks & np.uint32(self.flags.bits[letter])) != 0
+                groups.append(np.bincount(codes[has_flag], minlength=num_values))
+                labels.append(letter)
+            counts = np.stack(groups) if groups else np.zeros((0, num_values), dtype=np.int64)
+            flag_idx, value_idx = np.nonzero(counts)
+            frame = pd.DataFrame({
+                "flags": [labels[i] for i in flag_idx],
+                column: [self.vocab[column][i] for i in value_idx],
+                "count": counts[flag_idx, value_idx],
+            })
+        else:
+            # One key per (combination, value) pair, counted in a single pass
+            keys, counts = np.unique(masks.astype(np.int64) * num_values + codes, return_counts=True)
+            frame = pd.DataFrame({
+                "flags": [self.flags.describe(int(mask)) for mask in keys // num_values],
+                column: [self.vocab[column][i] for i in keys % num_values],
+                "count": counts,
+            })
+        return frame.sort_values(["count", "flags", column], ascending=[False, True, True],
+                                 kind="stable").reset_index(drop=True)
+
+# Linguistic variation tags of the Bitext dataset, one letter per tag
+FLAG_NAMES = {
+    "B": "basic",
+    "C": "coordinated",
+    "E": "abbreviation",
+    "I": "interrogative",
+    "K": "keyword",
+    "L": "semantic_variation",
+    "M": "morphological_variation",
+    "N": "negation",
+    "P": "polite",
+    "Q": "colloquial",
+    "W": "offensive",
+    "Z": "typo",
+}
+
+class FlagIndex:
+    """
+    Per-row bitmask of the linguistic flags column.
+
+    Every flag letter gets one bit, so "rows with flags Q and Z but not W" is
+    a single vectorized bitwise test over a uint32 array instead of string
+    matching. Each distinct flags string is decoded once and the masks of the
+    rows are gathered through its factorized codes.
+    """
+
+    def __init__(self, flags: pd.Series):
+        """
+        Decode the flags column.
+
+        Args:
+            flags: The flags column, one string of flag letters per row
+        """
+        codes, uniques = pd.factorize(flags.fillna(""))
+        letters = sorted(set(FLAG_NAMES) | {letter for value in uniques for letter in str(value)})
+        if len(letters) > 32:
+            raise ValueError(f"Too many distinct flags for a 32-bit mask: {''.join(letters)}")
+
+        self.letters: List[str] = letters
+        self.bits: Dict[str, int] = {letter: 1 << i for i, letter in enumerate(letters)}
+        self._by_name = {name: letter for letter, name in FLAG_NAMES.items()}
+
+        lookup = np.array(
+            [sum(self.bits[letter] for letter in set(str(value))) for value in uniques], dtype=np.uint32
+        )
+        self.masks: np.ndarray = lookup[codes] if len(lookup) else np.zeros(len(flags), dtype=np.uint32)
+
+    @classmethod
+    def from_masks(cls, masks: np.ndarray, bits: Dict[str, int]) -> "FlagIndex":
+        """
+        Restore a decoded flags column.
+
+        Args:
+            masks: Bitmask of every row
+            bits: Bit of every flag letter
+
+        Returns:
+            The index
+        """
+        index = cls.__new__(cls)
+        index.bits = dict(bits)
+        index.letters = sorted(index.bits)
+        index._by_name = {name: letter for letter, name in FLAG_NAMES.items()}
+        index.masks = masks
+        return index
+
+    def append(self, flags: pd.Series):
+        """
+        Decode the flags of rows appended to the dataset.
+
+        New letters get the next free bits, so the masks of the old rows stay valid.
+
+        Args:
+            flags: The flags column of the new rows
+        """
+        codes, uniques = pd.factorize(flags.fillna(""))
+        new_letters = sorted({letter for value in uniques for letter in str(value)} - set(self.letters))
+        if len(self.letters) + len(new_letters) > 32:
+            raise ValueError(f"Too many distinct flags for a 32-bit mask: {''.join(self.letters + new_letters)}")
+        for letter in new_letters:
+            self.bits[letter] = 1 << len(self.bits)
+        self.letters = sorted(self.bits)
+
+        lookup = np.array(
+            [sum(self.bits[letter] for letter in set(str(value))) for value in uniques], dtype=np.uint32
+        )
+        new_masks = lookup[codes] if len(lookup) else np.zeros(len(flags), dtype=np.uint32)
+        self.masks = np.concatenate([self.masks, new_masks])
+
+    def legend(self) -> Dict[str, str]:
+        """Flag letters and their meaning."""
+        return {letter: FLAG_NAMES.get(letter, letter) for letter in self.letters}
+
+    def mask_of(self, flags: Iterable[str]) -> int:
+        """
+        Get the bitmask of flags given as letters ("Q") or names ("colloquial").
+
+        Args:
+            flags: Flag letters or names
+
+        Returns:
+            The combined bitmask
+        """
+        mask = 0
+        for flag in flags:
+            key = str(flag).strip()
+            letter = key.upper() if len(key) == 1 else self._by_name.get(key.lower().replace(" ", "_"))
+            if letter not in self.bits:
+                raise ValueError(f"Unknown flag '{flag}'. Valid flags are: "
+                                 f"{', '.join(f'{l} ({n})' for l, n in self.legend().items())}")
+            mask |= self.bits[letter]
+        return mask
+
+    def describe(self, mask: int) -> str:
+        """Flag letters of a bitmask, e.g. 'BQZ'."""
+        return "".join(letter for letter in self.letters if mask & self.bits[letter])
+
+    def match(self, flags: Iterable[str], mode: str = "all", positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get a boolean mask of the rows matching a set of flags.
+
+        Args:
+            flags: Flag letters or names
+            mode: 'all' (every flag set), 'any' (at least one set), 'none' (none set)
+                or 'exact' (exactly this combination)
+            positions: Optional row positions to restrict the test to
+
+        Returns:
+            Boolean array with one entry per row (or per position)
+        """
+        wanted = np.uint32(self.mask_of(flags))
+        masks = self.masks if positions is None else self.masks[positions]
+        if mode == "all":
+            return (masks & wanted) == wanted
+        if mode == "any":
+            return (masks & wanted) != 0
+        if mode == "none":
+            return (masks & wanted) == 0
+        if mode == "exact":
+            return masks == wanted
+        raise ValueError(f"Unknown flag match mode '{mode}'. Valid modes are: all, any, none, exact")
@@ -0,0 +1,212 @@
+from typing import Callable, Dict, List, Optional
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from data.download_dataset import REQUIRED_COLUMNS, ensure_parquet_cache, get_csv_path
+
+# Directory of the ingested segments and their manifest, next to the dataset cache
+SEGMENTS_DIR = os.environ.get(
+    "SEGMENTS_DIR", os.path.join(os.path.dirname(__file__), "customer_service_data.segments")
+)
+MANIFEST_NAME = "manifest.json"
+# Rows per segment when ingesting a large file from the command line
+INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", "1000000"))
+# Key of DataFrame.attrs holding the number of segments a loaded frame includes
+SEGMENTS_ATTR = "segments"
+
+def _manifest_path() -> str:
+    return os.path.join(SEGMENTS_DIR, MANIFEST_NAME)
+
+def read_manifest() -> Dict:
+    """
+    Read the manifest of the ingested segments.
+
+    Returns:
+        Dictionary with the dataset version and the segments, oldest first
+    """
+    try:
+        with open(_manifest_path()) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"version": "base", "rows": 0, "segments": []}
+
+def segment_paths(segments: Optional[List[Dict]] = None) -> List[str]:
+    """Paths of the segment files, all of them by default."""
+    segments = read_manifest()["segments"] if segments is None else segments
+    return [os.path.join(SEGMENTS_DIR, segment["file"]) for segment in segments]
+
+def dataset_files() -> List[str]:
+    """
+    Get the Parquet files of the whole dataset: the cache, then every segment.
+
+    Returns:
+        Paths of the files, in row order, or an empty list if pyarrow is not available
+    """
+    parquet_path = ensure_parquet_cache()
+    if parquet_path is None:
+        return []
+    return [parquet_path] + segment_paths()
+
+def read_segments(segments: List[Dict]) -> pd.DataFrame:
+    """
+    Read segments into one frame.
+
+    Args:
+        segments: Manifest entries of the segments
+
+    Returns:
+        Their rows, in ingestion order
+    """
+    frames = []
+    for path in segment_paths(segments):
+        frames.append(pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path))
+    return pd.concat(frames, ignore_index=True)
+
+def _base_columns() -> List[str]:
+    """Columns of the base dataset, read from the header of its CSV file."""
+    return pd.read_csv(get_csv_path(), nrows=0).columns.tolist()
+
+def _validate(rows: pd.DataFrame) -> pd.DataFrame:
+    """Check new rows against the dataset schema and bring them into its column order."""
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in rows.columns]
+    if missing_columns:
+        raise ValueError(f"Rows are missing required columns: {', '.join(missing_columns)}")
+    columns = _base_columns()
+    unknown_columns = [col for col in rows.columns if col not in columns]
+    if unknown_columns:
+        raise ValueError(f"Rows have unknown columns: {', '.join(unknown_columns)}")
+    if rows[REQUIRED_COLUMNS].isna().any().any():
+        raise ValueError(f"Required columns can't be empty: {', '.join(REQUIRED_COLUMNS)}")
+    rows = rows.reindex(columns=columns).reset_index(drop=True)
+    if "flags" in rows.columns:
+        rows["flags"] = rows["flags"].fillna("")
+    return rows
+
+def _write_segment(rows: pd.DataFrame, name: str) -> str:
+    """Write a segment file, in the schema of the Parquet cache when pyarrow is available."""
+    parquet_path = ensure_parquet_cache()
+    if parquet_path is None:
+        file_name = f"{name}.csv"
+        tmp_path = os.path.join(SEGMENTS_DIR, f"{file_name}.tmp")
+        rows.to_csv(tmp_path, index=False)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        file_name = f"{name}.parquet"
+        tmp_path = os.path.join(SEGMENTS_DIR, f"{file_name}.tmp")
+        schema = pq.read_schema(parquet_path).remove_metadata()
+        pq.write_table(pa.Table.from_pandas(rows, schema=schema, preserve_index=False), tmp_path)
+    os.replace(tmp_path, os.path.join(SEGMENTS_DIR, file_name))
+    return file_name
+
+def ingest(rows: pd.DataFrame) -> Dict:
+    """
+    Append rows to the dataset as a new immutable segment.
+
+    The segment is written next to the dataset cache and recorded in the
+    manifest, whose version hash chains the hashes of all segments. Running
+    processes pick the rows up through their SegmentWatcher.
+
+    Args:
+        rows: New rows, with at least the required columns
+
+    Returns:
+        Manifest entry of the segment, with the new dataset version
+    """
+    rows = _validate(rows)
+    if rows.empty:
+        raise ValueError("No rows to ingest")
+    os.makedirs(SEGMENTS_DIR, exist_ok=True)
+
+    # One writer at a time: the manifest is read, extended and replaced under the lock
+    with open(os.path.join(SEGMENTS_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = read_manifest()
+        content_hash = hashlib.sha1(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes()).hexdigest()
+        name = f"segment-{len(manifest['segments']) + 1:06d}-{content_hash[:8]}"
+        segment = {"file": _write_segment(rows, name), "rows": len(rows), "sha1": content_hash,
+                   "created": time.time()}
+
+        manifest["segments"].append(segment)
+        manifest["rows"] += len(rows)
+        manifest["version"] = hashlib.sha1(f"{manifest['version']}:{content_hash}".encode()).hexdigest()
+        tmp_path = f"{_manifest_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_path, _manifest_path())
+    return {**segment, "version": manifest["version"]}
+
+class SegmentWatcher:
+    """
+    Tracks the segments a process has applied to its in-memory dataset.
+
+    poll() is cheap when nothing was ingested (one stat of the manifest), so
+    it can run before every request; new segments are handed to a callback
+    that appends them to the indexes, exactly once even with several threads.
+    """
+
+    def __init__(self, df: Optional[pd.DataFrame] = None):
+        """
+        Initialize the watcher.
+
+        Args:
+            df: The dataset as loaded by load_dataset_df (its attrs say which segments it includes),
+                or None for processes that read the segment files on disk directly
+        """
+        manifest = read_manifest()
+        self.applied = len(manifest["segments"]) if df is None else df.attrs.get(SEGMENTS_ATTR, 0)
+        self.version = manifest["version"] if self.applied else "base"
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def poll(self, apply: Callable[[Optional[pd.DataFrame]], None], read_rows: bool = True) -> bool:
+        """
+        Apply the segments ingested since the last poll.
+
+        Args:
+            apply: Callback receiving the new rows
+            read_rows: Whether to read the new rows (otherwise apply receives None)
+
+        Returns:
+            Whether new rows were applied
+        """
+        try:
+            stat = os.stat(_manifest_path())
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return False
+        with self._lock:
+            manifest = read_manifest()
+            segments = manifest["segments"][self.applied:]
+            if segments:
+                apply(read_segments(segments) if read_rows else None)
+                self.applied += len(segments)
+                self.version = manifest["version"]
+            self._stamp = stamp
+            return bool(segments)
+
+def iter_file_chunks(path: str, chunk_rows: int = INGEST_CHUNK_ROWS):
+    """Read a CSV or Parquet file in chunks of rows, so files larger than RAM can be ingested."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+if __name__ == "__main__":
+    # python -m data.ingest new_rows.csv [more.csv ...]
+    for path in sys.argv[1:]:
+        for chunk in iter_file_chunks(path):
+            entry = ingest(chunk)
+            print(f"Ingested {entry['rows']} rows from {path} as {entry['file']} (version {entry['version'][:12]})")
@@ -0,0 +1,233 @@
+from typing import Dict, List, Set, Tuple
+from collections import defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+import re
+
+import pandas as pd
+
+# Minimum confidence for a free-text name to resolve to a vocabulary value
+MIN_CONFIDENCE = 0.6
+# Minimum similarity for a misspelled token to count as a vocabulary token
+MIN_TOKEN_SIMILARITY = 0.75
+
+# Words users write -> tokens used in the intent/category names
+SYNONYMS = {
+    "view": ["get", "check"],
+    "see": ["get", "check"],
+    "show": ["get", "check"],
+    "display": ["get", "check"],
+    "obtain": ["get"],
+    "download": ["get"],
+    "retrieve": ["get"],
+    "receive": ["get"],
+    "verify": ["check"],
+    "review": ["check"],
+    "modify": ["edit", "change"],
+    "update": ["edit", "change"],
+    "alter": ["edit", "change"],
+    "cancellation": ["cancel"],
+    "canceling": ["cancel"],
+    "cancelling": ["cancel"],
+    "canceled": ["cancel"],
+    "cancelled": ["cancel"],
+    "buy": ["place"],
+    "purchase": ["place", "order"],
+    "status": ["track"],
+    "remove": ["delete"],
+    "close": ["delete"],
+    "open": ["create"],
+    "register": ["create", "registration"],
+    "signup": ["create", "registration"],
+    "swap": ["switch"],
+    "person": ["human"],
+    "talk": ["contact"],
+    "speak": ["contact"],
+    "call": ["contact"],
+    "representative": ["human", "agent"],
+    "reimbursement": ["refund"],
+    "subscribe": ["newsletter", "subscription"],
+    "unsubscribe": ["newsletter", "subscription"],
+    "pay": ["payment"],
+    "bill": ["invoice"],
+    "billing": ["invoice"],
+    "receipt": ["invoice"],
+    "login": ["password"],
+    "ship": ["shipping"],
+    "shipment": ["shipping", "delivery"],
+    "deliver": ["delivery"],
+    "problem": ["issue", "problems"],
+    "trouble": ["issue", "problems"],
+    "error": ["issue", "problems"],
+    "charge": ["fee"],
+    "complain": ["complaint"],
+    "feedback": ["review"],
+    "support": ["customer", "service"],
+}
+
+# Words that don't identify a value
+STOPWORDS = {"a", "an", "the", "my", "to", "of", "for", "on", "in", "about", "intent", "category", "please"}
+
+def _tokens(text: str) -> List[str]:
+    """Lowercase word tokens of a text, splitting on underscores and punctuation."""
+    return [token for token in re.split(r"[^a-z0-9]+", str(text).lower()) if token and token not in STOPWORDS]
+
+def _stem(token: str) -> str:
+    """Strip a plural 's' (refunds -> refund)."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class VocabularyResolver:
+    """
+    Maps free-text intent and category names to canonical values with a confidence score.
+
+    Query tokens are expanded through a synonym table and a plural stemmer;
+    tokens that match nothing are corrected to the closest vocabulary token
+    found through a trigram index and edit similarity. Each value is scored
+    with the Dice coefficient between the query tokens and its name tokens.
+    """
+
+    def __init__(self, vocabularies: Dict[str, List[str]], synonyms: Dict[str, List[str]] = SYNONYMS):
+        """
+        Build the indexes.
+
+        Args:
+            vocabularies: Map of vocabulary name (intent, category) to canonical values
+            synonyms: Map of user word to vocabulary tokens
+        """
+        self.vocabularies = vocabularies
+        self.synonyms = synonyms
+        self._by_key: Dict[str, Dict[str, str]] = {}
+        self._entry_tokens: Dict[str, Dict[str, Set[str]]] = {}
+        self._trigram_index: Dict[str, Set[str]] = defaultdict(set)
+
+        for name, values in vocabularies.items():
+            self._by_key[name] = {"_".join(_tokens(value)): value for value in values}
+            self._entry_tokens[name] = {value: {_stem(t) for t in _tokens(value)} for value in values}
+            for tokens in self._entry_tokens[name].values():
+                for token in tokens:
+                    for gram in _trigrams(token):
+                        self._trigram_index[gram].add(token)
+        self._all_tokens = set().union(*self._trigram_index.values()) if self._trigram_index else set()
+
+        self._closest_token = lru_cache(maxsize=4096)(self._closest_token_uncached)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, columns: Tuple[str, ...] = ("intent", "category")) -> "VocabularyResolver":
+        """
+        Build a resolver from the values of dataset columns.
+
+        Args:
+            df: The dataset
+            columns: Columns whose values form the vocabularies
+
+        Returns:
+            The resolver
+        """
+        return cls({column: sorted(df[column].dropna().unique().tolist()) for column in columns})
+
+    def _closest_token_uncached(self, token: str) -> Tuple[str, float]:
+        """Closest vocabulary token to a (possibly misspelled) token."""
+        grams = _trigrams(token)
+        candidates = set()
+        for gram in grams:
+            candidates |= self._trigram_index.get(gram, set())
+        best, best_score = "", 0.0
+        for candidate in candidates:
+            score = SequenceMatcher(None, token, candidate).ratio()
+            if score > best_score:
+                best, best_score = candidate, score
+        return (best, best_score) if best_score >= MIN_TOKEN_SIMILARITY else ("", 0.0)
+
+    def _expand(self, token: str) -> Dict[str, float]:
+        """Vocabulary tokens a query token can stand for, with their weight."""
+        stem = _stem(token)
+        expansions = {token: 1.0, stem: 1.0}
+        for word in (token, stem):
+            for synonym in self.synonyms.get(word, []):
+                expansions[synonym] = 1.0
+        if stem not in self._all_tokens:
+            closest, score = self._closest_token(stem)
+            if closest:
+                expansions.setdefault(closest, score)
+        return expansions
+
+    def candidates(self, vocabulary: str, text: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """
+        Score the values of a vocabulary against a free-text name.
+
+        Args:
+            vocabulary: Vocabulary name (intent or category)
+            text: Free-text name
+            limit: Maximum number of candidates
+
+        Returns:
+            (value, confidence) pairs, best first
+        """
+        key = "_".join(_tokens(text))
+        exact = self._by_key[vocabulary].get(key)
+        if exact is not None:
+            return [(exact, 1.0)]
+
+        query = [self._expand(token) for token in _tokens(text)]
+        if not query:
+            return []
+
+        scored = []
+        for value, entry_tokens in self._entry_tokens[vocabulary].items():
+            matched = sum(
+                max((weight for token, weight in expansions.items() if token in entry_tokens), default=0.0)
+                for expansions in query
+            )
+            # Each entry token can only be matched once
+            matched = min(matched, len(entry_tokens))
+            confidence = 2 * matched / (len(query) + len(entry_tokens))
+            if confidence > 0:
+                scored.append((value, round(confidence, 3)))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def resolve(self, vocabulary: str, text: str, min_confidence: float = MIN_CONFIDENCE) -> List[str]:
+        """
+        Resolve a free-text name to the best matching values.
+
+        Args:
+            vocabulary: Vocabulary name (intent or category)
+            text: Free-text name
+            min_confidence: Minimum confidence of a match
+
+        Returns:
+            All values tied for the best confidence ("View invoice" is both
+            get_invoice and check_invoice), or an empty list if none is confident
+        """
+        scored = self.candidates(vocabulary, text, limit=len(self.vocabularies[vocabulary]))
+        if not scored or scored[0][1] < min_confidence:
+            return []
+        best = scored[0][1]
+        return [value for value, confidence in scored if confidence == best]
+
+    def rewrite_code(self, code: str) -> str:
+        """
+        Replace unknown intent/category literals in generated pandas code with resolved values.
+
+        Only comparisons of the form df['intent'] == 'value' (or !=) are rewritten,
+        and only when the value resolves to exactly one canonical value.
+        """
+        pattern = re.compile(r"""(\[\s*(['"])(\w+)\2\s*\]\s*(?:==|!=)\s*)(['"])(.*?)\4""")
+
+        def replace(match):
+            column, value = match.group(3), match.group(5)
+            if column not in self.vocabularies or value in self.vocabularies[column]:
+                return match.group(0)
+            resolved = self.resolve(column, value)
+            if len(resolved) != 1:
+                return match.group(0)
+            quote = match.group(4)
+            return f"{match.group(1)}{quote}{resolved[0]}{quote}"
+
+        return pattern.sub(replace, code)
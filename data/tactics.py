@@ -0,0 +1,316 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data.dedup import fingerprint
+
+# Dimensions of the hashed TF-IDF vectors of the responses
+VECTOR_DIM = 512
+# Response tactics (clusters) per intent
+NUM_TACTICS = 5
+# Mini-batch k-means settings
+BATCH_SIZE = 256
+NUM_ITERATIONS = 100
+# Rows per intent used to fit the centroids; all rows are assigned afterwards
+MAX_FIT_ROWS = 20000
+# Rows assigned to the centroids at once
+ASSIGN_CHUNK = 50000
+NUM_EXAMPLES = 3
+NUM_KEYWORDS = 6
+SEED = 7
+
+# Words that don't describe a tactic
+STOPWORDS = {
+    "a", "an", "the", "to", "of", "and", "or", "in", "on", "for", "with", "your", "you", "i", "we", "is", "are",
+    "be", "it", "this", "that", "my", "me", "our", "us", "can", "will", "if", "at", "as", "by", "from", "please",
+    "im", "i'm", "about", "any", "have", "has", "do", "so", "all", "need",
+}
+
+def get_tactics_path() -> str:
+    """
+    Get the path of the persisted response tactics.
+
+    Returns:
+        Path next to the dataset cache
+    """
+    return os.path.join(os.path.dirname(__file__), "customer_service_data.tactics.npz")
+
+def _words(texts: pd.Series) -> pd.Series:
+    return texts.fillna("").astype(str).str.lower().str.findall(r"[a-z][a-z']+")
+
+def vectorize(texts: pd.Series, idf: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Embed texts as L2-normalized hashed TF-IDF vectors of word unigrams and bigrams.
+
+    Args:
+        texts: Texts to embed
+        idf: Inverse document frequencies to use (computed from the texts if not given)
+
+    Returns:
+        float32 array of shape (len(texts), VECTOR_DIM), and the idf weights
+    """
+    words = _words(texts)
+    lengths = words.str.len().to_numpy()
+    flat = words.explode().dropna().to_numpy(dtype=object)
+    docs = np.repeat(np.arange(len(texts)), lengths)
+    hashes = pd.util.hash_array(flat) if len(flat) else np.empty(0, dtype=np.uint64)
+
+    # Bigrams: every word followed by a word of the same text
+    pairs = np.flatnonzero(docs[1:] == docs[:-1])
+    bigrams = hashes[pairs] * np.uint64(0x9E3779B97F4A7C15) + hashes[pairs + 1]
+    features = np.concatenate([hashes, bigrams]) % np.uint64(VECTOR_DIM)
+    feature_docs = np.concatenate([docs, docs[pairs]])
+
+    counts = np.zeros((len(texts), VECTOR_DIM), dtype=np.float32)
+    np.add.at(counts, (feature_docs, features.astype(np.int64)), 1.0)
+    if idf is None:
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+    vectors = np.log1p(counts) * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12), idf
+
+def minibatch_kmeans(vectors: np.ndarray, k: int, seed: int = SEED) -> np.ndarray:
+    """
+    Fit k centroids with mini-batch k-means on the unit sphere (cosine distance).
+
+    Centroids are seeded with k-means++ and every batch moves the centroids
+    of its rows by a per-centroid learning rate of 1 / (rows seen so far).
+
+    Args:
+        vectors: L2-normalized vectors
+        k: Number of clusters
+        seed: Random seed
+
+    Returns:
+        L2-normalized centroids, shape (k, dim)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = [vectors[rng.integers(len(vectors))]]
+    distance = 1 - vectors @ centroids[0]
+    for _ in range(1, k):
+        weights = np.maximum(distance, 0) ** 2
+        if weights.sum() <= 0:
+            break
+        centroids.append(vectors[rng.choice(len(vectors), p=weights / weights.sum())])
+        distance = np.minimum(distance, 1 - vectors @ centroids[-1])
+    centroids = np.array(centroids, dtype=np.float32)
+
+    seen = np.zeros(len(centroids))
+    for _ in range(NUM_ITERATIONS):
+        batch = vectors[rng.integers(len(vectors), size=min(BATCH_SIZE, len(vectors)))]
+        assigned = np.argmax(batch @ centroids.T, axis=1)
+        for c in np.unique(assigned):
+            members = batch[assigned == c]
+            seen[c] += len(members)
+            rate = len(members) / seen[c]
+            centroids[c] = (1 - rate) * centroids[c] + rate * members.mean(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+def _keywords(words: pd.Series, labels: np.ndarray, k: int) -> List[List[str]]:
+    """Words that are most over-represented in each cluster compared to the whole intent."""
+    lengths = words.str.len().to_numpy()
+    presence = pd.DataFrame({
+        "doc": np.repeat(np.arange(len(words)), lengths),
+        "cluster": np.repeat(labels, lengths),
+        "word": words.explode().dropna().to_numpy(),
+    })
+    presence = presence[~presence["word"].isin(STOPWORDS)].drop_duplicates(["doc", "word"])
+    counts = pd.crosstab(presence["word"], presence["cluster"]).reindex(columns=range(k), fill_value=0)
+    share = counts / np.maximum(np.bincount(labels, minlength=k), 1)
+    overall = counts.sum(axis=1) / max(len(words), 1)
+    return [
+        lift[lift > 0.01].sort_values(ascending=False, kind="stable").head(NUM_KEYWORDS).index.tolist()
+        for lift in (share[c] - overall for c in range(k))
+    ]
+
+class TacticIndex:
+    """
+    Response tactics of every intent: clusters of its responses with their size,
+    centroid, distinctive keywords and the responses closest to the centroid.
+    """
+
+    def __init__(self, tactics: Dict[str, List[Dict[str, Any]]], centroids: Dict[str, np.ndarray],
+                 idf: np.ndarray, num_built: int):
+        """
+        Initialize the index.
+
+        Args:
+            tactics: Map of intent to its clusters, largest first
+            centroids: Map of intent to its centroids, in cluster order
+            idf: Inverse document frequencies of the vector features
+            num_built: Rows clustered by the build (rows ingested later aren't part of any tactic)
+        """
+        self.tactics = tactics
+        self.centroids = centroids
+        self.idf = idf
+        self.num_built = num_built
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, k: int = NUM_TACTICS) -> "TacticIndex":
+        """
+        Cluster the responses of every intent.
+
+        Args:
+            df: The dataset
+            k: Number of tactics per intent
+
+        Returns:
+            The index
+        """
+        rng = np.random.default_rng(SEED)
+        # One idf over all responses, so vectors of different intents are comparable
+        fit_rows = rng.choice(len(df), size=min(len(df), MAX_FIT_ROWS * 5), replace=False)
+        _, idf = vectorize(df["response"].iloc[fit_rows])
+
+        tactics, centroids = {}, {}
+        for intent, positions in df.groupby("intent", sort=True).indices.items():
+            responses = df["response"].iloc[positions]
+            num_clusters = min(k, responses.nunique())
+            fit = positions if len(positions) <= MAX_FIT_ROWS else np.sort(
+                rng.choice(positions, size=MAX_FIT_ROWS, replace=False))
+            fit_vectors, _ = vectorize(df["response"].iloc[fit], idf)
+            intent_centroids = minibatch_kmeans(fit_vectors, num_clusters)
+            num_clusters = len(intent_centroids)
+
+            # Assign every response, keeping the ones closest to each centroid
+            labels = np.empty(len(positions), dtype=np.int64)
+            similarity = np.empty(len(positions), dtype=np.float32)
+            for start in range(0, len(positions), ASSIGN_CHUNK):
+                vectors, _ = vectorize(responses.iloc[start:start + ASSIGN_CHUNK], idf)
+                scores = vectors @ intent_centroids.T
+                labels[start:start + len(vectors)] = np.argmax(scores, axis=1)
+                similarity[start:start + len(vectors)] = scores.max(axis=1)
+
+            sizes = np.bincount(labels, minlength=num_clusters)
+            keywords = _keywords(_words(responses), labels, num_clusters)
+            clusters = []
+            for c in np.argsort(-sizes, kind="stable"):
+                if sizes[c] == 0:
+                    continue
+                members = np.flatnonzero(labels == c)
+                closest = members[np.argsort(-similarity[members], kind="stable")]
+                # Representatives with distinct texts
+                _, first = np.unique(responses.iloc[closest].to_numpy(), return_index=True)
+                examples = positions[closest[np.sort(first)[:NUM_EXAMPLES]]]
+                clusters.append({
+                    "cluster": int(c),
+                    "size": int(sizes[c]),
+                    "share": round(float(sizes[c]) / len(positions), 3),
+                    "keywords": keywords[c],
+                    "examples": [int(p) for p in examples],
+                })
+            tactics[intent] = clusters
+            centroids[intent] = intent_centroids
+        return cls(tactics, centroids, idf, len(df))
+
+    def save(self, path: str, df: pd.DataFrame):
+        """Persist the tactics of the rows of df they were built from, replacing the file atomically."""
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path, fingerprint=np.uint64(fingerprint(df, ["intent", "response"])), num_rows=np.int64(len(df)),
+            idf=self.idf, tactics=np.array(json.dumps(self.tactics)),
+            **{f"centroids_{intent}": centroids for intent, centroids in self.centroids.items()}
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, df: Optional[pd.DataFrame] = None) -> Optional["TacticIndex"]:
+        """
+        Load persisted tactics.
+
+        Args:
+            path: File of the tactics
+            df: The dataset; the tactics must have been built from its first rows
+                (later rows are ingested ones). Not checked if None.
+
+        Returns:
+            The index, or None if missing, outdated or built from other data
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as stored:
+            if "num_rows" not in stored.files:
+                # Written by an older build, which can't be matched to the rows: rebuild it
+                return None
+            num_built = int(stored["num_rows"])
+            if df is not None:
+                if num_built > len(df) or \
+                        fingerprint(df.iloc[:num_built], ["intent", "response"]) != int(stored["fingerprint"]):
+                    return None
+            centroids = {key[len("centroids_"):]: stored[key] for key in stored.files if key.startswith("centroids_")}
+            return cls(json.loads(str(stored["tactics"])), centroids, stored["idf"], num_built)
+
+    def representatives(self, intent: str, per_cluster: int = 2) -> np.ndarray:
+        """
+        Representative rows of every tactic of an intent, largest tactic first.
+
+        Args:
+            intent: Intent name
+            per_cluster: Rows per tactic
+
+        Returns:
+            Row positions
+        """
+        return np.array([p for cluster in self.tactics.get(intent, []) for p in cluster["examples"][:per_cluster]],
+                        dtype=np.int64)
+
+def get_tactic_index(df: pd.DataFrame, path: Optional[str] = None) -> Optional[TacticIndex]:
+    """
+    Load the response tactics of the dataset. They are only built offline
+    (python -m data.tactics or data.bundle); rows ingested since the build
+    join them at the next build.
+
+    Args:
+        df: The dataset
+        path: Where the index is persisted (the cache of the built-in dataset if omitted)
+
+    Returns:
+        The index, or None if none was built from this data
+    """
+    path = path or get_tactics_path()
+    index = TacticIndex.load(path, df)
+    if index is None:
+        print(f"No response tactics match the data in {path}; build them with python -m data.tactics")
+    return index
+
+def build_tactic_index(df: pd.DataFrame, path: Optional[str] = None) -> TacticIndex:
+    """
+    Offline build: reuse the persisted tactics if they cover exactly these rows,
+    otherwise build and persist them.
+
+    Args:
+        df: The dataset
+        path: Where the index is persisted (the cache of the built-in dataset if omitted)
+
+    Returns:
+        The index
+    """
+    path = path or get_tactics_path()
+    index = TacticIndex.load(path, df)
+    if index is None or index.num_built != len(df):
+        index = TacticIndex.build(df)
+        index.save(path, df)
+    return index
+
+if __name__ == "__main__":
+    # Offline build: python -m data.tactics [--dataset NAME]
+    import argparse
+    from data.catalog import DATASET_CATALOG, DEFAULT_DATASET, _read_dataset
+    from data.download_dataset import load_dataset_df
+
+    parser = argparse.ArgumentParser(description="Build the response tactics of a dataset")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Registered dataset (the built-in one by default)")
+    args = parser.parse_args()
+    path = DATASET_CATALOG.specs[args.dataset]["path"]
+    df = load_dataset_df() if path is None else _read_dataset(path)
+    index = TacticIndex.build(df)
+    index.save(get_tactics_path() if path is None else f"{path}.tactics.npz", df)
+    for intent, clusters in index.tactics.items():
+        print(intent)
+        for cluster in clusters:
+            print(f"  {cluster['share']:>6.1%}  {', '.join(cluster['keywords'])}")
@@ -0,0 +1,275 @@
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Text columns with per-row statistics
+TEXT_COLUMNS = ["instruction", "response"]
+# Per-row statistics of every text column
+METRICS = ["chars", "words", "placeholders"]
+
+PLACEHOLDER_PATTERN = r"\{\{[^{}]*\}\}"
+WORD_SPLIT_PATTERN = r"[^\w']+"
+
+def _arrow_kernels(texts: pd.Series) -> Dict[str, np.ndarray]:
+    """Per-row statistics and token codes of a text column with pyarrow compute kernels."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    array = pa.array(texts.fillna("").astype(str).to_numpy(dtype=object), type=pa.string())
+    trimmed = pc.utf8_trim_whitespace(array)
+    result = {
+        "chars": pc.utf8_length(array).to_numpy(zero_copy_only=False).astype(np.int32),
+        # Trimmed first: like str.split(), leading/trailing whitespace and empty texts yield no words
+        "words": pc.if_else(pc.equal(trimmed, ""), 0, pc.list_value_length(pc.utf8_split_whitespace(trimmed)))
+                   .to_numpy(zero_copy_only=False).astype(np.int32),
+        "placeholders": pc.count_substring_regex(array, PLACEHOLDER_PATTERN).to_numpy(zero_copy_only=False).astype(np.int32),
+    }
+
+    tokens = pc.split_pattern_regex(pc.utf8_lower(array), WORD_SPLIT_PATTERN)
+    flat, docs = pc.list_flatten(tokens), pc.list_parent_indices(tokens).to_numpy()
+    keep = pc.not_equal(flat, "").to_numpy(zero_copy_only=False)
+    encoded = pc.dictionary_encode(flat.filter(pa.array(keep)))
+    result["token_codes"] = encoded.indices.to_numpy().astype(np.int32)
+    result["token_docs"] = docs[keep].astype(np.int64)
+    result["token_names"] = np.array(encoded.dictionary.to_pylist(), dtype=object)
+
+    # Split on the braces, pieces at odd positions are the placeholder names
+    pieces = pc.split_pattern_regex(array, r"\{\{|\}\}")
+    flat, docs = pc.list_flatten(pieces), pc.list_parent_indices(pieces).to_numpy()
+    offsets = pieces.offsets.to_numpy()
+    odd = ((np.arange(len(flat)) - offsets[docs]) % 2 == 1) & (result["placeholders"][docs] > 0)
+    names = pc.dictionary_encode(flat.filter(pa.array(odd)))
+    result["placeholder_codes"] = names.indices.to_numpy().astype(np.int32)
+    result["placeholder_docs"] = docs[odd].astype(np.int64)
+    result["placeholder_names"] = np.array(names.dictionary.to_pylist(), dtype=object)
+    return result
+
+def _pandas_kernels(texts: pd.Series) -> Dict[str, np.ndarray]:
+    """Per-row statistics and token codes of a text column with pandas string methods."""
+    texts = texts.fillna("").astype(str)
+    result = {
+        "chars": texts.str.len().to_numpy().astype(np.int32),
+        "words": texts.str.split().str.len().to_numpy().astype(np.int32),
+        "placeholders": texts.str.count(PLACEHOLDER_PATTERN).to_numpy().astype(np.int32),
+    }
+    tokens = texts.str.lower().str.split(WORD_SPLIT_PATTERN, regex=True).explode()
+    tokens = tokens[tokens.fillna("") != ""]
+    codes, uniques = pd.factorize(tokens)
+    result["token_codes"] = codes.astype(np.int32)
+    result["token_docs"] = tokens.index.to_numpy().astype(np.int64)
+    result["token_names"] = np.array(uniques, dtype=object)
+
+    names = texts.str.extractall(r"\{\{([^{}]*)\}\}")[0]
+    codes, uniques = pd.factorize(names)
+    result["placeholder_codes"] = codes.astype(np.int32)
+    result["placeholder_docs"] = names.index.get_level_values(0).to_numpy().astype(np.int64)
+    result["placeholder_names"] = np.array(uniques, dtype=object)
+    return result
+
+class TextStats:
+    """
+    Per-row text statistics computed once at load time.
+
+    For every text column this keeps the length in characters and words and
+    the number of {{placeholders}} of every row as NumPy arrays, plus the
+    dictionary-encoded tokens and placeholder names of the distinct texts, so
+    percentiles, histograms and vocabulary sizes of any slice are array
+    operations. The string kernels only run once per distinct text, with
+    pyarrow compute when pyarrow is installed.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: List[str] = TEXT_COLUMNS):
+        """
+        Compute the statistics.
+
+        Args:
+            df: The dataset
+            columns: Text columns to compute statistics of
+        """
+        try:
+            import pyarrow  # noqa: F401
+            self._kernels = _arrow_kernels
+        except ImportError:
+            self._kernels = _pandas_kernels
+
+        self.columns = columns
+        self.num_rows = 0
+        self.arrays: Dict[str, np.ndarray] = {}
+        self._text_codes: Dict[str, np.ndarray] = {}
+        self._num_texts: Dict[str, int] = {column: 0 for column in columns}
+        self._tokens: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._token_names: Dict[str, pd.Index] = {}
+        self._placeholders: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self.append(df)
+
+    def append(self, rows: pd.DataFrame):
+        """
+        Compute the statistics of rows appended to the dataset.
+
+        The kernels only run on the distinct texts of the new rows; their
+        tokens and placeholder names are mapped onto the existing codes.
+
+        Args:
+            rows: The new rows
+        """
+        arrays, text_codes_by_column, num_texts = {}, {}, {}
+        tokens_by_column, token_names, placeholders_by_column = {}, {}, {}
+        for column in self.columns:
+            # Templated texts repeat a lot: run the kernels on the distinct texts only
+            text_codes, uniques = pd.factorize(rows[column].fillna(""))
+            result = self._kernels(pd.Series(uniques))
+            offset = self._num_texts[column]
+            for metric in METRICS:
+                name = f"{column}_{metric}"
+                arrays[name] = np.concatenate([self.arrays.get(name, np.empty(0, dtype=np.int32)),
+                                               result[metric][text_codes]])
+            text_codes_by_column[column] = np.concatenate([
+                self._text_codes.get(column, np.empty(0, dtype=np.int64)), text_codes + offset
+            ])
+            num_texts[column] = offset + len(uniques)
+
+            # Batch-local token codes -> codes of the whole dataset
+            names = self._token_names.get(column, pd.Index([], dtype=object))
+            names = names.append(pd.Index(result["token_names"]).difference(names, sort=False))
+            token_lookup = names.get_indexer(result["token_names"]).astype(np.int32)
+            old_codes, old_docs = self._tokens.get(column, (np.empty(0, np.int32), np.empty(0, np.int64)))
+            tokens_by_column[column] = (np.concatenate([old_codes, token_lookup[result["token_codes"]]]),
+                                        np.concatenate([old_docs, result["token_docs"] + offset]))
+            token_names[column] = names
+
+            old_codes, old_docs, old_names = self._placeholders.get(
+                column, (np.empty(0, np.int32), np.empty(0, np.int64), np.empty(0, dtype=object))
+            )
+            all_names = pd.Index(old_names)
+            all_names = all_names.append(pd.Index(result["placeholder_names"]).difference(all_names, sort=False))
+            name_lookup = all_names.get_indexer(result["placeholder_names"]).astype(np.int32)
+            placeholders_by_column[column] = (
+                np.concatenate([old_codes, name_lookup[result["placeholder_codes"]]]),
+                np.concatenate([old_docs, result["placeholder_docs"] + offset]),
+                np.array(all_names, dtype=object),
+            )
+
+        self.arrays, self._text_codes, self._num_texts = arrays, text_codes_by_column, num_texts
+        self._tokens, self._token_names, self._placeholders = tokens_by_column, token_names, placeholders_by_column
+        self.num_rows += len(rows)
+
+    def save(self, directory: str):
+        """
+        Write the statistics as .npy files that load() memory-maps, plus a JSON file of the names.
+
+        Args:
+            directory: Existing directory to write to
+        """
+        for name, values in self.arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+        names = {}
+        for column in self.columns:
+            token_codes, token_docs = self._tokens[column]
+            placeholder_codes, placeholder_docs, placeholder_names = self._placeholders[column]
+            for name, values in (("text_codes", self._text_codes[column]), ("token_codes", token_codes),
+                                 ("token_docs", token_docs), ("placeholder_codes", placeholder_codes),
+                                 ("placeholder_docs", placeholder_docs)):
+                np.save(os.path.join(directory, f"{column}_{name}.npy"), values)
+            names[column] = {"num_texts": self._num_texts[column], "tokens": self._token_names[column].tolist(),
+                             "placeholders": placeholder_names.tolist()}
+        with open(os.path.join(directory, "text_stats.json"), "w") as file:
+            json.dump({"num_rows": self.num_rows, "columns": names}, file)
+
+    @classmethod
+    def load(cls, directory: str) -> "TextStats":
+        """
+        Load statistics written by save(), memory-mapping their arrays.
+
+        Args:
+            directory: Directory written by save()
+
+        Returns:
+            The statistics
+        """
+        with open(os.path.join(directory, "text_stats.json")) as file:
+            meta = json.load(file)
+        stats = cls(pd.DataFrame({column: pd.Series([], dtype=object) for column in meta["columns"]}),
+                    list(meta["columns"]))
+
+        def array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+        for column, names in meta["columns"].items():
+            for metric in METRICS:
+                stats.arrays[f"{column}_{metric}"] = array(f"{column}_{metric}")
+            stats._text_codes[column] = array(f"{column}_text_codes")
+            stats._num_texts[column] = names["num_texts"]
+            stats._tokens[column] = (array(f"{column}_token_codes"), array(f"{column}_token_docs"))
+            stats._token_names[column] = pd.Index(names["tokens"], dtype=object)
+            stats._placeholders[column] = (array(f"{column}_placeholder_codes"), array(f"{column}_placeholder_docs"),
+                                           np.array(names["placeholders"], dtype=object))
+        stats.num_rows = meta["num_rows"]
+        return stats
+
+    def _text_mask(self, column: str, positions: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Mask of the distinct texts of a column that occur in the given rows."""
+        if positions is None:
+            return None
+        mask = np.zeros(self._num_texts[column], dtype=bool)
+        mask[self._text_codes[column][positions]] = True
+        return mask
+
+    def values(self, metric: str, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the values of a per-row statistic.
+
+        Args:
+            metric: Statistic name, e.g. 'response_words'
+            positions: Optional row positions to restrict the values to
+
+        Returns:
+            The values
+        """
+        values = self.arrays[metric]
+        return values if positions is None else values[positions]
+
+    def vocabulary_size(self, column: str, positions: Optional[np.ndarray] = None) -> int:
+        """
+        Count the distinct lowercase words of a text column.
+
+        Args:
+            column: Text column
+            positions: Optional row positions to restrict the count to
+
+        Returns:
+            Number of distinct words
+        """
+        codes, docs = self._tokens[column]
+        mask = self._text_mask(column, positions)
+        if mask is not None:
+            codes = codes[mask[docs]]
+        return int(len(np.unique(codes)))
+
+    def placeholder_counts(self, column: str, positions: Optional[np.ndarray] = None,
+                           top_n: int = 10) -> Dict[str, int]:
+        """
+        Count the rows using each placeholder.
+
+        Args:
+            column: Text column
+            positions: Optional row positions to restrict the counts to
+            top_n: Number of placeholders
+
+        Returns:
+            Map of placeholder to number of rows, most used first
+        """
+        codes, docs, names = self._placeholders[column]
+        # Rows per distinct text, within the given rows
+        text_codes = self._text_codes[column]
+        rows = text_codes if positions is None else text_codes[positions]
+        rows_per_text = np.bincount(rows, minlength=self._num_texts[column])
+        # Count every placeholder once per text, weighted by the rows that have the text
+        num_names = max(len(names), 1)
+        pairs = np.unique(docs * num_names + codes)
+        counts = np.bincount(pairs % num_names, weights=rows_per_text[pairs // num_names],
+                             minlength=len(names)).astype(np.int64)
+        order = np.lexsort((names.astype(str), -counts))
+        return {f"{{{{{names[i]}}}}}": int(counts[i]) for i in order[:top_n] if counts[i] > 0}
@@ -0,0 +1,590 @@
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from data.indexes import DatasetIndex, INDEXED_COLUMNS
+from engine.query_plan import Filter, QueryPlan
+from engine.sampling import DEFAULT_SEED, reservoir_sample, seeded_sample, stratified_sample
+
+# Active execution backend: pandas, duckdb or polars
+QUERY_BACKEND = os.environ.get("QUERY_BACKEND", "pandas")
+
+ROW_COLUMN = "__row"
+
+# Threads of the streaming backend, each scanning one row group at a time
+STREAM_WORKERS = int(os.environ.get("STREAM_WORKERS", os.cpu_count() or 4))
+
+class QueryBackend(ABC):
+    """
+    Execution backend for the filters and aggregations of the tools.
+
+    Every backend answers the same questions over the same data, with the same
+    result ordering, so they can be swapped by configuration:
+    rows come back in dataset order and value counts are sorted by count
+    (descending) and then by value.
+    """
+
+    name = "base"
+    # Optional resolver of free-text intent/category names in query plans (see data/resolver.py)
+    resolver = None
+
+    def __init__(self, vocab: Dict[str, List[str]]):
+        # Sorted vocabulary of the indexed columns, for value validation
+        self.vocab = vocab
+        self._by_lower = {column: {value.lower(): value for value in values} for column, values in vocab.items()}
+
+    def canonical_filters(self, filters: Optional[List[Filter]]) -> List[Filter]:
+        """Map values of indexed columns to their canonical spelling, rejecting unknown ones."""
+        canonical = []
+        for flt in filters or []:
+            if isinstance(flt.column, str) and flt.column in self.vocab and flt.op in ("eq", "ne", "in", "not_in"):
+                values = flt.value if isinstance(flt.value, list) else [flt.value]
+                mapped = []
+                for value in values:
+                    resolved = self._by_lower[flt.column].get(str(value).lower())
+                    if resolved is None:
+                        raise ValueError(f"Unknown {flt.column} value '{value}'. "
+                                         f"Valid values are: {', '.join(self.vocab[flt.column])}")
+                    mapped.append(resolved)
+                flt = flt.model_copy(update={"value": mapped if isinstance(flt.value, list) else mapped[0]})
+            canonical.append(flt)
+        return canonical
+
+    @abstractmethod
+    def positions(self, filters: Optional[List[Filter]] = None) -> np.ndarray:
+        """Sorted row positions matching all filters."""
+
+    @abstractmethod
+    def append(self, rows: pd.DataFrame):
+        """Pick up rows ingested at the end of the dataset (see data/ingest.py)."""
+
+    @abstractmethod
+    def take(self, positions: np.ndarray, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rows at the given positions, in the given order."""
+
+    def count(self, filters: Optional[List[Filter]] = None) -> int:
+        """Number of rows matching all filters."""
+        return len(self.positions(filters))
+
+    @abstractmethod
+    def value_counts(self, column: str, filters: Optional[List[Filter]] = None,
+                     top_n: Optional[int] = None) -> Dict[str, int]:
+        """Counts of the non-null values of a column among the matching rows."""
+
+    def rows(self, filters: Optional[List[Filter]] = None, columns: Optional[List[str]] = None,
+             limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+        """Matching rows in dataset order, from offset, at most limit of them."""
+        positions = self.positions(filters)
+        end = None if limit is None else offset + limit
+        return self.take(positions[offset:end], columns)
+
+    def sample(self, n: int, filters: Optional[List[Filter]] = None, columns: Optional[List[str]] = None,
+               seed: int = DEFAULT_SEED) -> pd.DataFrame:
+        """A deterministic random sample of at most n matching rows."""
+        return self.take(seeded_sample(self.positions(filters), n, seed), columns)
+
+    def _plan_filters(self, filters: List[Filter]) -> List[Filter]:
+        """Canonical filters of a query plan, with free-text intent/category names mapped by the resolver."""
+        resolved = []
+        for flt in filters:
+            if self.resolver is not None and isinstance(flt.column, str) and flt.column in self.vocab and \
+                    flt.op in ("eq", "ne", "in", "not_in"):
+                values = flt.value if isinstance(flt.value, list) else [flt.value]
+                mapped = []
+                for value in values:
+                    known = str(value).lower() in self._by_lower[flt.column]
+                    # A free-text name may stand for several values ("View invoice")
+                    mapped.extend([value] if known else self.resolver.resolve(flt.column, value) or [value])
+                if mapped != values:
+                    flt = flt.model_copy(update={"op": {"eq": "in", "ne": "not_in"}.get(flt.op, flt.op),
+                                                 "value": mapped})
+            resolved.append(flt)
+        return self.canonical_filters(resolved)
+
+    def execute(self, plan: QueryPlan, max_rows: Optional[int] = None) -> Union[pd.DataFrame, pd.Series, int]:
+        """
+        Execute a query plan of the pre-planning path with the operations of the
+        backend, returning what QueryEngine.execute returns for the same data.
+
+        Args:
+            plan: Validated query plan
+            max_rows: Optional cap on the rows returned by 'rows' and 'first_per_group',
+                applied to row positions before anything is materialized
+
+        Returns:
+            A DataFrame, a Series of values, or a count
+        """
+        from engine.query_engine import DEFAULT_ROW_LIMIT, SAMPLE_SEED
+
+        filters = self._plan_filters(plan.filters)
+        if plan.operation == "count":
+            return self.count(filters)
+
+        if plan.operation == "value_counts":
+            counts = self.value_counts(plan.column, filters, top_n=plan.limit)
+            return pd.DataFrame({plan.column: list(counts), "count": np.array(list(counts.values()), dtype=np.int64)})
+
+        positions = self.positions(filters)
+        if plan.operation == "unique":
+            values = self.take(positions, [plan.column])[plan.column]
+            if plan.column in INDEXED_COLUMNS:
+                values = values.dropna()
+            values = values.unique().tolist()
+            if plan.limit:
+                values = values[:plan.limit]
+            return pd.Series(values, name=plan.column)
+
+        if plan.operation == "first_per_group":
+            groups = self.take(positions, plan.group_by)
+            first = ~groups.duplicated().to_numpy()
+            positions = positions[first]
+            if all(column in INDEXED_COLUMNS for column in plan.group_by):
+                # Ordered by the group values, like the index path of QueryEngine
+                order = groups[first].reset_index(drop=True).sort_values(plan.group_by, kind="stable").index
+                positions = positions[order.to_numpy()]
+            if plan.limit:
+                positions = positions[:plan.limit]
+            if max_rows is not None and len(positions) > max_rows:
+                positions = np.sort(seeded_sample(positions, max_rows, SAMPLE_SEED))
+            return self.take(positions, plan.columns)
+
+        limit = plan.limit or DEFAULT_ROW_LIMIT
+        if max_rows is not None:
+            limit = min(limit, max_rows)
+        if not plan.sample:
+            positions = positions[:limit]
+        elif plan.stratify_by is not None:
+            # Strata codes of the matching rows only, sampled by their offset in positions
+            values = self.take(positions, [plan.stratify_by])[plan.stratify_by]
+            strata = pd.Categorical(values, categories=self.vocab[plan.stratify_by]).codes
+            positions = positions[stratified_sample(np.arange(len(positions)), limit, strata, SAMPLE_SEED)]
+        else:
+            positions = seeded_sample(positions, limit, SAMPLE_SEED)
+        return self.take(positions, plan.columns)
+
+def _sorted_counts(counts: pd.Series, top_n: Optional[int]) -> Dict[str, int]:
+    """Sort counts by count descending then value, as plain Python ints."""
+    frame = counts.rename("count").rename_axis("value").reset_index()
+    frame = frame[frame["count"] > 0].sort_values(["count", "value"], ascending=[False, True], kind="stable")
+    if top_n is not None:
+        frame = frame.head(top_n)
+    return {str(value): int(count) for value, count in zip(frame["value"], frame["count"])}
+
+class PandasBackend(QueryBackend):
+    """Eager, in-memory pandas frame with the precomputed dataset indexes."""
+
+    name = "pandas"
+
+    def __init__(self, df: pd.DataFrame, index: Optional[DatasetIndex] = None):
+        from engine.parallel import PARALLEL_WORKERS, ParallelScanner
+        from engine.query_engine import QueryEngine
+
+        # Large text scans and value counts run on a process pool (PARALLEL_WORKERS)
+        scanner = ParallelScanner(df) if PARALLEL_WORKERS > 1 else None
+        self.engine = QueryEngine(df, index, scanner=scanner)
+        super().__init__(self.engine.index.vocab)
+
+    def positions(self, filters=None):
+        positions = self.engine.select(self.canonical_filters(filters))
+        return np.arange(self.engine.index.num_rows) if positions is None else positions
+
+    def append(self, rows):
+        self.engine.append(rows)
+        super().__init__(self.engine.index.vocab)
+
+    def take(self, positions, columns=None):
+        return self.engine.take(positions, columns)
+
+    def execute(self, plan, max_rows=None):
+        # The engine resolves the plan values itself and answers from the indexes directly
+        return self.engine.execute(plan, max_rows)
+
+    def count(self, filters=None):
+        positions = self.engine.select(self.canonical_filters(filters))
+        return self.engine.index.num_rows if positions is None else len(positions)
+
+    def value_counts(self, column, filters=None, top_n=None):
+        positions = self.engine.select(self.canonical_filters(filters))
+        return _sorted_counts(self.engine.value_counts(column, positions), top_n)
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+def _file_offsets(paths: List[str]) -> List[int]:
+    """Position of the first row of every Parquet file in the concatenated dataset."""
+    import pyarrow.parquet as pq
+
+    sizes = [pq.ParquetFile(path).metadata.num_rows for path in paths]
+    return np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64).tolist()
+
+class DuckDBBackend(QueryBackend):
+    """Embedded, multi-threaded SQL engine over the Parquet cache of the dataset."""
+
+    name = "duckdb"
+
+    def __init__(self, parquet_paths: List[str]):
+        import duckdb
+
+        self._con = duckdb.connect()
+        self._open(parquet_paths)
+
+    def _open(self, parquet_paths: List[str]):
+        # Row numbers restart in every file: shift them by the rows of the files before
+        parts = []
+        for path, offset in zip(parquet_paths, _file_offsets(parquet_paths)):
+            path = path.replace("'", "''")
+            parts.append(f"SELECT * EXCLUDE (file_row_number), file_row_number + {offset} AS {ROW_COLUMN} "
+                         f"FROM read_parquet('{path}', file_row_number = true)")
+        self._con.execute(f"CREATE OR REPLACE VIEW dataset AS {' UNION ALL BY NAME '.join(parts)}")
+        self.columns = [row[0] for row in self._con.execute("DESCRIBE dataset").fetchall() if row[0] != ROW_COLUMN]
+        vocab = {
+            column: [row[0] for row in self._con.execute(
+                f"SELECT DISTINCT {_quote(column)} FROM dataset WHERE {_quote(column)} IS NOT NULL ORDER BY 1"
+            ).fetchall()]
+            for column in INDEXED_COLUMNS
+        }
+        super().__init__(vocab)
+
+    def append(self, rows):
+        from data.ingest import dataset_files
+        self._open(dataset_files())
+
+    def _cursor(self):
+        # One cursor per call: DuckDB connections must not be shared across threads
+        return self._con.cursor()
+
+    def _where(self, filters) -> Tuple[str, list]:
+        clauses, params = [], []
+        for flt in self.canonical_filters(filters):
+            if flt.op in ("contains", "not_contains"):
+                columns = flt.column if isinstance(flt.column, list) else [flt.column]
+                clause = " OR ".join(f"coalesce(contains(lower({_quote(c)}), ?), false)" for c in columns)
+                params.extend([flt.value.lower()] * len(columns))
+                clause = f"({clause})"
+            elif flt.op in ("eq", "ne"):
+                operator = "=" if flt.op == "eq" else "IS DISTINCT FROM"
+                clause = f"{_quote(flt.column)} {operator} ?"
+                params.append(flt.value)
+            else:
+                placeholders = ", ".join("?" for _ in flt.value)
+                clause = f"coalesce({_quote(flt.column)} IN ({placeholders}), false)"
+                params.extend(flt.value)
+            if flt.op in ("not_in", "not_contains"):
+                clause = f"NOT {clause}"
+            clauses.append(clause)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def positions(self, filters=None):
+        where, params = self._where(filters)
+        result = self._cursor().execute(f"SELECT {ROW_COLUMN} FROM dataset{where} ORDER BY {ROW_COLUMN}", params)
+        return result.fetchnumpy()[ROW_COLUMN].astype(np.int64)
+
+    def take(self, positions, columns=None):
+        columns = columns or self.columns
+        select = ", ".join(_quote(column) for column in columns)
+        frame = self._cursor().execute(
+            f"SELECT {ROW_COLUMN}, {select} FROM dataset WHERE {ROW_COLUMN} IN (SELECT unnest(?))",
+            [np.asarray(positions, dtype=np.int64).tolist()]
+        ).df()
+        return frame.set_index(ROW_COLUMN).loc[positions, columns].reset_index(drop=True)
+
+    def count(self, filters=None):
+        where, params = self._where(filters)
+        return int(self._cursor().execute(f"SELECT count(*) FROM dataset{where}", params).fetchone()[0])
+
+    def value_counts(self, column, filters=None, top_n=None):
+        where, params = self._where(filters)
+        not_null = f"{_quote(column)} IS NOT NULL"
+        where = f"{where} AND {not_null}" if where else f" WHERE {not_null}"
+        limit = f" LIMIT {int(top_n)}" if top_n is not None else ""
+        rows = self._cursor().execute(
+            f"SELECT {_quote(column)}, count(*) AS n FROM dataset{where} "
+            f"GROUP BY 1 ORDER BY n DESC, 1{limit}", params
+        ).fetchall()
+        return {str(value): int(count) for value, count in rows}
+
+class PolarsBackend(QueryBackend):
+    """Lazy, multi-threaded Polars engine over the Parquet cache of the dataset."""
+
+    name = "polars"
+
+    def __init__(self, parquet_paths: List[str]):
+        import polars as pl
+
+        self._pl = pl
+        self._open(parquet_paths)
+
+    def _open(self, parquet_paths: List[str]):
+        pl = self._pl
+        self._frame = pl.concat([
+            pl.scan_parquet(path).with_row_index(ROW_COLUMN, offset=offset)
+            for path, offset in zip(parquet_paths, _file_offsets(parquet_paths))
+        ])
+        self.columns = [column for column in self._frame.collect_schema().names() if column != ROW_COLUMN]
+        vocab = {
+            column: sorted(self._frame.select(pl.col(column).drop_nulls().unique()).collect()[column].to_list())
+            for column in INDEXED_COLUMNS
+        }
+        super().__init__(vocab)
+
+    def append(self, rows):
+        from data.ingest import dataset_files
+        self._open(dataset_files())
+
+    def _filtered(self, filters):
+        pl = self._pl
+        frame = self._frame
+        for flt in self.canonical_filters(filters):
+            if flt.op in ("contains", "not_contains"):
+                columns = flt.column if isinstance(flt.column, list) else [flt.column]
+                expr = pl.lit(False)
+                for column in columns:
+                    expr = expr | pl.col(column).str.to_lowercase().str.contains(flt.value.lower(), literal=True).fill_null(False)
+            elif flt.op in ("eq", "ne"):
+                expr = (pl.col(flt.column) == flt.value).fill_null(False)
+            else:
+                expr = pl.col(flt.column).is_in(flt.value).fill_null(False)
+            if flt.op in ("ne", "not_in", "not_contains"):
+                expr = ~expr
+            frame = frame.filter(expr)
+        return frame
+
+    def positions(self, filters=None):
+        frame = self._filtered(filters).select(ROW_COLUMN).collect()
+        return frame[ROW_COLUMN].to_numpy().astype(np.int64)
+
+    def take(self, positions, columns=None):
+        pl = self._pl
+        columns = columns or self.columns
+        frame = self._frame.filter(pl.col(ROW_COLUMN).is_in(np.asarray(positions).tolist()))
+        frame = frame.select([ROW_COLUMN] + columns).collect().to_pandas()
+        return frame.set_index(ROW_COLUMN).loc[positions, columns].reset_index(drop=True)
+
+    def count(self, filters=None):
+        return int(self._filtered(filters).select(self._pl.len()).collect().item())
+
+    def value_counts(self, column, filters=None, top_n=None):
+        pl = self._pl
+        frame = (
+            self._filtered(filters)
+            .filter(pl.col(column).is_not_null())
+            .group_by(column).agg(pl.len().alias("n"))
+            .sort(["n", column], descending=[True, False])
+        )
+        if top_n is not None:
+            frame = frame.head(top_n)
+        rows = frame.collect()
+        return {str(value): int(count) for value, count in zip(rows[column].to_list(), rows["n"].to_list())}
+
+class StreamingBackend(QueryBackend):
+    """
+    Out-of-core scans over the Parquet files of the dataset, for datasets larger than RAM.
+
+    Nothing but the row-group layout of the files is kept in memory: every
+    question is answered by a map over the row groups (reading only the
+    columns it needs, filtered with vectorized pyarrow kernels) and a combine
+    of the small per-group results. Row groups are scanned by a thread pool,
+    since the pyarrow kernels release the GIL. Memory use is bounded by
+    STREAM_WORKERS row groups, whatever the size of the dataset.
+    """
+
+    name = "streaming"
+
+    def __init__(self, parquet_paths: List[str]):
+        self._pool = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix="stream")
+        self._open(parquet_paths)
+
+    def _open(self, parquet_paths: List[str]):
+        import pyarrow.parquet as pq
+
+        # (path, row group, position of its first row) of every row group, in dataset order
+        units, offset = [], 0
+        for path in parquet_paths:
+            metadata = pq.ParquetFile(path).metadata
+            for group in range(metadata.num_row_groups):
+                units.append((path, group, offset))
+                offset += metadata.row_group(group).num_rows
+        self._units = units
+        self._starts = np.array([start for _, _, start in units] + [offset], dtype=np.int64)
+        self.num_rows = offset
+        self.columns = [name for name in pq.read_schema(parquet_paths[0]).names if name != "__index_level_0__"]
+        vocab = {column: sorted(self._scan_counts(column, [])) for column in INDEXED_COLUMNS}
+        super().__init__(vocab)
+
+    def append(self, rows):
+        from data.ingest import dataset_files
+        self._open(dataset_files())
+
+    def _read(self, unit: int, columns: List[str]):
+        import pyarrow.parquet as pq
+
+        path, group, _ = self._units[unit]
+        return pq.ParquetFile(path, memory_map=True).read_row_group(group, columns=columns)
+
+    def _map(self, function: Callable, units: Optional[List[int]] = None) -> Iterator:
+        """
+        Apply a function to every row group in parallel, yielding the results in dataset order.
+
+        At most STREAM_WORKERS row groups are submitted ahead of the consumer, so
+        finished results never pile up in memory while earlier ones are consumed.
+        """
+        pending = deque()
+        try:
+            for unit in (range(len(self._units)) if units is None else units):
+                pending.append(self._pool.submit(function, unit))
+                if len(pending) >= STREAM_WORKERS:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # The consumer stopped early (or a scan failed): drop the row groups not started yet
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _columns_of(filters: List[Filter]) -> List[str]:
+        columns = []
+        for flt in filters:
+            for column in (flt.column if isinstance(flt.column, list) else [flt.column]):
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    @staticmethod
+    def _mask(table, filters: List[Filter]):
+        """Boolean mask of the rows of a row group matching all filters."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        mask = pa.array(np.ones(table.num_rows, dtype=bool))
+        for flt in filters:
+            if flt.op in ("contains", "not_contains"):
+                columns = flt.column if isinstance(flt.column, list) else [flt.column]
+                match = pa.array(np.zeros(table.num_rows, dtype=bool))
+                for column in columns:
+                    found = pc.match_substring(table[column], flt.value, ignore_case=True)
+                    match = pc.or_(match, pc.fill_null(found, False))
+            elif flt.op in ("eq", "ne"):
+                match = pc.fill_null(pc.equal(table[flt.column], flt.value), False)
+            else:
+                match = pc.fill_null(pc.is_in(table[flt.column], value_set=pa.array(flt.value)), False)
+            if flt.op in ("ne", "not_in", "not_contains"):
+                match = pc.invert(match)
+            mask = pc.and_(mask, match)
+        return mask
+
+    def _unit_positions(self, filters: List[Filter]) -> Iterator[np.ndarray]:
+        """Matching row positions, one array per row group."""
+        columns = self._columns_of(filters)
+
+        def scan(unit):
+            start = self._starts[unit]
+            if not filters:
+                return np.arange(start, self._starts[unit + 1], dtype=np.int64)
+            mask = self._mask(self._read(unit, columns), filters)
+            return np.flatnonzero(mask.to_numpy(zero_copy_only=False)) + start
+
+        return self._map(scan)
+
+    def _scan_counts(self, column: str, filters: List[Filter]) -> Dict[str, int]:
+        """Counts of the non-null values of a column among the matching rows."""
+        import pyarrow.compute as pc
+
+        columns = self._columns_of(filters)
+        if column not in columns:
+            columns.append(column)
+
+        def count(unit):
+            table = self._read(unit, columns)
+            values = table[column]
+            if filters:
+                values = values.filter(self._mask(table, filters))
+            counts = pc.value_counts(values.drop_null()) if len(values) else []
+            return {str(item["values"]): item["counts"] for item in counts.to_pylist()} if len(counts) else {}
+
+        totals: Dict[str, int] = {}
+        for counts in self._map(count):
+            for value, n in counts.items():
+                totals[value] = totals.get(value, 0) + n
+        return totals
+
+    def positions(self, filters=None):
+        parts = list(self._unit_positions(self.canonical_filters(filters)))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def take(self, positions, columns=None):
+        import pyarrow as pa
+
+        columns = columns or self.columns
+        positions = np.asarray(positions, dtype=np.int64)
+        units = np.searchsorted(self._starts, positions, side="right") - 1
+        wanted = np.unique(units).tolist()
+
+        def read(unit):
+            local = np.unique(positions[units == unit]) - self._starts[unit]
+            return self._read(unit, columns).take(pa.array(local))
+
+        tables = list(self._map(read, wanted))
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        frame = pa.concat_tables(tables).to_pandas()
+        # Rows were read sorted by position; bring them into the requested order
+        order = np.searchsorted(np.unique(positions), positions)
+        return frame.iloc[order].reset_index(drop=True)
+
+    def count(self, filters=None):
+        filters = self.canonical_filters(filters)
+        if not filters:
+            return self.num_rows
+        return int(sum(len(part) for part in self._unit_positions(filters)))
+
+    def value_counts(self, column, filters=None, top_n=None):
+        counts = self._scan_counts(column, self.canonical_filters(filters))
+        return _sorted_counts(pd.Series(counts, dtype=np.int64), top_n)
+
+    def sample(self, n, filters=None, columns=None, seed=DEFAULT_SEED):
+        # The matching positions stream through the reservoir, at most STREAM_WORKERS row groups of them at a time
+        chosen = reservoir_sample(self._unit_positions(self.canonical_filters(filters)), n, seed)
+        return self.take(chosen, columns)
+
+BACKENDS = {
+    "pandas": PandasBackend,
+    "duckdb": DuckDBBackend,
+    "polars": PolarsBackend,
+    "streaming": StreamingBackend,
+}
+
+def create_backend(name: str, df: Optional[pd.DataFrame] = None,
+                   parquet_paths: Optional[List[str]] = None, index: Optional[DatasetIndex] = None) -> QueryBackend:
+    """
+    Create an execution backend.
+
+    Args:
+        name: Backend name (pandas, duckdb, polars or streaming)
+        df: The dataset (loaded if not given; the other backends read its Parquet files instead)
+        parquet_paths: Parquet files of the dataset (the cache and segments of the built-in dataset if omitted)
+        index: Prebuilt indexes of df for the pandas backend (built if not given)
+
+    Returns:
+        The backend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown query backend '{name}'. Valid options are: {', '.join(BACKENDS)}")
+    if name == "pandas":
+        if df is None:
+            from data.download_dataset import load_dataset_df
+            df = load_dataset_df()
+        return PandasBackend(df, index)
+
+    if parquet_paths is None:
+        from data.ingest import dataset_files
+        parquet_paths = dataset_files()
+    if not parquet_paths:
+        raise ImportError(f"The {name} backend needs pyarrow for the Parquet cache")
+    return BACKENDS[name](parquet_paths)
+
@@ -0,0 +1,68 @@
+from typing import Any, Dict, Optional, Tuple
+import base64
+import binascii
+import hashlib
+import json
+
+import numpy as np
+
+CURSOR_VERSION = 1
+# Largest page a cursor can ask for
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(kind: str, state: Dict[str, Any]) -> str:
+    """
+    Encode the state of a paged request into an opaque cursor.
+
+    The cursor holds everything needed to recompute the page (filters, order,
+    offset), so no server-side state is kept between pages.
+
+    Args:
+        kind: Tool the cursor belongs to
+        state: JSON-serializable request state
+
+    Returns:
+        URL-safe cursor string
+    """
+    payload = json.dumps({"v": CURSOR_VERSION, "kind": kind, **state}, separators=(",", ":"), sort_keys=True).encode()
+    checksum = hashlib.sha1(payload).digest()[:6]
+    return base64.urlsafe_b64encode(checksum + payload).decode().rstrip("=")
+
+def decode_cursor(kind: str, cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        kind: Tool the cursor must belong to
+        cursor: Cursor string
+
+    Returns:
+        The request state
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        checksum, payload = raw[:6], raw[6:]
+        if hashlib.sha1(payload).digest()[:6] != checksum:
+            raise ValueError
+        state = json.loads(payload)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if state.pop("v", None) != CURSOR_VERSION or state.pop("kind", None) != kind:
+        raise ValueError(f"Cursor is not a {kind} cursor")
+    return state
+
+def page(positions: np.ndarray, offset: int, size: int) -> Tuple[np.ndarray, Optional[int]]:
+    """
+    Cut a page out of ordered row positions.
+
+    Args:
+        positions: Row positions in page order
+        offset: Index of the first row of the page
+        size: Rows per page
+
+    Returns:
+        The page's row positions, and the offset of the next page (None on the last page)
+    """
+    size = max(1, min(size, MAX_PAGE_SIZE))
+    end = offset + size
+    return positions[offset:end], (end if end < len(positions) else None)
@@ -0,0 +1,156 @@
+from typing import Iterator, List, Literal, Optional
+import os
+import tempfile
+import time
+import uuid
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from engine.backends import QueryBackend
+from engine.query_plan import Filter
+
+# Rows taken from the backend and written at once
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "50000"))
+# Directory of the files offered for download, and how long they are kept
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "dataset_exports"))
+EXPORT_MAX_AGE = int(os.environ.get("EXPORT_MAX_AGE", "3600"))
+
+ExportFormat = Literal["csv.gz", "parquet"]
+
+def iter_frames(backend: QueryBackend, filters: Optional[List[Filter]] = None, columns: Optional[List[str]] = None,
+                chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream the matching rows in dataset order, one chunk at a time.
+
+    Only the row positions of the result are held in memory; every chunk is
+    taken from the backend just before it is written.
+
+    Args:
+        backend: Query backend
+        filters: Row filters
+        columns: Columns to export (all if omitted)
+        chunk_rows: Rows per chunk
+
+    Returns:
+        Iterator of DataFrame chunks (one empty frame with the selected columns if no row matches)
+    """
+    positions = backend.positions(filters)
+    if len(positions) == 0:
+        # Still written with its header or schema, so the file opens as an empty table
+        yield backend.take(np.array([], dtype=np.int64), columns)
+        return
+    for start in range(0, len(positions), chunk_rows):
+        yield backend.take(positions[start:start + chunk_rows], columns)
+
+class _Drain:
+    """Write-only file object whose contents are handed out as they are written."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+def _csv_gz_bytes(frames: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    header = True
+    for frame in frames:
+        data = compressor.compress(frame.to_csv(index=False, header=header).encode())
+        header = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _parquet_bytes(frames: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink, writer = _Drain(), None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression="zstd")
+        # Every chunk becomes one row group
+        writer.write_table(table.cast(writer.schema))
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+def stream_export(backend: QueryBackend, filters: Optional[List[Filter]] = None, columns: Optional[List[str]] = None,
+                  file_format: ExportFormat = "csv.gz", chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Stream the matching rows as a compressed CSV or Parquet file, chunk by chunk.
+
+    Memory use is bounded by one chunk whatever the size of the result.
+
+    Args:
+        backend: Query backend
+        filters: Row filters
+        columns: Columns to export (all if omitted)
+        file_format: 'csv.gz' or 'parquet'
+        chunk_rows: Rows per chunk
+
+    Returns:
+        Iterator of the bytes of the file
+    """
+    frames = iter_frames(backend, filters, columns, chunk_rows)
+    if file_format == "csv.gz":
+        return _csv_gz_bytes(frames)
+    if file_format == "parquet":
+        return _parquet_bytes(frames)
+    raise ValueError(f"Unknown export format '{file_format}'. Valid formats are: csv.gz, parquet")
+
+def _remove_old_exports():
+    now = time.time()
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_MAX_AGE:
+                os.remove(path)
+        except OSError:
+            pass
+
+def export_to_file(backend: QueryBackend, filters: Optional[List[Filter]] = None, columns: Optional[List[str]] = None,
+                   file_format: ExportFormat = "csv.gz", name: str = "export") -> str:
+    """
+    Stream the matching rows into a file in the export directory.
+
+    Args:
+        backend: Query backend
+        filters: Row filters
+        columns: Columns to export (all if omitted)
+        file_format: 'csv.gz' or 'parquet'
+        name: Base name of the file
+
+    Returns:
+        Path of the written file
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _remove_old_exports()
+    path = os.path.join(EXPORT_DIR, f"{name}-{uuid.uuid4().hex[:8]}.{file_format}")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        for data in stream_export(backend, filters, columns, file_format):
+            file.write(data)
+    os.replace(tmp_path, path)
+    return path
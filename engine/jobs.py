@@ -0,0 +1,202 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import atexit
+import os
+import threading
+import time
+import uuid
+
+# Questions answered at once in the background; the agents mostly wait on the LLM, so these are threads
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+# Finished jobs whose results are kept, oldest dropped first
+JOB_RESULTS = int(os.environ.get("JOB_RESULTS", "256"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+class JobCancelledError(Exception):
+    """Raised inside a running job when it has been cancelled."""
+
+class Job:
+    """
+    A function running in the background, with its progress events and result.
+
+    The function receives an event callback; every event is stored on the job
+    and is also the point where a cancelled job stops.
+    """
+
+    def __init__(self, function: Callable[[Callable[[Dict[str, Any]], None]], Any],
+                 key: Optional[str] = None, description: str = ""):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.description = description
+        self.status = QUEUED
+        self.events: List[Dict[str, Any]] = []
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self._function = function
+        self._cancelled = threading.Event()
+        self._future: Optional[Future] = None
+
+    @property
+    def done(self) -> bool:
+        """Whether the job finished, failed or was cancelled."""
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def emit(self, event: Dict[str, Any]):
+        """Record a progress event, or stop the job if it was cancelled."""
+        if self._cancelled.is_set():
+            raise JobCancelledError()
+        self.events.append(event)
+
+    def cancel(self) -> bool:
+        """
+        Cancel the job. A queued job never starts; a running one stops at its
+        next progress event, and its result is dropped if it finishes first.
+
+        Returns:
+            False if the job had already finished
+        """
+        if self.done:
+            return False
+        self._cancelled.set()
+        # Not submitted yet (waiting for its key) or removed from the pool before starting
+        if self._future is None or self._future.cancel():
+            self._finish(CANCELLED)
+        return True
+
+    def _run(self):
+        try:
+            if self._cancelled.is_set():
+                self._finish(CANCELLED)
+                return
+            self.status = RUNNING
+            result = self._function(self.emit)
+            if self._cancelled.is_set():
+                self._finish(CANCELLED)
+            else:
+                self.result = result
+                self._finish(DONE)
+        except JobCancelledError:
+            self._finish(CANCELLED)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self._finish(FAILED)
+
+    def _finish(self, status: str):
+        self.status = status
+        self.finished = time.time()
+
+class JobQueue:
+    """
+    Local job queue on a thread pool.
+
+    Jobs live in the process, not in a Streamlit session, so they keep running
+    across reruns and the page only keeps their ids. Results are stored until
+    JOB_RESULTS newer jobs have finished.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_results: int = JOB_RESULTS):
+        """
+        Initialize the queue. Threads are started as jobs arrive.
+
+        Args:
+            workers: Jobs running at once
+            max_results: Finished jobs kept
+        """
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # Jobs waiting for the running job of their key, by key
+        self._waiting: Dict[str, deque] = {}
+        # Reentrant: a job that is already done runs its done callback while the lock is held
+        self._lock = threading.RLock()
+
+    def submit(self, function: Callable[[Callable[[Dict[str, Any]], None]], Any],
+               key: Optional[str] = None, description: str = "") -> Job:
+        """
+        Run a function in the background.
+
+        Args:
+            function: Function taking the event callback and returning the result
+            key: Jobs with the same key (e.g. a session id) run one after the other
+            description: Shown while the job runs
+
+        Returns:
+            The job
+        """
+        job = Job(function, key, description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+            if key is not None:
+                # Jobs of one key run one at a time, in submission order, without holding a thread while waiting
+                if key in self._waiting:
+                    self._waiting[key].append(job)
+                    return job
+                self._waiting[key] = deque()
+            self._start(job)
+        return job
+
+    def _start(self, job: Job):
+        job._future = self._executor.submit(job._run)
+        if job.key is not None:
+            job._future.add_done_callback(lambda _: self._next(job.key))
+
+    def _next(self, key: str):
+        """Start the next waiting job of a key."""
+        with self._lock:
+            waiting = self._waiting[key]
+            while waiting:
+                job = waiting.popleft()
+                if not job.done:
+                    self._start(job)
+                    return
+            del self._waiting[key]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Get a job, or None if it is unknown or its result was dropped."""
+        return self._jobs.get(job_id)
+
+    def jobs(self, key: Optional[str] = None) -> List[Job]:
+        """Jobs of a key (all jobs if None), oldest first."""
+        with self._lock:
+            return [job for job in self._jobs.values() if key is None or job.key == key]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job.
+
+        Args:
+            job_id: Id of the job
+
+        Returns:
+            False if the job is unknown or had already finished
+        """
+        job = self.get(job_id)
+        return job is not None and job.cancel()
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_results)]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        """Cancel the queued jobs and wait for the running ones."""
+        for job in self.jobs():
+            job.cancel()
+        self._executor.shutdown(wait=True)
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Get the process-wide job queue, creating it on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+            atexit.register(_queue.shutdown)
+    return _queue
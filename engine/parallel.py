@@ -0,0 +1,219 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import atexit
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Processes of the scan pool; 0 or 1 (the default) keeps every scan in the calling process.
+# Opt-in: every process that scans in parallel writes its own Arrow copy of the dataset to SHARED_DIR
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", "0"))
+# Scans of fewer rows than this run serially: starting shards costs more than it saves
+PARALLEL_MIN_ROWS = int(os.environ.get("PARALLEL_MIN_ROWS", "250000"))
+# Shared-memory filesystem when there is one, so the mapped files never touch the disk
+SHARED_DIR = os.environ.get("PARALLEL_SHARED_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+SHARD_DIR_PREFIX = "dataset-shards-"
+
+# Memory-mapped tables of the worker process, by path
+_tables: Dict[str, Any] = {}
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def remove_stale_shards(shared_dir: str = SHARED_DIR) -> int:
+    """
+    Remove the mapped files left in shared_dir by processes that were killed
+    before they could clean up (e.g. SIGKILL), which would otherwise hold
+    memory in /dev/shm until reboot.
+
+    Args:
+        shared_dir: Directory of the mapped files
+
+    Returns:
+        Number of directories removed
+    """
+    removed = 0
+    for name in os.listdir(shared_dir):
+        if not name.startswith(SHARD_DIR_PREFIX):
+            continue
+        # dataset-shards-<pid>-<id>
+        pid = name[len(SHARD_DIR_PREFIX):].split("-")[0]
+        if not pid.isdigit() or _process_alive(int(pid)):
+            continue
+        shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+        removed += 1
+    return removed
+
+def _shard_frame(path: str, start: int, stop: int, positions: Optional[np.ndarray],
+                 columns: List[str]) -> pd.DataFrame:
+    """Rows [start, stop) of a mapped Arrow file (or the given local positions), as pandas."""
+    import pyarrow as pa
+
+    if path not in _tables:
+        # Zero-copy: the table's buffers point into the mapped file, shared by all workers
+        _tables[path] = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    table = _tables[path].select(columns)
+    table = table.slice(start, stop - start) if positions is None else table.take(pa.array(positions))
+    return table.to_pandas()
+
+def _mask_task(path: str, start: int, stop: int, positions: Optional[np.ndarray], op: str,
+               columns: List[str], value: Any) -> np.ndarray:
+    """Map step of a scan: the same pandas string kernels as the serial path, on one shard."""
+    frame = _shard_frame(path, start, stop, positions, columns)
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in columns:
+        if op == "contains":
+            mask |= frame[column].str.contains(value, case=False, regex=False, na=False).to_numpy()
+        else:
+            mask |= frame[column].isin(value).to_numpy()
+    return mask
+
+def _value_counts_task(path: str, start: int, stop: int, positions: Optional[np.ndarray],
+                       column: str) -> pd.Series:
+    """Map step of a value count on one shard."""
+    return _shard_frame(path, start, stop, positions, [column])[column].value_counts(sort=False)
+
+class ParallelScanner:
+    """
+    Runs full-column scans as map/combine jobs over a process pool.
+
+    The dataset is written once to uncompressed Arrow IPC files that every
+    worker memory-maps, so the processes share one copy of the data and a
+    task only carries a row range (and the row positions to test, if any).
+    The rows are split into one contiguous shard per worker; each shard runs
+    the same pandas kernel as the serial path and the partial results are
+    combined in shard order, so results are identical to a serial scan.
+    Rows appended later go to a new file, the existing ones never change.
+    """
+
+    def __init__(self, df: pd.DataFrame, workers: int = PARALLEL_WORKERS, min_rows: int = PARALLEL_MIN_ROWS):
+        """
+        Initialize the scanner. Files and processes are created on the first parallel scan.
+
+        Args:
+            df: The dataset
+            workers: Number of worker processes
+            min_rows: Smallest scan that runs in parallel
+        """
+        self.workers = workers
+        self.min_rows = min_rows
+        self._pending = [df]
+        # (path, position of its first row, rows) of every mapped file, in dataset order
+        self._files: List[Tuple[str, int, int]] = []
+        self.num_rows = len(df)
+        self._dir: Optional[str] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def use_for(self, num_rows: int) -> bool:
+        """Whether a scan of that many rows should run in parallel."""
+        return self.workers > 1 and num_rows >= self.min_rows and not self._closed
+
+    def append(self, rows: pd.DataFrame):
+        """Make rows appended to the dataset scannable."""
+        with self._lock:
+            self._pending.append(rows)
+            self.num_rows += len(rows)
+
+    def _prepare(self) -> Tuple[ProcessPoolExecutor, List[Tuple[str, int, int]], int]:
+        """Write the pending rows to mapped files and start the pool, once; returns a snapshot of the files."""
+        import pyarrow as pa
+
+        with self._lock:
+            if self._dir is None:
+                remove_stale_shards(SHARED_DIR)
+                # Named by the owning process, so a later start can tell whether it is still running
+                self._dir = os.path.join(SHARED_DIR, f"{SHARD_DIR_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+                os.makedirs(self._dir)
+                atexit.register(self.shutdown)
+            for frame in self._pending:
+                start = self._files[-1][1] + self._files[-1][2] if self._files else 0
+                path = os.path.join(self._dir, f"rows-{start}.arrow")
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+                self._files.append((path, start, len(frame)))
+            self._pending = []
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool, list(self._files), self.num_rows
+
+    def _run(self, task: Callable, positions: Optional[np.ndarray], *args) -> List[Any]:
+        """Map a task over the shards and return the partial results in row order."""
+        pool, files, num_rows = self._prepare()
+        if positions is None:
+            bounds = np.linspace(0, num_rows, self.workers + 1).astype(np.int64)
+        else:
+            # Equal numbers of positions per shard, wherever they are
+            cuts = positions[(len(positions) * np.arange(1, self.workers)) // self.workers]
+            bounds = np.concatenate([[0], cuts, [num_rows]]).astype(np.int64)
+        futures = []
+        for path, file_start, file_rows in files:
+            # Shard bounds that fall inside this file, so no task spans two files
+            cuts = bounds[(bounds > file_start) & (bounds < file_start + file_rows)]
+            edges = np.concatenate([[file_start], cuts, [file_start + file_rows]])
+            for lo, hi in zip(edges[:-1], edges[1:]):
+                if positions is None:
+                    futures.append(pool.submit(task, path, lo - file_start, hi - file_start, None, *args))
+                else:
+                    a, b = np.searchsorted(positions, [lo, hi])
+                    if a < b:
+                        futures.append(pool.submit(task, path, 0, 0, positions[a:b] - file_start, *args))
+        return [future.result() for future in futures]
+
+    def mask(self, op: str, columns: List[str], value: Any, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Test rows against a text filter in parallel.
+
+        Args:
+            op: 'contains' (case-insensitive substring of any column) or 'isin' (value in a list)
+            columns: Columns to test
+            value: Substring, or list of values
+            positions: Optional sorted row positions to test (all rows if omitted)
+
+        Returns:
+            Boolean array with one entry per row (or per position)
+        """
+        parts = self._run(_mask_task, positions, op, columns, value)
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=bool)
+
+    def value_counts(self, column: str, positions: Optional[np.ndarray] = None) -> pd.Series:
+        """
+        Count the non-null values of a column in parallel.
+
+        Args:
+            column: Column name
+            positions: Optional sorted row positions to count (all rows if omitted)
+
+        Returns:
+            Series of counts indexed by value (unsorted)
+        """
+        parts = [part for part in self._run(_value_counts_task, positions, column) if len(part)]
+        if not parts:
+            return pd.Series(dtype=np.int64, name="count")
+        return pd.concat(parts).groupby(level=0, sort=False).sum()
+
+    def shutdown(self):
+        """Stop the pool and remove the mapped files; later scans run serially."""
+        with self._lock:
+            self._closed = True
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            if self._dir is not None:
+                shutil.rmtree(self._dir, ignore_errors=True)
@@ -0,0 +1,214 @@
+from typing import List, Optional, Union
+import numpy as np
+import pandas as pd
+
+from data.indexes import DatasetIndex, INDEXED_COLUMNS
+from data.resolver import VocabularyResolver
+from engine.parallel import ParallelScanner
+from engine.query_plan import Filter, QueryPlan
+from engine.sampling import DEFAULT_SEED, seeded_sample, stratified_sample
+
+# Rows returned by 'rows' plans without an explicit limit
+DEFAULT_ROW_LIMIT = 20
+SAMPLE_SEED = DEFAULT_SEED
+
+class QueryEngine:
+    """
+    Executes validated query plans against the dataset.
+
+    Filters on indexed columns are answered from the precomputed row positions,
+    text filters only scan the rows that survived the index filters, and the
+    limit and column projection are applied to row positions before a single
+    take, so no intermediate frames are materialized.
+    """
+
+    def __init__(self, df: pd.DataFrame, index: Optional[DatasetIndex] = None,
+                 resolver: Optional[VocabularyResolver] = None, scanner: Optional[ParallelScanner] = None):
+        """
+        Initialize the engine.
+
+        Args:
+            df: The dataset
+            index: Precomputed indexes of the dataset (built if not given)
+            resolver: Optional resolver of free-text intent/category names
+            scanner: Optional process pool for large text scans and value counts
+        """
+        self.df = df
+        self.index = index or DatasetIndex(df)
+        self.resolver = resolver
+        self.scanner = scanner
+
+    def append(self, rows: pd.DataFrame):
+        """
+        Append rows to the dataset and its indexes.
+
+        Args:
+            rows: New rows, with the columns of the dataset
+        """
+        df = pd.concat([self.df, rows], ignore_index=True)
+        self.index.append(rows, df)
+        if self.scanner is not None:
+            self.scanner.append(rows)
+        self.df = df
+
+    def _canonical_values(self, column: str, values: List[str]) -> List[str]:
+        """Map values of an indexed column to their canonical spelling, ignoring case or via the resolver."""
+        vocab = self.index.vocab[column]
+        by_lower = {value.lower(): value for value in vocab}
+        canonical = []
+        for value in values:
+            if value in self.index.positions[column]:
+                canonical.append(value)
+            elif str(value).lower() in by_lower:
+                canonical.append(by_lower[str(value).lower()])
+            elif self.resolver and column in self.resolver.vocabularies and self.resolver.resolve(column, value):
+                # A free-text name may stand for several values ("View invoice")
+                canonical.extend(self.resolver.resolve(column, value))
+            else:
+                raise ValueError(f"Unknown {column} value '{value}'. Valid values are: {', '.join(vocab)}")
+        return canonical
+
+    def column_values(self, column: str, positions: Optional[np.ndarray]) -> pd.Series:
+        """Values of a column, restricted to positions when given."""
+        series = self.df[column]
+        return series if positions is None else series.iloc[positions]
+
+    def _parallel(self, positions: Optional[np.ndarray]) -> bool:
+        """Whether a scan of the given rows runs on the process pool."""
+        return self.scanner is not None and self.scanner.use_for(
+            self.index.num_rows if positions is None else len(positions)
+        )
+
+    def value_counts(self, column: str, positions: Optional[np.ndarray]) -> pd.Series:
+        """Counts of the non-null values of a column, restricted to positions when given."""
+        if column in INDEXED_COLUMNS:
+            return self.index.value_counts(column, positions)
+        if self._parallel(positions):
+            return self.scanner.value_counts(column, positions).sort_values(ascending=False, kind="stable")
+        return self.column_values(column, positions).value_counts()
+
+    def _apply_filter(self, flt: Filter, positions: Optional[np.ndarray]) -> np.ndarray:
+        """Narrow the selected row positions (None means all rows) by one filter."""
+        negate = flt.op in ("ne", "not_in", "not_contains")
+
+        if flt.op in ("contains", "not_contains"):
+            columns = flt.column if isinstance(flt.column, list) else [flt.column]
+            if self._parallel(positions):
+                mask = self.scanner.mask("contains", columns, flt.value, positions)
+            else:
+                mask = np.zeros(self.index.num_rows if positions is None else len(positions), dtype=bool)
+                for column in columns:
+                    mask |= self.column_values(column, positions).str.contains(
+                        flt.value, case=False, regex=False, na=False
+                    ).to_numpy()
+        else:
+            values = flt.value if isinstance(flt.value, list) else [flt.value]
+            if flt.column in INDEXED_COLUMNS:
+                values = self._canonical_values(flt.column, values)
+                if not negate and positions is None:
+                    return self.index.positions_for(flt.column, values)
+                mask = self.index.mask_for(flt.column, values)
+                if positions is not None:
+                    mask = mask[positions]
+            elif self._parallel(positions):
+                mask = self.scanner.mask("isin", [flt.column], values, positions)
+            else:
+                mask = self.column_values(flt.column, positions).isin(values).to_numpy()
+
+        if negate:
+            mask = ~mask
+        return np.flatnonzero(mask) if positions is None else positions[mask]
+
+    def select(self, filters: List[Filter]) -> Optional[np.ndarray]:
+        """
+        Get the row positions matching all filters.
+
+        Args:
+            filters: Row filters
+
+        Returns:
+            Sorted row positions, or None if there are no filters (all rows)
+        """
+        positions = None
+        # Index filters first, so text filters only scan the rows they left
+        for flt in sorted(filters, key=lambda f: f.op in ("contains", "not_contains")):
+            positions = self._apply_filter(flt, positions)
+        return positions
+
+    def _limit(self, positions: Optional[np.ndarray], limit: int, sample: bool,
+               stratify_by: Optional[str] = None) -> np.ndarray:
+        """Reduce row positions to at most limit, taking a seeded (stratified) sample or the first rows."""
+        if not sample:
+            return np.arange(min(limit, self.index.num_rows)) if positions is None else positions[:limit]
+        if positions is None:
+            positions = np.arange(self.index.num_rows)
+        if stratify_by is not None:
+            return stratified_sample(positions, limit, self.index.codes[stratify_by], SAMPLE_SEED)
+        return seeded_sample(positions, limit, SAMPLE_SEED)
+
+    def take(self, positions: np.ndarray, columns: Optional[List[str]]) -> pd.DataFrame:
+        """Materialize the projected columns of the given rows."""
+        columns = columns or list(self.df.columns)
+        column_positions = [self.df.columns.get_loc(column) for column in columns]
+        return self.df.iloc[positions, column_positions].reset_index(drop=True)
+
+    def execute(self, plan: QueryPlan, max_rows: Optional[int] = None) -> Union[pd.DataFrame, pd.Series, int]:
+        """
+        Execute a query plan.
+
+        Args:
+            plan: Validated query plan
+            max_rows: Optional cap on the rows returned by 'rows' and 'first_per_group',
+                applied to row positions before anything is materialized
+
+        Returns:
+            A DataFrame, a Series of values, or a count
+        """
+        positions = self.select(plan.filters)
+
+        if plan.operation == "count":
+            return int(self.index.num_rows if positions is None else len(positions))
+
+        if plan.operation == "value_counts":
+            counts = self.value_counts(plan.column, positions)
+            if plan.limit:
+                counts = counts.head(plan.limit)
+            return counts.rename("count").rename_axis(plan.column).reset_index()
+
+        if plan.operation == "unique":
+            if plan.column in INDEXED_COLUMNS:
+                codes = self.index.codes[plan.column]
+                codes = codes if positions is None else codes[positions]
+                unique_codes, first_seen = np.unique(codes, return_index=True)
+                vocab = self.index.vocab[plan.column]
+                # Order of first appearance, like Series.unique()
+                values = [vocab[code] for code in unique_codes[np.argsort(first_seen)] if code >= 0]
+            else:
+                values = self.column_values(plan.column, positions).unique().tolist()
+            if plan.limit:
+                values = values[:plan.limit]
+            return pd.Series(values, name=plan.column)
+
+        if plan.operation == "first_per_group":
+            if positions is None:
+                positions = np.arange(self.index.num_rows)
+            if all(column in INDEXED_COLUMNS for column in plan.group_by):
+                keys = np.stack([self.index.codes[column][positions] for column in plan.group_by], axis=1)
+                # Unique keys come out sorted, i.e. ordered by the group values
+                _, first_seen = np.unique(keys, axis=0, return_index=True)
+                positions = positions[first_seen]
+            else:
+                groups = self.df.iloc[positions][plan.group_by]
+                positions = positions[~groups.duplicated().to_numpy()]
+            if plan.limit:
+                positions = positions[:plan.limit]
+            if max_rows is not None and len(positions) > max_rows:
+                # Seeded sample of the groups, kept in group order
+                positions = np.sort(self._limit(positions, max_rows, sample=True))
+            return self.take(positions, plan.columns)
+
+        limit = plan.limit or DEFAULT_ROW_LIMIT
+        if max_rows is not None:
+            limit = min(limit, max_rows)
+        positions = self._limit(positions, limit, plan.sample, plan.stratify_by)
+        return self.take(positions, plan.columns)
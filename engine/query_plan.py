@@ -0,0 +1,39 @@
+from typing import List, Literal, Optional, Union
+from pydantic import BaseModel, Field, model_validator
+
+Column = Literal["category", "intent", "instruction", "response", "flags"]
+
+class Filter(BaseModel):
+    column: Union[Column, List[Column]] = Field(..., description="Column to filter on. For 'contains'/'not_contains' a list of columns matches if any of them matches")
+    op: Literal["eq", "ne", "in", "not_in", "contains", "not_contains"] = Field(..., description="Comparison operator")
+    value: Union[str, List[str]] = Field(..., description="Value to compare with, a list for 'in'/'not_in'")
+
+    @model_validator(mode="after")
+    def check_operands(self):
+        if isinstance(self.column, list) and self.op not in ("contains", "not_contains"):
+            raise ValueError(f"operator '{self.op}' takes a single column")
+        if self.op in ("in", "not_in") and not isinstance(self.value, list):
+            self.value = [self.value]
+        if self.op not in ("in", "not_in") and isinstance(self.value, list):
+            raise ValueError(f"operator '{self.op}' takes a single value")
+        return self
+
+class QueryPlan(BaseModel):
+    filters: List[Filter] = Field(default_factory=list, description="Row filters, all of which must match")
+    operation: Literal["rows", "unique", "value_counts", "count", "first_per_group"] = Field("rows", description="What to compute over the filtered rows")
+    column: Optional[Column] = Field(None, description="Target column of 'unique' and 'value_counts'")
+    columns: Optional[List[Column]] = Field(None, description="Columns to return for 'rows' and 'first_per_group' (all if omitted)")
+    group_by: Optional[List[Column]] = Field(None, description="Grouping columns of 'first_per_group'")
+    limit: Optional[int] = Field(None, ge=1, le=1000, description="Maximum number of rows to return")
+    sample: bool = Field(False, description="Return a random sample of the rows instead of the first ones")
+    stratify_by: Optional[Literal["category", "intent"]] = Field(None, description="Spread the sample over the values of this column in proportion to their share")
+
+    @model_validator(mode="after")
+    def check_operation(self):
+        if self.operation in ("unique", "value_counts") and self.column is None:
+            raise ValueError(f"operation '{self.operation}' requires 'column'")
+        if self.operation == "first_per_group" and not self.group_by:
+            raise ValueError("operation 'first_per_group' requires 'group_by'")
+        if self.stratify_by is not None and not self.sample:
+            raise ValueError("'stratify_by' requires 'sample': true")
+        return self
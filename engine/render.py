@@ -0,0 +1,125 @@
+from typing import Any, List, Tuple
+import pandas as pd
+
+# Budget of the rendered result in the describe prompt
+RESULT_TOKEN_BUDGET = 1500
+MAX_CELL_CHARS = 300
+MIN_CELL_CHARS = 40
+
+# Columns that only matter when the question mentions them
+OPTIONAL_COLUMNS = {"flags": ("flag", "tag", "linguistic")}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+def _truncate(value: Any, max_chars: int) -> str:
+    """Single-line string of a value, cut to max_chars."""
+    text = " ".join(str(value).split())
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+def _prune_columns(frame: pd.DataFrame, user_query: str, max_chars: int = MAX_CELL_CHARS) -> Tuple[pd.DataFrame, List[str]]:
+    """Drop columns that add no information and describe the constant ones instead (notes cut to max_chars)."""
+    notes = []
+    query = user_query.lower()
+    keep = []
+    for column in frame.columns:
+        keywords = OPTIONAL_COLUMNS.get(column)
+        if keywords and not any(keyword in query for keyword in keywords):
+            continue
+        values = frame[column]
+        if values.isna().all():
+            continue
+        if len(frame) > 1 and values.nunique(dropna=False) == 1:
+            notes.append(_truncate(f"All rows have {column} = {values.iloc[0]}", max_chars))
+            continue
+        keep.append(column)
+    return frame[keep], notes
+
+def render_result(result: Any, user_query: str = "", max_tokens: int = RESULT_TOKEN_BUDGET,
+                  max_cell_chars: int = MAX_CELL_CHARS) -> str:
+    """
+    Render an analysis result compactly for an LLM prompt.
+
+    Columns that are empty, constant or irrelevant to the question are pruned,
+    cells are cut to a width that fits the budget, and rows are added until the
+    token budget is used up. The notes on constant columns and the header share
+    at most half of the budget; columns beyond it are only counted.
+
+    Args:
+        result: DataFrame, Series or scalar result
+        user_query: User's question, used to decide which columns are relevant
+        max_tokens: Hard token budget of the whole rendered text
+        max_cell_chars: Maximum characters per cell and per note
+
+    Returns:
+        The rendered result
+    """
+    # Keep room for the "more rows" line so the budget is never exceeded
+    budget_chars = max_tokens * 4 - 60
+
+    if not isinstance(result, (pd.DataFrame, pd.Series)):
+        return _truncate(result, budget_chars)
+
+    frame = result.to_frame() if isinstance(result, pd.Series) else result
+    index = frame.index
+    if any(name is not None for name in index.names) or not pd.api.types.is_integer_dtype(index):
+        # A meaningful index (e.g. value_counts labels) becomes a regular column,
+        # plain row numbers are dropped
+        frame = frame.reset_index()
+    total_rows = len(frame)
+    frame, notes = _prune_columns(frame, user_query, max_cell_chars)
+
+    lines = [f"{total_rows} rows"]
+    used = len(lines[0]) + 1
+    # Notes and header stop here, keeping room for the "more columns" line and the rows
+    meta_chars = budget_chars // 2 - 40
+
+    shown_notes = []
+    for note in notes:
+        if used + len(note) + 1 > meta_chars:
+            break
+        shown_notes.append(note)
+        used += len(note) + 1
+
+    # Columns are shown while the header and a first row at the narrowest cell width fit
+    columns, header, first_row = [], "", ""
+    if total_rows > 0:
+        for column in frame.columns:
+            name = _truncate(column, max_cell_chars)
+            cell = _truncate(frame[column].iloc[0], MIN_CELL_CHARS)
+            extended = f"{header} | {name}" if header else name
+            extended_row = f"{first_row} | {cell}" if first_row else cell
+            if used + len(extended) + len(extended_row) + 2 > meta_chars:
+                break
+            columns.append(column)
+            header, first_row = extended, extended_row
+
+    lines += shown_notes
+    omitted = len(notes) - len(shown_notes) + (len(frame.columns) - len(columns) if total_rows > 0 else 0)
+    if omitted:
+        lines.append(f"(+{omitted} more columns)")
+        used += len(lines[-1]) + 1
+    if not columns:
+        return "\n".join(lines)
+
+    frame = frame[columns]
+    lines.append(header)
+    used += len(header) + 1
+
+    # Spread the remaining budget over all cells, within [MIN_CELL_CHARS, max_cell_chars]
+    per_cell = (budget_chars - used) // max(1, total_rows * len(frame.columns))
+    cell_chars = max(MIN_CELL_CHARS, min(max_cell_chars, per_cell))
+
+    shown = 0
+    for row in frame.itertuples(index=False):
+        line = " | ".join(_truncate(value, cell_chars) for value in row)
+        if used + len(line) + 1 > budget_chars:
+            break
+        lines.append(line)
+        used += len(line) + 1
+        shown += 1
+
+    if shown < total_rows:
+        lines.append(f"... ({total_rows - shown} more rows not shown)")
+    return "\n".join(lines)
@@ -0,0 +1,155 @@
+from typing import Any, Iterable, Optional
+import hashlib
+import json
+
+import numpy as np
+
+# Seed of samples that don't derive one from the request
+DEFAULT_SEED = 42
+
+def request_seed(*parts: Any) -> int:
+    """
+    Derive a stable seed from the parameters of a request, so identical requests
+    draw identical samples (and downstream LLM and summary caches can hit).
+
+    Args:
+        parts: Request parameters (tool name, filters, ...)
+
+    Returns:
+        A 32-bit seed
+    """
+    key = json.dumps(parts, sort_keys=True, default=str)
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:4], "little")
+
+def prefer_distinct(positions: np.ndarray, labels: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Reorder row positions so the first row of every label comes first, keeping
+    the order otherwise; with near-duplicate cluster labels, duplicates only
+    get picked once every cluster has been picked.
+
+    Args:
+        positions: Row positions, in the preferred order
+        labels: Optional label of every row of the dataset
+
+    Returns:
+        The reordered positions
+    """
+    if labels is None or len(positions) == 0:
+        return positions
+    _, first = np.unique(labels[positions], return_index=True)
+    is_first = np.zeros(len(positions), dtype=bool)
+    is_first[first] = True
+    return np.concatenate([positions[is_first], positions[~is_first]])
+
+def seeded_order(positions: np.ndarray, seed: int = DEFAULT_SEED,
+                 labels: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Get a deterministic random order of row positions.
+
+    Args:
+        positions: Row positions
+        seed: Random seed
+        labels: Optional near-duplicate labels, see prefer_distinct
+
+    Returns:
+        The shuffled positions
+    """
+    rng = np.random.default_rng(seed)
+    return prefer_distinct(positions[rng.permutation(len(positions))], labels)
+
+def seeded_sample(positions: np.ndarray, n: int, seed: int = DEFAULT_SEED,
+                  labels: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Draw a deterministic random sample of row positions, without replacement.
+
+    Args:
+        positions: Row positions to sample from
+        n: Sample size
+        seed: Random seed
+        labels: Optional near-duplicate labels, see prefer_distinct
+
+    Returns:
+        At most n row positions, in sample order
+    """
+    if labels is not None:
+        return seeded_order(positions, seed, labels)[:n]
+    rng = np.random.default_rng(seed)
+    return positions[rng.choice(len(positions), size=min(n, len(positions)), replace=False)]
+
+def allocate(sizes: np.ndarray, n: int) -> np.ndarray:
+    """
+    Split a sample size over strata in proportion to their sizes (largest remainder method).
+
+    Args:
+        sizes: Number of rows of every stratum
+        n: Total sample size
+
+    Returns:
+        Rows to draw from every stratum
+    """
+    total = int(sizes.sum())
+    if n >= total:
+        return sizes.copy()
+    exact = sizes * (n / total)
+    quotas = np.floor(exact).astype(np.int64)
+    # Ties go to the first strata, so the allocation is deterministic
+    order = np.lexsort((np.arange(len(sizes)), -(exact - quotas)))
+    quotas[order[:n - int(quotas.sum())]] += 1
+    return np.minimum(quotas, sizes)
+
+def stratified_sample(positions: np.ndarray, n: int, strata: np.ndarray, seed: int = DEFAULT_SEED,
+                      labels: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Draw a deterministic sample with every stratum (e.g. intent) represented in
+    proportion to its share of the rows.
+
+    Args:
+        positions: Row positions to sample from
+        n: Sample size
+        strata: Stratum code of every row of the dataset (e.g. the intent codes)
+        seed: Random seed
+        labels: Optional near-duplicate labels, see prefer_distinct
+
+    Returns:
+        At most n row positions, grouped by stratum
+    """
+    shuffled = seeded_order(positions, seed, labels)
+    codes = strata[shuffled]
+    # Stable sort keeps the (distinct-first) shuffled order within each stratum
+    order = np.argsort(codes, kind="stable")
+    values, starts, sizes = np.unique(codes[order], return_index=True, return_counts=True)
+    quotas = allocate(sizes, n)
+    chosen = [shuffled[order[start:start + quota]] for start, quota in zip(starts, quotas) if quota > 0]
+    return np.concatenate(chosen) if chosen else np.empty(0, dtype=np.int64)
+
+def reservoir_sample(chunks: Iterable[np.ndarray], n: int, seed: int = DEFAULT_SEED) -> np.ndarray:
+    """
+    Draw a deterministic uniform sample from a stream of row positions
+    (Algorithm R, vectorized per chunk), without holding the stream in memory.
+
+    Args:
+        chunks: Row positions, in chunks
+        n: Sample size
+        seed: Random seed
+
+    Returns:
+        At most n row positions
+    """
+    rng = np.random.default_rng(seed)
+    reservoir = np.empty(n, dtype=np.int64)
+    seen = 0
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.int64)
+        fill = min(max(n - seen, 0), len(chunk))
+        reservoir[seen:seen + fill] = chunk[:fill]
+        rest = chunk[fill:]
+        if len(rest):
+            # Item i (0-based over the stream) replaces slot j ~ U[0, i] if j < n
+            index = np.arange(seen + fill, seen + len(chunk))
+            slots = (rng.random(len(rest)) * (index + 1)).astype(np.int64)
+            accepted = np.flatnonzero(slots < n)
+            # Later items overwrite earlier ones in the same slot
+            last = len(accepted) - 1 - np.unique(slots[accepted][::-1], return_index=True)[1]
+            reservoir[slots[accepted][last]] = rest[accepted][last]
+        seen += len(chunk)
+    return reservoir[:min(n, seen)]
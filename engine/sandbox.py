@@ -0,0 +1,317 @@
+import atexit
+import multiprocessing
+import json
+import os
+import queue
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Sandbox configuration (SANDBOX_WORKERS=0 runs generated code in-process)
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", 2))
+SANDBOX_TIMEOUT = float(os.environ.get("SANDBOX_TIMEOUT", 10))
+SANDBOX_MEMORY_MB = int(os.environ.get("SANDBOX_MEMORY_MB", 2048))
+SANDBOX_MAX_ROWS = int(os.environ.get("SANDBOX_MAX_ROWS", 20))
+# Registered datasets (other than the built-in one) a worker keeps loaded, least recently used evicted first
+SANDBOX_DATASETS = int(os.environ.get("SANDBOX_DATASETS", 2))
+
+class SandboxError(Exception):
+    """Error raised while executing generated code in a sandbox worker."""
+
+    def __init__(self, error_type: str, message: str):
+        super().__init__(message)
+        self.error_type = error_type
+
+class SandboxTimeoutError(SandboxError):
+    """Generated code exceeded the wall-clock limit."""
+
+def _data_size() -> int:
+    """Bytes of the data segment of the current process (VmData, 0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmData:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def _limit_memory(memory_limit_mb: int):
+    """Cap the heap of the current process at memory_limit_mb above its current size (no-op where `resource` is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return
+    # Relative to the loaded dataset, so the limit is the same with and without a warm-start bundle
+    limit = _data_size() + memory_limit_mb * 1024 * 1024
+    # RLIMIT_DATA bounds anonymous allocations but not the memory-mapped dataset
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+def _cap_result(result: Any, max_rows: int) -> Any:
+    """Limit long DataFrames/Series to max_rows before they leave the worker."""
+    if isinstance(result, (pd.DataFrame, pd.Series)) and len(result) > max_rows:
+        result = result.sample(max_rows, random_state=42).reset_index(drop=True)
+    return result
+
+def _pack(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    """Frame a message from a worker: a JSON header, then an optional binary payload."""
+    header_bytes = json.dumps(header).encode()
+    return len(header_bytes).to_bytes(4, "big") + header_bytes + payload
+
+def _unpack(data: bytes) -> Tuple[Dict[str, Any], bytes]:
+    """Inverse of _pack."""
+    size = int.from_bytes(data[:4], "big")
+    return json.loads(data[4:4 + size]), data[4 + size:]
+
+def _json_safe(value: Any) -> Any:
+    """Scalars and plain containers as JSON values (numpy scalars and arrays included); TypeError otherwise."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (np.generic, np.ndarray)):
+        return _json_safe(value.tolist())
+    if isinstance(value, (list, tuple, pd.Index, pd.api.extensions.ExtensionArray)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, dict) and all(isinstance(key, (str, int, float, bool, np.generic)) for key in value):
+        return {str(_json_safe(key)): _json_safe(item) for key, item in value.items()}
+    raise TypeError(type(value).__name__)
+
+def _serialize_result(result: Any) -> bytes:
+    """
+    Serialize a result for transfer to the parent process.
+
+    Generated code controls the result, so nothing is pickled: DataFrames and
+    Series are sent as an Arrow IPC stream, scalars and plain containers as
+    JSON, and anything else as its repr().
+    """
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        import pyarrow as pa
+        try:
+            frame = result.to_frame(name="value") if isinstance(result, pd.Series) else result
+            table = pa.Table.from_pandas(frame, preserve_index=True)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            if isinstance(result, pd.DataFrame):
+                return _pack({"status": "ok", "kind": "dataframe"}, sink.getvalue().to_pybytes())
+            name = result.name if isinstance(result.name, (str, int, float)) or result.name is None else str(result.name)
+            return _pack({"status": "ok", "kind": "series", "name": _json_safe(name)}, sink.getvalue().to_pybytes())
+        except Exception:
+            pass
+    try:
+        return _pack({"status": "ok", "kind": "json", "value": _json_safe(result)})
+    except (TypeError, ValueError):
+        return _pack({"status": "ok", "kind": "repr", "value": repr(result)})
+
+def _deserialize_result(header: Dict[str, Any], payload: bytes) -> Any:
+    """Inverse of _serialize_result."""
+    if header["kind"] in ("json", "repr"):
+        return header["value"]
+
+    import pyarrow as pa
+    frame = pa.ipc.open_stream(payload).read_all().to_pandas()
+    if header["kind"] == "series":
+        return frame["value"].rename(header["name"])
+    return frame
+
+def _worker_main(conn, memory_limit_mb: int, max_rows: int):
+    """Sandbox worker: load the dataset once, then execute code sent over the pipe."""
+    try:
+        from collections import OrderedDict
+        from data.catalog import _read_dataset
+        from data.download_dataset import load_dataset_mmap
+        from data.ingest import SegmentWatcher
+        df = load_dataset_mmap()
+        # Registered datasets, by path, loaded when code for them first arrives
+        datasets = OrderedDict()
+        segment_watcher = SegmentWatcher(df)
+        _limit_memory(memory_limit_mb)
+    except BaseException as e:
+        conn.send_bytes(_pack({"status": "failed", "type": type(e).__name__, "message": str(e)}))
+        return
+    conn.send_bytes(_pack({"status": "ready"}))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        path, code = message
+
+        try:
+            if path is None:
+                # Pick up rows ingested since the last query
+                ingested = []
+                if segment_watcher.poll(ingested.append):
+                    df = pd.concat([df] + ingested, ignore_index=True)
+                frame = df
+            else:
+                if path not in datasets:
+                    while len(datasets) >= SANDBOX_DATASETS:
+                        datasets.popitem(last=False)
+                    datasets[path] = _read_dataset(path)
+                datasets.move_to_end(path)
+                frame = datasets[path]
+            # Shallow copy: generated code can't rebind columns of the shared frame
+            exec_env = {'df': frame.copy(deep=False), 'pd': pd}
+            exec(code, exec_env)
+            result = _cap_result(exec_env.get('result'), max_rows)
+            conn.send_bytes(_serialize_result(result))
+        except MemoryError:
+            conn.send_bytes(_pack({"status": "error", "type": "MemoryError",
+                                   "message": f"query exceeded the sandbox memory limit of {memory_limit_mb} MB"}))
+        except BaseException as e:
+            conn.send_bytes(_pack({"status": "error", "type": type(e).__name__, "message": str(e)}))
+
+class _Worker:
+    """Handle of one sandbox worker process."""
+
+    def __init__(self, ctx, memory_limit_mb: int, max_rows: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit_mb, max_rows),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float):
+        """Block until the worker has loaded the dataset."""
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise SandboxError("TimeoutError", "sandbox worker did not start in time")
+        try:
+            header, _ = _unpack(self.conn.recv_bytes())
+        except EOFError:
+            raise SandboxError("RuntimeError", "sandbox worker exited during startup")
+        if header["status"] != "ready":
+            raise SandboxError(header["type"], f"sandbox worker failed to start: {header['message']}")
+        self.ready = True
+
+    def kill(self):
+        """Terminate the worker process."""
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+class SandboxExecutor:
+    """
+    Pool of pre-warmed worker processes that execute generated pandas code.
+
+    Each worker holds a memory-mapped copy of the dataset and runs one query at
+    a time under wall-clock and memory limits. A worker that times out or
+    crashes is killed and replaced, so a runaway query only ever occupies a
+    single worker.
+    """
+
+    def __init__(self, num_workers: int = SANDBOX_WORKERS, timeout: float = SANDBOX_TIMEOUT,
+                 memory_limit_mb: int = SANDBOX_MEMORY_MB, max_rows: int = SANDBOX_MAX_ROWS,
+                 startup_timeout: float = 120, queue_timeout: float = 60):
+        """
+        Start the worker pool.
+
+        Args:
+            num_workers: Number of worker processes
+            timeout: Wall-clock limit per query in seconds
+            memory_limit_mb: Heap limit per worker in megabytes
+            max_rows: Maximum number of rows returned for DataFrame/Series results
+            startup_timeout: Time allowed for a worker to load the dataset
+            queue_timeout: Time to wait for an idle worker before giving up
+        """
+        from data.download_dataset import ensure_parquet_cache
+
+        # Build the cache once here so workers don't race to write it
+        ensure_parquet_cache()
+
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_rows = max_rows
+        self.startup_timeout = startup_timeout
+        self.queue_timeout = queue_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = []
+        self._workers_lock = threading.Lock()
+        for _ in range(num_workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx, self.memory_limit_mb, self.max_rows)
+        with self._workers_lock:
+            self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        with self._workers_lock:
+            self._workers.remove(worker)
+        return self._spawn()
+
+    def execute(self, code: str, timeout: Optional[float] = None, dataset_path: Optional[str] = None) -> Any:
+        """
+        Execute generated code in a sandbox worker.
+
+        Args:
+            code: Code assigning to a variable named 'result'
+            timeout: Optional wall-clock limit overriding the pool default
+            dataset_path: File of the registered dataset bound to 'df' (the built-in dataset if omitted)
+
+        Returns:
+            The value of 'result' (DataFrames/Series capped to max_rows)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise SandboxError("TimeoutError", "all sandbox workers are busy, please try again")
+
+        try:
+            try:
+                worker.wait_ready(self.startup_timeout)
+            except SandboxError:
+                worker = self._replace(worker)
+                raise
+            worker.conn.send((dataset_path, code))
+            if not worker.conn.poll(timeout):
+                worker = self._replace(worker)
+                raise SandboxTimeoutError("TimeoutError", f"query exceeded the time limit of {timeout:g} seconds")
+            try:
+                # Raw bytes only: unpickling what a worker sends would run code chosen by the generated code
+                header, payload = _unpack(worker.conn.recv_bytes())
+            except EOFError:
+                worker = self._replace(worker)
+                raise SandboxError("MemoryError", "sandbox worker crashed while executing the query")
+            except ValueError:
+                worker = self._replace(worker)
+                raise SandboxError("RuntimeError", "sandbox worker sent a malformed result")
+        finally:
+            self._idle.put(worker)
+
+        if header["status"] == "error":
+            raise SandboxError(header["type"], header["message"])
+        return _deserialize_result(header, payload)
+
+    def shutdown(self):
+        """Stop all worker processes."""
+        with self._workers_lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.kill()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_sandbox_executor() -> SandboxExecutor:
+    """Get the process-wide sandbox executor, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = SandboxExecutor()
+            atexit.register(_executor.shutdown)
+    return _executor
@@ -0,0 +1,196 @@
+from typing import Callable, Dict, List, Any, Optional
+from difflib import SequenceMatcher
+import fcntl
+import json
+import os
+import re
+import datetime
+import threading
+
+# File of the cache, shared by every app and API process of the checkout
+CODE_CACHE_FILE = os.environ.get(
+    "CODE_CACHE_FILE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code_cache.json")
+)
+
+# Words that don't change what a question asks for
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "do", "does", "did", "we", "you", "u", "me", "i",
+    "please", "can", "could", "would", "there", "be", "to", "for", "in", "on", "any", "some"
+}
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query, strip punctuation and collapse whitespace"""
+    query = re.sub(r"[^\w\s]", " ", str(query).lower())
+    return " ".join(query.split())
+
+def _key_tokens(normalized_query: str) -> List[str]:
+    """Tokens of a normalized query that carry meaning"""
+    return [token for token in normalized_query.split() if token not in STOPWORDS]
+
+class CodeCache:
+    """
+    Persistent cache mapping normalized questions to validated generated code.
+
+    A lookup matches exactly on the normalized question, or locally by
+    similarity: both questions must have the same meaningful tokens up to
+    small spelling differences, and numbers must be identical. Entries are
+    kept per dataset schema hash, so sessions on different datasets don't
+    evict each other's code; the least recently used schemas beyond
+    max_schemas (e.g. superseded by new vocabulary values) are dropped.
+
+    Several processes share the file: every change re-reads it and replaces
+    it atomically under a file lock, and lookups pick up the other processes'
+    changes once the file was replaced.
+    """
+
+    def __init__(self, cache_file: str = CODE_CACHE_FILE, token_similarity: float = 0.8,
+                 max_entries: int = 1000, max_schemas: int = 16):
+        self.cache_file = cache_file
+        self.token_similarity = token_similarity
+        self.max_entries = max_entries
+        self.max_schemas = max_schemas
+        self._cache = None
+        # Modification time of the file when it was last read or written
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self) -> Dict[str, Any]:
+        """Cache contents, loaded from file on first access and after another process replaced it"""
+        if self._cache is None or self._file_mtime() != self._mtime:
+            self._mtime = self._file_mtime()
+            self._cache = self._load_cache()
+        return self._cache
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.cache_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load_cache(self) -> Dict[str, Any]:
+        """Load the cache from file or initialize if not exists"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r') as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                cache = {}
+            if "schemas" in cache:
+                return cache
+            # Single-schema layout of earlier versions
+            if cache.get("schema_hash"):
+                return {"schemas": {cache["schema_hash"]: cache.get("entries", {})}}
+        return {"schemas": {}}
+
+    def _update(self, change: Callable[[Dict[str, Any]], None]):
+        """Apply a change to the cache in the file, re-read under the lock so no other writer's entries are lost"""
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        with open(f"{self.cache_file}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            cache = self._load_cache()
+            change(cache)
+            tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f, indent=2)
+            os.replace(tmp_path, self.cache_file)
+            self._cache, self._mtime = cache, self._file_mtime()
+
+    def _entries(self, schema_hash: str, cache: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Entries of a dataset schema, marking the schema as most recently used"""
+        schemas = (self.cache if cache is None else cache)["schemas"]
+        # Dicts keep insertion order: re-inserting moves the schema to the end
+        entries = schemas.pop(schema_hash, {})
+        schemas[schema_hash] = entries
+        while len(schemas) > self.max_schemas:
+            schemas.pop(next(iter(schemas)))
+        return entries
+
+    def _tokens_match(self, tokens: List[str], other: List[str]) -> bool:
+        """Whether two token lists ask the same thing up to spelling differences"""
+        if len(tokens) != len(other):
+            return False
+        for token, other_token in zip(tokens, other):
+            if token == other_token:
+                continue
+            if token.isdigit() or other_token.isdigit():
+                return False
+            if SequenceMatcher(None, token, other_token).ratio() < self.token_similarity:
+                return False
+        return True
+
+    def lookup(self, query: str, schema_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Find cached code for a query.
+
+        Args:
+            query: User's question
+            schema_hash: Hash of the current dataset schema
+
+        Returns:
+            The cached entry, or None if there is no match
+        """
+        normalized = normalize_query(query)
+        with self._lock:
+            entries = self._entries(schema_hash)
+            entry = entries.get(normalized)
+
+            if entry is None:
+                tokens = _key_tokens(normalized)
+                for candidate in entries.values():
+                    if self._tokens_match(tokens, candidate["tokens"]):
+                        entry = candidate
+                        break
+
+            return entry
+
+    def store(self, query: str, schema_hash: str, pandas_code: str, thoughts: str = "",
+              query_plan: Optional[Dict[str, Any]] = None):
+        """
+        Store code that executed successfully for a query.
+
+        Args:
+            query: User's question
+            schema_hash: Hash of the current dataset schema
+            pandas_code: Validated code assigning to 'result'
+            thoughts: Reasoning that produced the code
+            query_plan: Validated query plan, if the question was answered with one
+        """
+        normalized = normalize_query(query)
+        entry = {
+            "query": normalized,
+            "tokens": _key_tokens(normalized),
+            "pandas_code": pandas_code,
+            "query_plan": query_plan,
+            "thoughts": thoughts,
+            "timestamp": datetime.datetime.now().isoformat()
+        }
+
+        def change(cache):
+            entries = self._entries(schema_hash, cache)
+            entries[normalized] = entry
+            # Drop the oldest entries beyond max_entries (dicts keep insertion order)
+            while len(entries) > self.max_entries:
+                entries.pop(next(iter(entries)))
+
+        with self._lock:
+            self._update(change)
+
+    def invalidate(self, query: str, schema_hash: str):
+        """Remove the entry of a query, e.g. after its cached code failed"""
+        normalized = normalize_query(query)
+
+        def change(cache):
+            entries = self._entries(schema_hash, cache)
+            if normalized in entries:
+                del entries[normalized]
+            else:
+                tokens = _key_tokens(normalized)
+                for key, candidate in list(entries.items()):
+                    if self._tokens_match(tokens, candidate["tokens"]):
+                        del entries[key]
+
+        with self._lock:
+            self._update(change)
@@ -1,12 +1,49 @@
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
+from collections import OrderedDict
+import fcntl
 import json
 import os
 import datetime
+import hashlib
+import threading
 
 class Memory:
+    """
+    Memory of one partition, persisted in a JSON file.
+
+    Several processes (app workers, API workers) may write the same file:
+    every write re-reads the file and replaces it atomically under a file
+    lock, and reads pick up the file again once another process changed it.
+    """
+
     def __init__(self, memory_file: str = "agent_memory.json"):
         self.memory_file = memory_file
-        self.memories = self._load_memories()
+        self._memories = None
+        # Modification time of the file when it was last read or written
+        self._mtime: Optional[int] = None
+    
+    @property
+    def memories(self) -> Dict[str, Any]:
+        """Memories of this partition, loaded from file on first access and after another process wrote it"""
+        if self._memories is None or self._file_mtime() != self._mtime:
+            self._mtime = self._file_mtime()
+            self._memories = self._load_memories()
+        return self._memories
+    
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the memories are currently held in RAM"""
+        return self._memories is not None
+    
+    def unload(self):
+        """Drop the in-memory copy; it is reloaded from file on next access"""
+        self._memories = None
+    
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.memory_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
         
     def _load_memories(self) -> Dict[str, Any]:
         """Load memories from file or initialize if not exists"""
@@ -20,11 +57,21 @@ class Memory:
             "metadata": {"last_updated": None}
         }
     
-    def _save_memories(self):
-        """Save memories to file"""
-        self.memories["metadata"]["last_updated"] = datetime.datetime.now().isoformat()
-        with open(self.memory_file, 'w') as f:
-            json.dump(self.memories, f, indent=2)
+    def _update(self, change: Callable[[Dict[str, Any]], None]):
+        """Apply a change to the memories in the file, re-read under the lock so no other writer's change is lost"""
+        memory_dir = os.path.dirname(self.memory_file)
+        if memory_dir:
+            os.makedirs(memory_dir, exist_ok=True)
+        with open(f"{self.memory_file}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            memories = self._load_memories()
+            change(memories)
+            memories["metadata"]["last_updated"] = datetime.datetime.now().isoformat()
+            tmp_path = f"{self.memory_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(memories, f, indent=2)
+            os.replace(tmp_path, self.memory_file)
+            self._memories, self._mtime = memories, self._file_mtime()
     
     def add_interaction(self, query: str, response: str, tools_used: List[str]):
         """Add a new interaction to memory"""
@@ -34,24 +81,23 @@ class Memory:
             "response": response,
             "tools_used": tools_used
         }
-        self.memories["interactions"].append(interaction)
-        self._save_memories()
+        self._update(lambda memories: memories["interactions"].append(interaction))
     
     def add_summary(self, key: str, summary: str):
         """Add or update a summary in memory"""
-        self.memories["summaries"][key] = {
+        entry = {
             "content": summary,
             "timestamp": datetime.datetime.now().isoformat()
         }
-        self._save_memories()
+        self._update(lambda memories: memories["summaries"].update({key: entry}))
     
     def add_insight(self, key: str, insight: str):
         """Add or update an insight in memory"""
-        self.memories["insights"][key] = {
+        entry = {
             "content": insight,
             "timestamp": datetime.datetime.now().isoformat()
         }
-        self._save_memories()
+        self._update(lambda memories: memories["insights"].update({key: entry}))
     
     def get_recent_interactions(self, n: int = 5) -> List[Dict[str, Any]]:
         """Get the n most recent interactions"""
@@ -164,3 +210,66 @@ If there are no relevant past interactions, respond with "No relevant past infor
         
         except Exception as e:
             return ""
+
+
+class MemoryStore:
+    """
+    Memory partitioned by session or user id.
+    
+    Each partition lives in its own file and is only loaded on first use.
+    At most `max_loaded` partitions are kept in RAM; the least recently used
+    ones are evicted (they are persisted on every write, so nothing is lost).
+    """
+    
+    def __init__(self, memory_dir: str = "agent_memory", max_loaded: int = 32,
+                 legacy_file: Optional[str] = "agent_memory.json"):
+        self.memory_dir = memory_dir
+        self.max_loaded = max_loaded
+        # Single memory file of versions without partitions, moved into the "default" partition on first use
+        self.legacy_file = legacy_file
+        self._partitions: "OrderedDict[str, Memory]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _partition_file(self, partition_id: str) -> str:
+        """Get the memory file of a partition, named by the hash of its id so that distinct ids never share a file"""
+        path = os.path.join(self.memory_dir, f"{hashlib.sha1(partition_id.encode()).hexdigest()}.json")
+        if partition_id == "default" and self.legacy_file and os.path.exists(self.legacy_file) and not os.path.exists(path):
+            os.makedirs(self.memory_dir, exist_ok=True)
+            try:
+                os.replace(self.legacy_file, path)
+            except FileNotFoundError:
+                # Another process migrated it first
+                pass
+        return path
+    
+    def get(self, partition_id: Optional[str] = None) -> Memory:
+        """Get the memory of a session or user, evicting inactive partitions if needed"""
+        partition_id = partition_id or "default"
+        with self._lock:
+            memory = self._partitions.get(partition_id)
+            if memory is None:
+                memory = Memory(self._partition_file(partition_id))
+                self._partitions[partition_id] = memory
+            else:
+                self._partitions.move_to_end(partition_id)
+            
+            while len(self._partitions) > self.max_loaded:
+                _, evicted = self._partitions.popitem(last=False)
+                evicted.unload()
+        
+        return memory
+    
+    def evict(self, partition_id: str):
+        """Drop a partition from RAM"""
+        with self._lock:
+            memory = self._partitions.pop(partition_id, None)
+        if memory is not None:
+            memory.unload()
+    
+    def loaded_partitions(self) -> List[str]:
+        """Get the ids of the partitions currently held in RAM, least recently used first"""
+        with self._lock:
+            return [pid for pid, memory in self._partitions.items() if memory.is_loaded]
+
+# Shared by all agents in the process
+MEMORY_STORE = MemoryStore()
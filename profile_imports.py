@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of every entry point.
+
+Each entry point is imported in a fresh interpreter with `python -X importtime`
+and the self time of every imported module is summed per top-level package,
+so a slow or eager import shows up with the entry points it delays. Scripts
+(the Streamlit pages, the launchers) are profiled through their top-level
+imports without running them.
+
+Usage: python profile_imports.py [--top N]
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+# Scripts, profiled through the modules they import
+SCRIPTS = {
+    "app": "app/app.py",
+    "tests": "test_agents.py",
+    "launcher": "run_app.py",
+}
+# Modules run with python -m or imported by worker processes
+MODULES = {
+    "agent": "agent.agent",
+    "pre-planning": "agent_analyst_task",
+    "http api": "api.server",
+    "tool registry": "tools.registry",
+    "sandbox worker": "engine.sandbox",
+    "ingest": "data.ingest",
+    "bundle": "data.bundle",
+    "dedup": "data.dedup",
+    "tactics": "data.tactics",
+}
+
+def script_imports(path: str) -> List[str]:
+    """Modules imported at the top level of a script."""
+    with open(os.path.join(ROOT, path)) as file:
+        tree = ast.parse(file.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+def profile(modules: List[str]) -> Tuple[Dict[str, float], List[str]]:
+    """
+    Import modules in a fresh interpreter.
+
+    Args:
+        modules: Modules to import
+
+    Returns:
+        Self time in milliseconds per top-level package, and the modules that couldn't be imported
+    """
+    # No API key: importing must not need one
+    env = {key: value for key, value in os.environ.items() if key != "NEBIUS_API_KEY"}
+    env["PYTHONPATH"] = os.pathsep.join([ROOT] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    # A missing optional dependency is reported without hiding the cost of the other imports
+    code = (f"import importlib, sys\nfor module in {modules!r}:\n"
+            "    try:\n        importlib.import_module(module)\n"
+            "    except ImportError as e:\n        print(f'missing: {module} ({e})', file=sys.stderr)\n")
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                             capture_output=True, text=True)
+    packages: Dict[str, float] = defaultdict(float)
+    missing, errors = [], []
+    for line in process.stderr.splitlines():
+        if line.startswith("missing: "):
+            missing.append(line[len("missing: "):])
+            continue
+        if not line.startswith("import time:"):
+            errors.append(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue  # header
+        packages[fields[2].strip().split(".")[0]] += int(fields[0]) / 1000
+    if process.returncode != 0 and errors:
+        missing.append(errors[-1])
+    return dict(packages), missing
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of every entry point")
+    parser.add_argument("--top", type=int, default=5, help="Slowest packages shown per entry point")
+    args = parser.parse_args()
+
+    entry_points = {name: script_imports(path) for name, path in SCRIPTS.items()}
+    entry_points.update({name: [module] for name, module in MODULES.items()})
+    print(f"{'entry point':<16}{'import ms':>10}  slowest packages")
+    for name, modules in entry_points.items():
+        packages, missing = profile(modules)
+        slowest = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        print(f"{name:<16}{sum(packages.values()):>10.0f}  " +
+              ", ".join(f"{package} {ms:.0f}" for package, ms in slowest))
+        for error in missing:
+            print(f"{'':<28}not imported: {error}")
+
+if __name__ == "__main__":
+    main()
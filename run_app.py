@@ -3,6 +3,22 @@ import os
 import sys
 import subprocess
 import argparse
+import asyncio
+import re
+import signal
+import time
+
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+# Streamlit worker processes of the production mode, behind one public port
+APP_WORKERS = int(os.environ.get("APP_WORKERS", os.cpu_count() or 1))
+# Seconds between health checks of the workers, and allowed for one check
+HEALTH_INTERVAL = float(os.environ.get("HEALTH_INTERVAL", 2))
+HEALTH_TIMEOUT = float(os.environ.get("HEALTH_TIMEOUT", 2))
+# Seconds a crashed worker waits before it is restarted, so a crash loop doesn't spin
+RESTART_DELAY = float(os.environ.get("RESTART_DELAY", 1))
+# Cookie pinning a browser to the worker that holds its session and media files
+STICKY_COOKIE = "app_worker"
 
 def check_dependencies():
     """Check if required Python packages are installed and install if missing."""
@@ -10,8 +26,6 @@ def check_dependencies():
         "streamlit",
         "pandas",
         "openai",
-        "matplotlib",
-        "seaborn",
         "pydantic",
         "python-dotenv"
     ]
@@ -26,10 +40,10 @@ def check_dependencies():
             subprocess.run([sys.executable, "-m", "pip", "install", package])
             print(f"✓ {package} has been installed")
 
-def setup_environment():
+def setup_environment(production=False):
     """Set up the environment variables and configuration."""
     # Create .env file if it doesn't exist
-    if not os.path.exists(".env"):
+    if not production and not os.path.exists(".env"):
         print("Creating .env file...")
         with open(".env", "w") as f:
             f.write("# Add your environment variables here\n")
@@ -51,6 +65,186 @@ def setup_environment():
             print("Warning: NEBIUS_API_KEY not found in environment variables and nebius.key file not found.")
             print("Please set the NEBIUS_API_KEY environment variable or create a nebius.key file")
 
+def prewarm():
+    """
+    Build everything workers would otherwise build on their first request: the
+    Parquet cache and the warm-start bundle (indexes, text statistics,
+    near-duplicate clusters, response tactics, prompt fragments).
+    """
+    from data.bundle import build_bundle, load_bundle
+    from data.download_dataset import ensure_parquet_cache
+    from engine.parallel import remove_stale_shards
+
+    # Mapped dataset copies of workers killed by an earlier run
+    removed = remove_stale_shards()
+    if removed:
+        print(f"Removed {removed} stale dataset shard directories")
+    start = time.perf_counter()
+    if ensure_parquet_cache() is None:
+        print("pyarrow is not installed: workers will load the dataset from CSV")
+        return
+    bundle = load_bundle()
+    if bundle is None:
+        path = build_bundle()
+        print(f"Built warm-start bundle {os.path.basename(path)} in {time.perf_counter() - start:.1f}s")
+    else:
+        print(f"Using warm-start bundle {bundle.version}")
+
+class AppWorker:
+    """One Streamlit process of the production mode, on a local port."""
+
+    def __init__(self, port):
+        self.port = port
+        self.process = None
+        self.healthy = False
+        self.connections = 0
+        self.restarts = 0
+
+    def start(self):
+        self.healthy = False
+        self.process = subprocess.Popen([
+            sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "app", "app.py"),
+            "--server.port", str(self.port),
+            "--server.address", "127.0.0.1",
+            "--server.headless", "true",
+            "--server.fileWatcherType", "none",
+            "--server.runOnSave", "false",
+            "--browser.gatherUsageStats", "false",
+        ], cwd=ROOT)
+
+    async def check(self):
+        """Ask the worker's health endpoint whether it can serve sessions."""
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", self.port), HEALTH_TIMEOUT)
+            writer.write(b"GET /_stcore/health HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n")
+            status = await asyncio.wait_for(reader.readline(), HEALTH_TIMEOUT)
+            writer.close()
+            self.healthy = b" 200 " in status
+        except (OSError, asyncio.TimeoutError):
+            self.healthy = False
+
+async def _read_head(reader):
+    """Read the head of an HTTP message (up to the blank line), or what arrived if it is too long or cut short."""
+    try:
+        return await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError:
+        return await reader.read(65536)
+
+def _sticky_port(head):
+    """Worker port named by the sticky cookie of a request head, if any."""
+    match = re.search(rb"(?im)^cookie:.*?\b" + STICKY_COOKIE.encode() + rb"=(\d+)", head)
+    return int(match.group(1)) if match else None
+
+async def _pipe_setting_cookie(reader, writer, port):
+    """Forward a response, adding the sticky cookie of the worker to its head."""
+    head = await _read_head(reader)
+    status, _, rest = head.partition(b"\r\n")
+    if status.startswith(b"HTTP/"):
+        cookie = f"Set-Cookie: {STICKY_COOKIE}={port}; Path=/; HttpOnly; SameSite=Lax\r\n".encode()
+        head = status + b"\r\n" + cookie + rest
+    writer.write(head)
+    await _pipe(reader, writer)
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (OSError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(port, workers):
+    """
+    Proxy TCP connections on the public port to the workers, and restart
+    workers that exit.
+
+    Routing is sticky: a browser's first response carries a cookie naming its
+    worker, and every later connection of that browser (the WebSocket and its
+    reconnections, media downloads, uploads) goes to the same worker, which
+    holds the session and its files. Browsers without the cookie, or whose
+    worker is down, go to the healthy worker with the fewest open connections.
+    """
+    async def handle(client_reader, client_writer):
+        head = await _read_head(client_reader)
+        if not head:
+            client_writer.close()
+            return
+        sticky = _sticky_port(head)
+        candidates = sorted((worker for worker in workers if worker.healthy), key=lambda worker: worker.connections)
+        # The browser's own worker first; one that refuses the connection is skipped until its next check
+        candidates.sort(key=lambda worker: worker.port != sticky)
+        for worker in candidates:
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+                break
+            except OSError:
+                worker.healthy = False
+        else:
+            client_writer.write(b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\n\r\nNo worker available\n")
+            client_writer.close()
+            return
+        worker.connections += 1
+        try:
+            upstream_writer.write(head)
+            response = (_pipe(upstream_reader, client_writer) if worker.port == sticky
+                        else _pipe_setting_cookie(upstream_reader, client_writer, worker.port))
+            await asyncio.gather(_pipe(client_reader, upstream_writer), response)
+        finally:
+            worker.connections -= 1
+
+    async def supervise():
+        while True:
+            for worker in workers:
+                if worker.process.poll() is not None:
+                    print(f"Worker on port {worker.port} exited with code {worker.process.returncode}, restarting")
+                    worker.healthy = False
+                    await asyncio.sleep(RESTART_DELAY)
+                    worker.restarts += 1
+                    worker.start()
+            await asyncio.gather(*(worker.check() for worker in workers))
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    server = await asyncio.start_server(handle, "0.0.0.0", port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    supervisor = asyncio.create_task(supervise())
+    print(f"Serving {len(workers)} workers on port {port}")
+    async with server:
+        await stop.wait()
+    supervisor.cancel()
+
+def run_production(port, num_workers):
+    """
+    Prewarm the dataset, start the workers and serve them behind one port until stopped.
+
+    Args:
+        port: Public port
+        num_workers: Number of Streamlit worker processes
+    """
+    prewarm()
+    workers = [AppWorker(port + 1 + i) for i in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        asyncio.run(serve(port, workers))
+    finally:
+        for worker in workers:
+            worker.process.terminate()
+        for worker in workers:
+            try:
+                worker.process.wait(10)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+
 def main():
     """Main function to run the application."""
     parser = argparse.ArgumentParser(description="Run the Customer Service Dataset Q&A application")
@@ -61,10 +255,21 @@ def main():
     parser.add_argument("--port", type=int, default=default_port, 
                         help=f"Port to run the Streamlit app on (default: {default_port}, can be set with PORT env var)")
     
+    parser.add_argument("--production", action="store_true",
+                        help="Skip the dependency check, prewarm the dataset and serve several workers behind the port")
+    parser.add_argument("--workers", type=int, default=APP_WORKERS,
+                        help=f"Worker processes in production mode (default: {APP_WORKERS}, can be set with APP_WORKERS env var)")
+    
     args = parser.parse_args()
     
     # Add the current directory to the Python path
-    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+    sys.path.insert(0, ROOT)
+    
+    if args.production:
+        # Dependencies are installed when the image is built, never at launch
+        setup_environment(production=True)
+        run_production(args.port, args.workers)
+        return
     
     # Check and install dependencies
     check_dependencies()
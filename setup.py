@@ -7,13 +7,14 @@ setup(
     include_package_data=True,
     install_requires=[
         "streamlit>=1.24.0",
-        "pandas>=1.5.0",
+        "pandas>=3.0.0",
         "openai>=1.0.0",
         "datasets>=2.12.0",
-        "matplotlib>=3.7.0",
-        "seaborn>=0.12.0",
+        "pyarrow>=12.0.0",
         "pydantic>=2.0.0",
         "python-dotenv>=1.0.0",
+        "fastapi>=0.100.0",
+        "uvicorn>=0.22.0",
     ],
-    python_requires=">=3.8",
+    python_requires=">=3.11",
 )
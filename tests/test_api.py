@@ -0,0 +1,74 @@
+"""Smoke tests of the HTTP API, with the LLM calls replaced by canned answers."""
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import agent_analyst_task
+from agent.agent import ReActAgent
+from api.server import Dispatcher, create_app
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("NEBIUS_API_KEY", "test")
+    return TestClient(create_app(Dispatcher(concurrency=2, queue_size=2)))
+
+def test_health_and_datasets(client):
+    assert client.get("/health").json()["status"] == "ok"
+    datasets = client.get("/datasets").json()["datasets"]
+    assert datasets[0]["name"] == "bitext"
+
+def test_tools(client):
+    response = client.get("/tools").json()
+    assert {tool["function"]["name"] for tool in response["tools"]} >= {"count_intent", "finish"}
+    assert response["vocabularies"]["category"]
+    assert client.get("/tools", params={"dataset": "missing"}).status_code == 404
+
+def test_ask_pre_planning_numpy_result(client, monkeypatch):
+    def handle_question(query, history, mode, streamlit_available=True, return_full_results=False, on_event=None):
+        return {"thoughts": "", "code": "result = (df.intent == 'x').sum()", "query_plan": None,
+                "result": np.int64(42), "result_type": "scalar"}
+    monkeypatch.setattr(agent_analyst_task, "handle_question", handle_question)
+
+    response = client.post("/ask", json={"question": "how many?", "mode": "pre-planning"})
+    assert response.status_code == 200
+    assert response.json()["result"] == 42
+
+def test_stream_react(client, monkeypatch):
+    def run(self, query, on_event=None):
+        on_event({"type": "dataframe", "name": "show_dataframe", "data": pd.DataFrame({"intent": ["x"]})})
+        self._last_tools_used = ["show_dataframe"]
+        return "one row"
+    monkeypatch.setattr(ReActAgent, "run", run)
+
+    response = client.post("/stream", json={"question": "show one row", "session_id": "s1"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0] == {"type": "dataframe", "name": "show_dataframe", "data": [{"intent": "x"}]}
+    assert lines[-1]["type"] == "answer"
+    assert lines[-1]["answer"] == "one row" and lines[-1]["tools_used"] == ["show_dataframe"]
+
+def test_timed_out_question_stops(monkeypatch):
+    steps, stopped = [], threading.Event()
+    def run(self, query, on_event=None):
+        try:
+            for step in range(50):
+                time.sleep(0.02)
+                on_event({"type": "tool", "name": "count_intent"})
+                steps.append(step)
+            return "done"
+        finally:
+            stopped.set()
+    monkeypatch.setattr(ReActAgent, "run", run)
+    monkeypatch.setenv("NEBIUS_API_KEY", "test")
+    client = TestClient(create_app(Dispatcher(concurrency=1, queue_size=0)))
+    # Load the dataset before the clock starts
+    client.get("/tools")
+    monkeypatch.setattr("api.server.API_TIMEOUT", 0.2)
+
+    assert client.post("/ask", json={"question": "slow", "session_id": "s2"}).status_code == 504
+    # The run stops at its next step after the deadline instead of running to the end
+    assert stopped.wait(5) and len(steps) < 50
@@ -0,0 +1,94 @@
+"""Every installed query backend must return the same results as pandas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine.backends import BACKENDS, create_backend
+from engine.query_plan import Filter, QueryPlan
+
+INTENTS = {"ORDER": ["cancel_order", "change_order", "place_order"], "INVOICE": ["check_invoice", "get_invoice"],
+           "REFUND": ["get_refund", "track_refund"]}
+
+# Filters every backend must answer identically
+FILTERS = [
+    [],
+    [Filter(column="category", op="eq", value="ORDER")],
+    [Filter(column="category", op="eq", value="order")],
+    [Filter(column="intent", op="in", value=["get_invoice", "check_invoice"])],
+    [Filter(column="category", op="eq", value="ORDER"), Filter(column="intent", op="ne", value="cancel_order")],
+    [Filter(column="intent", op="not_in", value=["get_refund", "track_refund"])],
+    [Filter(column=["instruction", "response"], op="contains", value="price")],
+    [Filter(column="response", op="not_contains", value="sorry"), Filter(column="category", op="eq", value="REFUND")],
+]
+
+PLANS = [
+    {"operation": "count"},
+    {"operation": "value_counts", "column": "intent"},
+    {"operation": "value_counts", "column": "category", "limit": 2},
+    {"operation": "unique", "column": "intent"},
+    {"operation": "unique", "column": "category", "limit": 2},
+    {"operation": "first_per_group", "group_by": ["intent"], "columns": ["intent", "instruction"]},
+    {"operation": "first_per_group", "group_by": ["category", "intent"], "limit": 4},
+    {"operation": "rows", "columns": ["instruction", "intent"], "limit": 5},
+    {"operation": "rows", "sample": True, "limit": 7},
+    {"operation": "rows", "sample": True, "stratify_by": "intent", "limit": 10, "columns": ["intent"]},
+]
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    rng = np.random.default_rng(3)
+    categories = rng.choice(list(INTENTS), size=600)
+    intents = [rng.choice(INTENTS[category]) for category in categories]
+    topics = rng.choice(["price", "delivery", "account"], size=600)
+    df = pd.DataFrame({
+        "flags": rng.choice(["B", "K", "EP", "CK"], size=600),
+        "instruction": [f"question about the {topic} of my order" for topic in topics],
+        "category": categories,
+        "intent": intents,
+        "response": [f"{'Sorry, ' if i % 3 else ''}here is how to {intent}" for i, intent in enumerate(intents)],
+    })
+    path = str(tmp_path_factory.mktemp("backends") / "dataset.parquet")
+    # Several row groups, so the streaming backend combines partial results
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=128)
+    return df, path
+
+def _result(value):
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict("records")
+    if isinstance(value, pd.Series):
+        return value.tolist()
+    return value
+
+@pytest.mark.parametrize("name", [name for name in BACKENDS if name != "pandas"])
+def test_backend_parity(dataset, name):
+    df, path = dataset
+    reference = create_backend("pandas", df)
+    try:
+        backend = create_backend(name, parquet_paths=[path])
+    except ImportError as e:
+        pytest.skip(f"{name} is not installed: {e}")
+
+    for filters in FILTERS:
+        checks = {
+            "count": lambda b: b.count(filters),
+            "positions": lambda b: b.positions(filters).tolist(),
+            "intent counts": lambda b: b.value_counts("intent", filters),
+            "top categories": lambda b: b.value_counts("category", filters, top_n=2),
+            "rows": lambda b: b.rows(filters, ["instruction", "intent"], limit=5, offset=2).to_dict("records"),
+        }
+        if name != "streaming":
+            # The streaming backend draws a reservoir sample over the scanned row groups instead
+            checks["sample"] = lambda b: b.sample(5, filters, seed=7).to_dict("records")
+        for check, run in checks.items():
+            assert run(backend) == run(reference), f"{check} with filters {filters}"
+
+        for plan in PLANS:
+            plan = QueryPlan(filters=filters, **plan)
+            for max_rows in (None, 3):
+                assert _result(backend.execute(plan, max_rows)) == _result(reference.execute(plan, max_rows)), \
+                    f"{plan.model_dump(exclude_defaults=True)} with max_rows={max_rows}"
+
+    assert len(backend.sample(5, FILTERS[1], seed=7)) == 5
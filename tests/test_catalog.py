@@ -0,0 +1,63 @@
+"""Datasets load on first use and the least recently used ones are evicted beyond the memory budget."""
+import pandas as pd
+import pytest
+
+from data.catalog import DatasetCatalog
+
+@pytest.fixture
+def catalog(tmp_path):
+    specs = {}
+    for name, category in (("orders", "ORDER"), ("refunds", "REFUND"), ("invoices", "INVOICE")):
+        path = tmp_path / f"{name}.csv"
+        pd.DataFrame({
+            "flags": ["B", "K"] * 50,
+            "instruction": [f"{name} question {i}" for i in range(100)],
+            "category": [category] * 100,
+            "intent": [f"get_{name}", f"check_{name}"] * 50,
+            "response": [f"{name} answer {i}" for i in range(100)],
+        }).to_csv(path, index=False)
+        specs[name] = {"path": str(path), "description": f"{category} conversations"}
+    return DatasetCatalog(specs)
+
+def test_lazy_loading(catalog):
+    assert catalog.names() == ["bitext", "orders", "refunds", "invoices"]
+    assert catalog.loaded_datasets() == []
+    orders = catalog.get("orders")
+    assert catalog.loaded_datasets() == ["orders"]
+    assert catalog.get("orders") is orders
+    assert orders.vocabularies["category"] == ["ORDER"]
+    with pytest.raises(ValueError, match="Unknown dataset 'missing'"):
+        catalog.get("missing")
+
+def test_eviction_under_budget(catalog):
+    size = catalog.get("orders").memory_bytes
+    # Room for two of the (equally sized) datasets
+    catalog.memory_budget = int(size * 2.5)
+    catalog.get("refunds")
+    assert catalog.loaded_datasets() == ["orders", "refunds"]
+
+    catalog.get("invoices")
+    assert catalog.loaded_datasets() == ["refunds", "invoices"]
+
+    # Using a dataset makes it the most recently used one
+    catalog.get("refunds")
+    orders = catalog.get("orders")
+    assert catalog.loaded_datasets() == ["refunds", "orders"]
+    assert orders.backend.count([]) == 100
+
+    catalog.evict("refunds")
+    assert catalog.loaded_datasets() == ["orders"]
+
+def test_dataset_over_budget_stays_loaded(catalog):
+    catalog.memory_budget = 1
+    catalog.get("orders")
+    assert catalog.loaded_datasets() == ["orders"]
+    catalog.get("refunds")
+    assert catalog.loaded_datasets() == ["refunds"]
+
+def test_missing_file(tmp_path):
+    catalog = DatasetCatalog({"gone": {"path": str(tmp_path / "gone.csv")}})
+    with pytest.raises(ValueError, match="Dataset file not found"):
+        catalog.get("gone")
+    with pytest.raises(ValueError, match="already registered"):
+        catalog.register("gone", str(tmp_path / "other.csv"))
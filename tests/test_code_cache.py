@@ -0,0 +1,31 @@
+"""The code cache is shared by several processes through one file."""
+import multiprocessing
+
+from memory.code_cache import CodeCache
+
+def _store(path, worker):
+    cache = CodeCache(cache_file=path)
+    for i in range(10):
+        cache.store(f"how many {worker} tickets in week {i}", "schema", "result = 1", "thoughts")
+
+def test_lookup_sees_other_instance(tmp_path):
+    path = str(tmp_path / "code_cache.json")
+    first, second = CodeCache(cache_file=path), CodeCache(cache_file=path)
+    assert second.lookup("how many refunds", "schema") is None
+
+    first.store("how many refunds", "schema", "result = 1", "thoughts")
+    assert second.lookup("how many refunds", "schema")["pandas_code"] == "result = 1"
+
+    second.invalidate("how many refunds", "schema")
+    assert first.lookup("how many refunds", "schema") is None
+
+def test_concurrent_processes_keep_all_entries(tmp_path):
+    path = str(tmp_path / "code_cache.json")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_store, args=(path, worker)) for worker in ("refund", "invoice", "order")]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(CodeCache(cache_file=path).cache["schemas"]["schema"]) == 30
@@ -0,0 +1,65 @@
+"""Cursors carry the whole request state and reject anything they didn't produce."""
+import base64
+
+import numpy as np
+import pytest
+
+from engine.cursors import MAX_PAGE_SIZE, decode_cursor, encode_cursor, page
+
+STATE = {"dataset": "bitext", "n": 3, "intent": "get_refund", "category": None, "offset": 6}
+
+def test_round_trip():
+    cursor = encode_cursor("show_examples", STATE)
+    assert decode_cursor("show_examples", cursor) == STATE
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+    assert encode_cursor("show_examples", dict(reversed(list(STATE.items())))) == cursor
+
+def _flip(cursor, index):
+    raw = bytearray(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    raw[index] ^= 1
+    return base64.urlsafe_b64encode(bytes(raw)).decode().rstrip("=")
+
+def test_tampered_cursor():
+    cursor = encode_cursor("show_examples", STATE)
+    for index in (0, 10, -3):
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            decode_cursor("show_examples", _flip(cursor, index))
+    for broken in ("", "not a cursor", cursor[:-4], cursor + "A"):
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            decode_cursor("show_examples", broken)
+
+def test_cursor_of_another_tool():
+    with pytest.raises(ValueError, match="not a show_dataframe cursor"):
+        decode_cursor("show_dataframe", encode_cursor("show_examples", STATE))
+
+def test_pages_cover_every_row_once():
+    positions = np.arange(3, 250, 3)
+    pages, offset = [], 0
+    while offset is not None:
+        rows, offset = page(positions, offset, 10)
+        pages.append(rows)
+    assert [len(rows) for rows in pages] == [10] * 8 + [3]
+    assert np.array_equal(np.concatenate(pages), positions)
+    assert len(page(np.arange(500), 0, 1000)[0]) == MAX_PAGE_SIZE
+    assert page(positions, 80, 3)[1] is None
+
+def test_tool_pages(monkeypatch):
+    monkeypatch.setenv("NEBIUS_API_KEY", "test")
+    from tools.tool_functions import show_dataframe, show_examples
+
+    first = show_dataframe("instruction", limit=40, intent="get_refund")
+    rows, cursor = first["dataframe"], first.get("next_cursor")
+    while cursor:
+        result = show_dataframe(cursor=cursor)
+        assert result["offset"] == len(rows)
+        rows += result["dataframe"]
+        cursor = result.get("next_cursor")
+    assert len(rows) == first["total_matching"]
+
+    examples = show_examples(n=5, intent="get_refund")
+    following = show_examples(cursor=examples["next_cursor"])
+    assert following["total_matching"] == examples["total_matching"]
+    assert not {e["instruction"] + e["response"] for e in examples["examples"]} & \
+        {e["instruction"] + e["response"] for e in following["examples"]}
+    assert show_examples(cursor=examples["next_cursor"]) == following
+    assert "error" in show_examples(cursor=_flip(examples["next_cursor"], 10))
@@ -0,0 +1,106 @@
+"""Jobs of one key run in order, and cancelled jobs stop at their next event or never start."""
+import threading
+import time
+
+import pytest
+
+from engine.jobs import CANCELLED, DONE, FAILED, JobQueue
+
+def _wait(*jobs, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not all(job.done for job in jobs):
+        assert time.monotonic() < deadline, "jobs didn't finish"
+        time.sleep(0.01)
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=4, max_results=10)
+    yield queue
+    queue.shutdown()
+
+def test_jobs_of_a_key_run_in_order(queue):
+    running, order, overlaps = set(), [], []
+    lock = threading.Lock()
+
+    def job(key, i):
+        def run(emit):
+            with lock:
+                overlaps.append(key in running)
+                running.add(key)
+            time.sleep(0.02)
+            emit({"type": "step", "name": str(i)})
+            with lock:
+                running.discard(key)
+                order.append((key, i))
+            return i
+        return run
+
+    jobs = [queue.submit(job(key, i), key=key) for i in range(5) for key in ("a", "b")]
+    _wait(*jobs)
+    assert not any(overlaps)
+    for key in ("a", "b"):
+        assert [i for k, i in order if k == key] == list(range(5))
+    assert [job.result for job in jobs] == [i for i in range(5) for _ in ("a", "b")]
+    assert jobs[0].events == [{"type": "step", "name": "0"}]
+
+def test_keys_run_concurrently(queue):
+    barrier = threading.Barrier(2, timeout=5)
+    jobs = [queue.submit(lambda emit: barrier.wait(), key=key) for key in ("a", "b")]
+    _wait(*jobs)
+    assert [job.status for job in jobs] == [DONE, DONE]
+
+def test_cancel_queued_job(queue):
+    release, ran = threading.Event(), []
+    first = queue.submit(lambda emit: release.wait(5), key="session")
+    queued = queue.submit(lambda emit: ran.append("queued"), key="session")
+    last = queue.submit(lambda emit: ran.append("last"), key="session")
+
+    assert queue.cancel(queued.id)
+    assert queued.status == CANCELLED
+    release.set()
+    _wait(first, last)
+    assert ran == ["last"]
+    assert not queue.cancel(queued.id) and not queue.cancel(first.id) and not queue.cancel("unknown")
+
+def test_cancel_running_job(queue):
+    started, steps = threading.Event(), []
+
+    def run(emit):
+        started.set()
+        for i in range(500):
+            emit({"type": "step", "name": str(i)})
+            steps.append(i)
+            time.sleep(0.01)
+        return "finished"
+
+    job = queue.submit(run, key="session")
+    assert started.wait(5)
+    assert queue.cancel(job.id)
+    _wait(job)
+    assert job.status == CANCELLED and job.result is None
+    assert len(steps) < 500
+
+    # The key is free again
+    after = queue.submit(lambda emit: "next", key="session")
+    _wait(after)
+    assert after.result == "next"
+
+def test_cancelled_result_is_dropped(queue):
+    release = threading.Event()
+    job = queue.submit(lambda emit: release.wait(5) and "result")
+    time.sleep(0.05)
+    assert job.cancel()
+    release.set()
+    _wait(job)
+    assert job.status == CANCELLED and job.result is None
+
+def test_failed_job_and_results_eviction(queue):
+    failed = queue.submit(lambda emit: 1 / 0)
+    _wait(failed)
+    assert failed.status == FAILED and failed.error.startswith("ZeroDivisionError")
+
+    jobs = [queue.submit(lambda emit: None) for _ in range(15)]
+    _wait(*jobs)
+    queue.submit(lambda emit: None)
+    assert queue.get(failed.id) is None
+    assert len(queue.jobs()) <= 11
@@ -0,0 +1,45 @@
+"""Memory partitions shared by several processes, and their files."""
+import json
+import multiprocessing
+
+from memory.memory import Memory, MemoryStore
+
+def _add_interactions(path, worker, count):
+    memory = Memory(path)
+    for i in range(count):
+        memory.add_interaction(f"q{worker}-{i}", "answer", [])
+
+def test_writers_never_lose_interactions(tmp_path):
+    path = str(tmp_path / "partition.json")
+    # Two processes of the same session, each with its own cached copy
+    first, second = Memory(path), Memory(path)
+    first.add_interaction("a", "answer", [])
+    second.add_interaction("b", "answer", ["count_intent"])
+    first.add_summary("interaction_summary", "summary")
+    assert [i["query"] for i in first.get_recent_interactions()] == ["a", "b"]
+    assert second.get_summary("interaction_summary") == "summary"
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_add_interactions, args=(path, worker, 20)) for worker in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    with open(path) as f:
+        assert len(json.load(f)["interactions"]) == 62
+
+def test_partitions_never_share_a_file(tmp_path):
+    store = MemoryStore(str(tmp_path), max_loaded=1)
+    store.get("a b").add_interaction("q1", "answer", [])
+    store.get("a_b").add_interaction("q2", "answer", [])
+    assert [i["query"] for i in store.get("a b").get_recent_interactions()] == ["q1"]
+    assert [i["query"] for i in store.get("a_b").get_recent_interactions()] == ["q2"]
+    assert store.loaded_partitions() == ["a_b"]
+
+def test_legacy_file_becomes_default_partition(tmp_path):
+    legacy = tmp_path / "agent_memory.json"
+    Memory(str(legacy)).add_interaction("old question", "answer", [])
+    store = MemoryStore(str(tmp_path / "partitions"), legacy_file=str(legacy))
+    assert [i["query"] for i in store.get().get_recent_interactions()] == ["old question"]
+    assert not legacy.exists()
+    assert store.get("other").get_recent_interactions() == []
@@ -0,0 +1,71 @@
+"""Parallel scans must return exactly what the serial pandas kernels return."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine.parallel import ParallelScanner, remove_stale_shards
+
+pytest.importorskip("pyarrow")
+
+def _frame(rows, offset=0):
+    rng = np.random.default_rng(offset)
+    return pd.DataFrame({
+        "flags": rng.choice(["B", "K", "EP", None], size=rows),
+        "instruction": [f"question {i % 7} about the {'price' if i % 5 == 0 else 'order'}" for i in range(offset, offset + rows)],
+        "intent": rng.choice(["cancel_order", "get_refund", "track_order"], size=rows),
+    })
+
+def _serial_mask(df, op, columns, value, positions):
+    frame = df if positions is None else df.iloc[positions]
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in columns:
+        if op == "contains":
+            mask |= frame[column].str.contains(value, case=False, regex=False, na=False).to_numpy()
+        else:
+            mask |= frame[column].isin(value).to_numpy()
+    return mask
+
+def _serial_counts(df, column, positions):
+    frame = df if positions is None else df.iloc[positions]
+    return frame[column].value_counts().sort_index()
+
+@pytest.fixture
+def scanner_and_frame(tmp_path, monkeypatch):
+    monkeypatch.setattr("engine.parallel.SHARED_DIR", str(tmp_path))
+    df = _frame(1000)
+    scanner = ParallelScanner(df, workers=2, min_rows=1)
+    yield scanner, df
+    scanner.shutdown()
+
+def _check(scanner, df):
+    rng = np.random.default_rng(1)
+    for positions in (None, np.sort(rng.choice(len(df), size=300, replace=False))):
+        for op, columns, value in [("contains", ["instruction"], "PRICE"), ("contains", ["instruction", "flags"], "k"),
+                                   ("isin", ["flags"], ["B", "EP"]), ("isin", ["intent"], ["get_refund"])]:
+            assert np.array_equal(scanner.mask(op, columns, value, positions),
+                                  _serial_mask(df, op, columns, value, positions)), (op, columns, positions is None)
+        for column in ("flags", "instruction", "intent"):
+            assert scanner.value_counts(column, positions).sort_index().to_dict() == \
+                _serial_counts(df, column, positions).to_dict()
+
+def test_parity(scanner_and_frame):
+    scanner, df = scanner_and_frame
+    assert scanner.use_for(len(df))
+    _check(scanner, df)
+
+def test_parity_after_append(scanner_and_frame):
+    scanner, df = scanner_and_frame
+    _check(scanner, df)
+    # Rows appended after the first scan go to a new mapped file
+    rows = _frame(333, offset=1000)
+    scanner.append(rows)
+    _check(scanner, pd.concat([df, rows], ignore_index=True))
+
+def test_remove_stale_shards(tmp_path):
+    for name in ("dataset-shards-999999999-dead", f"dataset-shards-{os.getpid()}-live", "other"):
+        (tmp_path / name).mkdir()
+    assert remove_stale_shards(str(tmp_path)) == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        sorted([f"dataset-shards-{os.getpid()}-live", "other"])
@@ -0,0 +1,82 @@
+"""Query plan filters must select the same rows as the equivalent pandas expressions."""
+import numpy as np
+import pandas as pd
+import pytest
+from pydantic import ValidationError
+
+from engine.query_engine import QueryEngine
+from engine.query_plan import Filter, QueryPlan
+
+@pytest.fixture(scope="module")
+def df():
+    rng = np.random.default_rng(5)
+    categories = rng.choice(["ORDER", "REFUND", "INVOICE"], size=300)
+    intents = [{"ORDER": "cancel_order", "REFUND": "get_refund", "INVOICE": "get_invoice"}[c] for c in categories]
+    responses = pd.Series([f"{'Sorry, ' if i % 4 == 0 else ''}here is help with {intent}"
+                           for i, intent in enumerate(intents)])
+    responses[::25] = None
+    return pd.DataFrame({
+        "flags": rng.choice(["B", "K", "BK"], size=300),
+        "instruction": [f"question {i} about the {topic}" for i, topic in enumerate(rng.choice(["price", "delivery"], size=300))],
+        "category": categories,
+        "intent": intents,
+        "response": responses,
+    })
+
+@pytest.fixture(scope="module")
+def engine(df):
+    return QueryEngine(df)
+
+def _selected(engine, filters):
+    positions = engine.select(filters)
+    return np.arange(len(engine.df)) if positions is None else positions
+
+@pytest.mark.parametrize("filters, expected", [
+    ([Filter(column="category", op="ne", value="ORDER")],
+     lambda df: df["category"] != "ORDER"),
+    ([Filter(column="flags", op="ne", value="B")],
+     lambda df: df["flags"] != "B"),
+    ([Filter(column="intent", op="not_in", value=["get_refund", "get_invoice"])],
+     lambda df: ~df["intent"].isin(["get_refund", "get_invoice"])),
+    ([Filter(column="flags", op="not_in", value=["B", "K"])],
+     lambda df: ~df["flags"].isin(["B", "K"])),
+    ([Filter(column="response", op="not_contains", value="sorry")],
+     lambda df: ~df["response"].str.contains("sorry", case=False, regex=False, na=False)),
+    ([Filter(column=["instruction", "response"], op="not_contains", value="price")],
+     lambda df: ~(df["instruction"].str.contains("price", na=False) | df["response"].str.contains("price", na=False))),
+    ([Filter(column="response", op="not_contains", value="sorry"), Filter(column="category", op="ne", value="REFUND"),
+      Filter(column="intent", op="not_in", value=["get_invoice"])],
+     lambda df: ~df["response"].str.contains("sorry", case=False, regex=False, na=False)
+                & (df["category"] != "REFUND") & (df["intent"] != "get_invoice")),
+])
+def test_negated_filters(df, engine, filters, expected):
+    assert _selected(engine, filters).tolist() == np.flatnonzero(expected(df).to_numpy()).tolist()
+
+def test_canonical_names(df, engine):
+    expected = np.flatnonzero((df["category"] == "ORDER").to_numpy()).tolist()
+    for value in ("ORDER", "order", "Order"):
+        assert _selected(engine, [Filter(column="category", op="eq", value=value)]).tolist() == expected
+    assert _selected(engine, [Filter(column="intent", op="in", value=["CANCEL_ORDER"])]).tolist() == expected
+    assert _selected(engine, [Filter(column="intent", op="ne", value="Cancel_Order")]).tolist() == \
+        np.flatnonzero((df["intent"] != "cancel_order").to_numpy()).tolist()
+
+def test_unknown_name(engine):
+    with pytest.raises(ValueError, match="Unknown intent value 'reset_password'"):
+        engine.select([Filter(column="intent", op="eq", value="reset_password")])
+
+def test_plan_operands():
+    assert Filter(column="intent", op="not_in", value="get_refund").value == ["get_refund"]
+    with pytest.raises(ValidationError):
+        Filter(column=["intent", "category"], op="ne", value="ORDER")
+    with pytest.raises(ValidationError):
+        Filter(column="intent", op="ne", value=["get_refund"])
+    with pytest.raises(ValidationError):
+        QueryPlan(operation="value_counts")
+
+def test_count_and_value_counts(df, engine):
+    plan = QueryPlan(filters=[Filter(column="category", op="ne", value="order")], operation="value_counts",
+                     column="intent")
+    counts = engine.execute(plan)
+    expected = df.loc[df["category"] != "ORDER", "intent"].value_counts()
+    assert dict(zip(counts["intent"], counts["count"])) == expected.to_dict()
+    assert engine.execute(QueryPlan(filters=plan.filters, operation="count")) == int(expected.sum())
@@ -0,0 +1,38 @@
+"""The rendered result must stay within its token budget, whatever the shape of the frame."""
+import pandas as pd
+import pytest
+
+from engine.render import render_result
+from tools.registry import count_tokens
+
+def _frames():
+    wide = pd.DataFrame({f"column_{i}": [f"value {i} {row}" for row in range(20)] for i in range(300)})
+    constant = pd.DataFrame({f"constant_{i}": ["x" * 300] * 20 for i in range(100)})
+    constant["text"] = [f"row {row} " * 50 for row in range(20)]
+    long = pd.DataFrame({"instruction": ["a long instruction " * 40] * 3 + ["other"] * 997})
+    return {"wide": wide, "constant": constant, "long": long,
+            "series": pd.Series(range(5000), name="count"), "scalar": "x " * 10000}
+
+@pytest.mark.parametrize("name", list(_frames()))
+@pytest.mark.parametrize("max_tokens", [200, 1500])
+def test_budget(name, max_tokens):
+    rendered = render_result(_frames()[name], max_tokens=max_tokens)
+    assert count_tokens(rendered) <= max_tokens
+
+def test_constant_columns_noted():
+    rendered = render_result(_frames()["constant"], max_tokens=1500)
+    lines = rendered.splitlines()
+    assert lines[0] == "20 rows"
+    assert lines[1].startswith("All rows have constant_0 = xxx") and len(lines[1]) <= 300
+    assert any(line.startswith("(+") and line.endswith("more columns)") for line in lines)
+    # The varying column still shows rows
+    assert "text" in lines and any(line.startswith("row 0") for line in lines)
+
+def test_small_frame_unchanged():
+    frame = pd.DataFrame({"intent": ["cancel_order", "get_refund"], "count": [3, 2]})
+    assert render_result(frame) == "2 rows\nintent | count\ncancel_order | 3\nget_refund | 2"
+
+def test_wide_frame_shows_rows():
+    rendered = render_result(_frames()["wide"], max_tokens=1500)
+    assert rendered.splitlines()[1].endswith("more columns)")
+    assert rendered.splitlines()[3].startswith("value 0 0 | value 1 0")
@@ -0,0 +1,46 @@
+"""Free-text intent and category names resolve locally to canonical values."""
+import pytest
+
+from data.resolver import VocabularyResolver
+
+INTENTS = ["cancel_order", "change_order", "place_order", "check_invoice", "get_invoice", "get_refund",
+           "track_refund", "check_refund_policy", "recover_password", "contact_human_agent", "delivery_options"]
+CATEGORIES = ["ORDER", "INVOICE", "REFUND", "ACCOUNT", "DELIVERY"]
+
+@pytest.fixture(scope="module")
+def resolver():
+    return VocabularyResolver({"intent": INTENTS, "category": CATEGORIES})
+
+@pytest.mark.parametrize("vocabulary, text, expected", [
+    ("intent", "cancel_order", ["cancel_order"]),
+    ("intent", "Cancel Order", ["cancel_order"]),
+    ("intent", "cancle order", ["cancel_order"]),
+    ("intent", "reimbursement status", ["track_refund"]),
+    ("intent", "talk to a person", ["contact_human_agent"]),
+    ("category", "refunds", ["REFUND"]),
+    ("category", "billing", ["INVOICE"]),
+    # Ties are all returned
+    ("intent", "View invoice", ["check_invoice", "get_invoice"]),
+    ("intent", "refunds", ["get_refund", "track_refund"]),
+    ("intent", "weather tomorrow", []),
+])
+def test_resolve(resolver, vocabulary, text, expected):
+    assert resolver.resolve(vocabulary, text) == expected
+
+def test_confidence(resolver):
+    assert resolver.candidates("intent", "Cancel Order") == [("cancel_order", 1.0)]
+    scored = resolver.candidates("intent", "cancle order")
+    assert scored[0][0] == "cancel_order" and scored[0][1] < 1.0
+    assert [confidence for _, confidence in scored] == sorted((confidence for _, confidence in scored), reverse=True)
+    assert resolver.resolve("intent", "cancle order", min_confidence=0.95) == []
+
+@pytest.mark.parametrize("code, expected", [
+    ("result = df[df['intent'] == 'cancle order']", "result = df[df['intent'] == 'cancel_order']"),
+    ('result = df[df["category"] != "refunds"]', 'result = df[df["category"] != "REFUND"]'),
+    # Canonical values, ambiguous names and other columns are left alone
+    ("result = df[df['intent'] == 'get_refund']", "result = df[df['intent'] == 'get_refund']"),
+    ("result = df[df['intent'] == 'View invoice']", "result = df[df['intent'] == 'View invoice']"),
+    ("result = df[df['response'] == 'cancle order']", "result = df[df['response'] == 'cancle order']"),
+])
+def test_rewrite_code(resolver, code, expected):
+    assert resolver.rewrite_code(code) == expected
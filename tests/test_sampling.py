@@ -0,0 +1,68 @@
+"""Samples are deterministic for a seed and drawn without replacement from the given rows."""
+import numpy as np
+import pytest
+
+from engine.sampling import allocate, request_seed, reservoir_sample, seeded_sample, stratified_sample
+
+POSITIONS = np.arange(5, 505, 2)
+# Stratum of every row of a 600-row dataset: 60% stratum 0, 30% stratum 1, 10% stratum 2
+STRATA = np.repeat([0, 1, 2], [360, 180, 60])[np.random.default_rng(0).permutation(600)]
+
+def test_request_seed():
+    assert request_seed("summarize", "get_refund", None) == request_seed("summarize", "get_refund", None)
+    assert request_seed("summarize", "get_refund", None) != request_seed("summarize", "track_refund", None)
+    assert request_seed("examples", {"a": 1, "b": 2}) == request_seed("examples", {"b": 2, "a": 1})
+
+def test_seeded_sample():
+    sample = seeded_sample(POSITIONS, 20, seed=7)
+    assert np.array_equal(sample, seeded_sample(POSITIONS, 20, seed=7))
+    assert not np.array_equal(sample, seeded_sample(POSITIONS, 20, seed=8))
+    assert len(set(sample.tolist())) == 20 and set(sample.tolist()) <= set(POSITIONS.tolist())
+    assert sorted(seeded_sample(POSITIONS, 1000, seed=7).tolist()) == POSITIONS.tolist()
+    assert len(seeded_sample(POSITIONS[:0], 5)) == 0
+
+def test_seeded_sample_prefers_distinct_labels():
+    # Rows 0-49 are near-duplicates of each other, every other row is distinct
+    labels = np.where(np.arange(600) < 50, 0, np.arange(600))
+    sample = seeded_sample(np.arange(60), 11, seed=3, labels=labels)
+    assert np.array_equal(sample, seeded_sample(np.arange(60), 11, seed=3, labels=labels))
+    assert sum(position < 50 for position in sample) == 1
+
+@pytest.mark.parametrize("sizes, n, expected", [
+    ([360, 180, 60], 10, [6, 3, 1]),
+    ([5, 5, 5], 4, [2, 1, 1]),
+    ([3, 1], 10, [3, 1]),
+])
+def test_allocate(sizes, n, expected):
+    assert allocate(np.array(sizes), n).tolist() == expected
+
+def test_stratified_sample():
+    positions = np.arange(600)
+    sample = stratified_sample(positions, 20, STRATA, seed=5)
+    assert np.array_equal(sample, stratified_sample(positions, 20, STRATA, seed=5))
+    assert not np.array_equal(sample, stratified_sample(positions, 20, STRATA, seed=6))
+    assert np.bincount(STRATA[sample], minlength=3).tolist() == [12, 6, 2]
+    assert len(set(sample.tolist())) == 20
+
+    subset = np.flatnonzero(STRATA != 0)
+    sample = stratified_sample(subset, 9, STRATA, seed=5)
+    assert set(sample.tolist()) <= set(subset.tolist())
+    assert np.bincount(STRATA[sample], minlength=3).tolist() == [0, 7, 2]
+    assert len(stratified_sample(positions[:0], 5, STRATA)) == 0
+
+def test_reservoir_sample():
+    stream = np.arange(1000)
+    sample = reservoir_sample(np.array_split(stream, 7), 25, seed=9)
+    assert len(set(sample.tolist())) == 25 and set(sample.tolist()) <= set(stream.tolist())
+    # The same rows for any chunking of the stream
+    for chunks in (1, 3, 50, 1000):
+        assert np.array_equal(reservoir_sample(np.array_split(stream, chunks), 25, seed=9), sample)
+    assert not np.array_equal(reservoir_sample([stream], 25, seed=10), sample)
+    assert sorted(reservoir_sample(np.array_split(stream[:10], 3), 25).tolist()) == list(range(10))
+
+def test_reservoir_sample_is_uniform():
+    counts = np.zeros(100)
+    for seed in range(400):
+        counts[reservoir_sample(np.array_split(np.arange(100), 4), 10, seed=seed)] += 1
+    # Every row is expected 40 times
+    assert counts.min() > 15 and counts.max() < 70
@@ -0,0 +1,54 @@
+"""Statistics extended by appended rows must equal statistics rebuilt over all rows."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.text_stats import METRICS, TEXT_COLUMNS, TextStats, _arrow_kernels, _pandas_kernels
+
+@pytest.fixture(scope="module")
+def df():
+    rng = np.random.default_rng(11)
+    topics = rng.choice(["price", "delivery", "refund", "Order status"], size=240)
+    placeholders = rng.choice(["{{Order Number}}", "{{Website URL}}", "", "{{Order Number}} and {{Invoice}}"], size=240)
+    instructions = pd.Series([f"I have a question about the {topic} {placeholder}" for topic, placeholder
+                              in zip(topics, placeholders)])
+    instructions[::17] = None
+    return pd.DataFrame({
+        "instruction": instructions,
+        "response": [f"Here's how to check the {topic}: open {placeholder} and follow the steps" if i % 5 else
+                     f"Sure, I'll help with the {topic}" for i, (topic, placeholder) in enumerate(zip(topics, placeholders))],
+    })
+
+def _assert_same(stats, rebuilt, positions_list):
+    assert stats.num_rows == rebuilt.num_rows
+    for column in TEXT_COLUMNS:
+        for metric in METRICS:
+            assert np.array_equal(stats.values(f"{column}_{metric}"), rebuilt.values(f"{column}_{metric}"))
+        for positions in positions_list:
+            assert stats.vocabulary_size(column, positions) == rebuilt.vocabulary_size(column, positions)
+            assert stats.placeholder_counts(column, positions) == rebuilt.placeholder_counts(column, positions)
+
+def test_append_matches_rebuild(df):
+    stats = TextStats(df.iloc[:100])
+    stats.append(df.iloc[100:170].reset_index(drop=True))
+    stats.append(df.iloc[170:].reset_index(drop=True))
+    positions = [None, np.arange(0, 240, 3), np.arange(150, 240), np.array([], dtype=np.int64)]
+    _assert_same(stats, TextStats(df), positions)
+
+def test_append_after_load(df, tmp_path):
+    TextStats(df.iloc[:100]).save(str(tmp_path))
+    stats = TextStats.load(str(tmp_path))
+    stats.append(df.iloc[100:].reset_index(drop=True))
+    _assert_same(stats, TextStats(df), [None, np.arange(90, 240)])
+
+def test_kernels_agree(df):
+    pytest.importorskip("pyarrow")
+    for column in TEXT_COLUMNS:
+        texts = pd.Series(df[column].fillna("").unique())
+        arrow, pandas = _arrow_kernels(texts), _pandas_kernels(texts)
+        for metric in METRICS:
+            assert np.array_equal(arrow[metric], pandas[metric]), f"{column} {metric}"
+        for kind in ("token", "placeholder"):
+            decoded = [sorted(zip(result[f"{kind}_docs"].tolist(), result[f"{kind}_names"][result[f"{kind}_codes"]].tolist()))
+                       for result in (arrow, pandas)]
+            assert decoded[0] == decoded[1], f"{column} {kind}s"
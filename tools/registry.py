@@ -0,0 +1,224 @@
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union, get_args, get_origin
+import inspect
+import json
+import re
+import sys
+import threading
+
+from data.resolver import VocabularyResolver
+
+# Parameters whose values come from a dataset vocabulary
+PARAMETER_VOCABULARIES = {
+    "intent": "intent",
+    "intent_name": "intent",
+    "category": "category",
+    "category_name": "category",
+}
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of a text with tiktoken if installed, else estimate them."""
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except ImportError:
+        from engine.render import estimate_tokens
+        return estimate_tokens(text)
+
+def _parse_docstring(doc: str) -> Tuple[str, Dict[str, str]]:
+    """Get the summary line and the Args descriptions of a Google-style docstring."""
+    lines = inspect.cleandoc(doc or "").splitlines()
+    summary = lines[0].rstrip(".") if lines else ""
+    params, in_args = {}, False
+    for line in lines[1:]:
+        if line.strip() in ("Args:", "Arguments:"):
+            in_args = True
+            continue
+        if in_args:
+            match = re.match(r"\s+(\w+):\s*(.+)", line)
+            if match:
+                params[match.group(1)] = match.group(2).strip()
+            elif line.strip() and not line.startswith(" "):
+                in_args = False
+    return summary, params
+
+def _json_type(annotation: Any) -> Dict[str, Any]:
+    """JSON schema of a type annotation."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        # Optional[X] is X; the parameter is simply not required
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _json_type(args[0])
+    if origin is Literal:
+        values = list(get_args(annotation))
+        return {"type": _JSON_TYPES[type(values[0])], "enum": values}
+    if origin in (list, List):
+        args = get_args(annotation)
+        return {"type": "array", "items": _json_type(args[0]) if args else {}}
+    return {"type": _JSON_TYPES.get(annotation, "string")}
+
+class ToolRegistry:
+    """
+    Builds the tool schemas from the signatures and docstrings of the tool functions.
+
+    Schemas are generated once and cached. The compact form doesn't inline the
+    intent/category vocabularies into every parameter: they are listed once in
+    the system prompt and arguments are validated and resolved server-side.
+    """
+
+    def __init__(self, functions: Dict[str, Callable], vocabularies: Dict[str, List[str]],
+                 resolver: Optional[VocabularyResolver] = None):
+        """
+        Initialize the registry.
+
+        Args:
+            functions: Map of tool name to implementation
+            vocabularies: Map of vocabulary name (intent, category) to valid values
+            resolver: Resolver of free-text names (built from the vocabularies if not given)
+        """
+        self.functions = functions
+        self.vocabularies = vocabularies
+        self.resolver = resolver or VocabularyResolver(vocabularies)
+        self._schemas: Dict[bool, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _parameter_schema(self, name: str, parameter: inspect.Parameter, description: str,
+                          compact: bool) -> Dict[str, Any]:
+        schema = _json_type(parameter.annotation)
+        vocabulary = PARAMETER_VOCABULARIES.get(name)
+        if vocabulary in self.vocabularies:
+            target = schema["items"] if schema["type"] == "array" else schema
+            if compact:
+                description = f"{description} (one of the {vocabulary} values in the system prompt)"
+            else:
+                target["enum"] = self.vocabularies[vocabulary]
+        if description:
+            schema["description"] = description
+        if parameter.default is not inspect.Parameter.empty and parameter.default is not None:
+            schema["default"] = parameter.default
+        return schema
+
+    def _build_schema(self, name: str, function: Callable, compact: bool) -> Dict[str, Any]:
+        summary, descriptions = _parse_docstring(function.__doc__)
+        properties, required = {}, []
+        for param_name, parameter in inspect.signature(function).parameters.items():
+            properties[param_name] = self._parameter_schema(
+                param_name, parameter, descriptions.get(param_name, ""), compact
+            )
+            if parameter.default is inspect.Parameter.empty:
+                required.append(param_name)
+
+        parameters = {"type": "object", "properties": properties}
+        if required:
+            parameters["required"] = required
+        return {
+            "type": "function",
+            "function": {"name": name, "description": summary, "parameters": parameters}
+        }
+
+    def get_tool_schemas(self, compact: bool = True) -> List[Dict[str, Any]]:
+        """
+        Get the tool schemas, generating them on first use.
+
+        Args:
+            compact: Whether to leave the vocabularies out of the schemas
+
+        Returns:
+            List of tools in the OpenAI function calling format
+        """
+        with self._lock:
+            if compact not in self._schemas:
+                self._schemas[compact] = [
+                    self._build_schema(name, function, compact) for name, function in self.functions.items()
+                ]
+            return self._schemas[compact]
+
+    def vocabulary_prompt(self) -> str:
+        """The vocabularies, listed once for the system prompt."""
+        return "\n".join(
+            f"Valid {name} values: {', '.join(values)}" for name, values in self.vocabularies.items()
+        )
+
+    def resolve_values(self, vocabulary: str, value: str) -> List[str]:
+        """
+        Resolve a free-text value to vocabulary entries with the local resolver.
+
+        Args:
+            vocabulary: Vocabulary name (intent or category)
+            value: Value given by the model
+
+        Returns:
+            The canonical values tied for the best match
+        """
+        resolved = self.resolver.resolve(vocabulary, value)
+        if not resolved:
+            raise ValueError(f"Unknown {vocabulary} '{value}'. Valid values are: {', '.join(self.vocabularies[vocabulary])}")
+        return resolved
+
+    def validate_arguments(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate tool arguments and resolve vocabulary values.
+
+        Args:
+            name: Tool name
+            arguments: Arguments given by the model
+
+        Returns:
+            The validated arguments
+        """
+        parameters = inspect.signature(self.functions[name]).parameters
+        unknown = [arg for arg in arguments if arg not in parameters]
+        if unknown:
+            raise ValueError(f"Unknown arguments for {name}: {', '.join(unknown)}")
+
+        validated = {}
+        for arg, value in arguments.items():
+            vocabulary = PARAMETER_VOCABULARIES.get(arg)
+            if vocabulary in self.vocabularies and value:
+                if isinstance(value, list):
+                    resolved = [match for item in value for match in self.resolve_values(vocabulary, item)]
+                    value = list(dict.fromkeys(resolved))
+                else:
+                    resolved = self.resolve_values(vocabulary, value)
+                    if len(resolved) > 1:
+                        raise ValueError(f"Ambiguous {vocabulary} '{value}', it could be any of: {', '.join(resolved)}")
+                    value = resolved[0]
+            validated[arg] = value
+        return validated
+
+    def measure(self) -> Dict[str, Any]:
+        """
+        Measure the size of the schemas sent to the model on every step.
+
+        Returns:
+            Bytes and tokens of the full and compact schemas, overall and per tool
+        """
+        report = {}
+        for label, compact in (("full", False), ("compact", True)):
+            per_tool = {}
+            for tool in self.get_tool_schemas(compact):
+                text = json.dumps(tool, separators=(",", ":"))
+                per_tool[tool["function"]["name"]] = {"bytes": len(text.encode()), "tokens": count_tokens(text)}
+            text = json.dumps(self.get_tool_schemas(compact), separators=(",", ":"))
+            if compact:
+                # The vocabularies move to the system prompt, once per request
+                text += self.vocabulary_prompt()
+            report[label] = {"bytes": len(text.encode()), "tokens": count_tokens(text), "per_tool": per_tool}
+        return report
+
+def print_report(registry: ToolRegistry, file=sys.stdout):
+    """Print the schema size report of a registry."""
+    report = registry.measure()
+    print(f"{'tool':<28}{'full bytes':>12}{'full tokens':>13}{'compact bytes':>15}{'compact tokens':>16}", file=file)
+    for name, full in report["full"]["per_tool"].items():
+        compact = report["compact"]["per_tool"][name]
+        print(f"{name:<28}{full['bytes']:>12}{full['tokens']:>13}{compact['bytes']:>15}{compact['tokens']:>16}", file=file)
+    full, compact = report["full"], report["compact"]
+    print(f"{'total':<28}{full['bytes']:>12}{full['tokens']:>13}{compact['bytes']:>15}{compact['tokens']:>16}", file=file)
+    saved = 1 - compact["tokens"] / max(1, full["tokens"])
+    print(f"Per-step prompt tokens saved: {full['tokens'] - compact['tokens']} ({saved:.0%})", file=file)
+
+if __name__ == "__main__":
+    from tools.tools import get_registry
+    print_report(get_registry())
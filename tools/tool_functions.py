@@ -1,11 +1,49 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Literal, Optional, Union
+import numpy as np
 import pandas as pd
-import openai
 import os
-from data.download_dataset import load_dataset_df
+from data.catalog import Dataset, current_dataset
+from engine.query_plan import Filter
+from engine.sampling import request_seed, seeded_order, seeded_sample, stratified_sample
+from engine.cursors import decode_cursor, encode_cursor, page
+from engine.export import export_to_file
 
-# Load the dataset
-df = load_dataset_df()
+# Every tool works on the dataset selected for the current session (see data/catalog.py),
+# with its query backend (QUERY_BACKEND) and precomputed indexes
+
+STAT_PERCENTILES = [10, 25, 50, 75, 90, 99]
+
+def refresh_dataset() -> bool:
+    """
+    Pick up the rows ingested into the current dataset since the last call.
+
+    Returns:
+        Whether new rows were added
+    """
+    return current_dataset().refresh()
+
+def _response_labels(dataset: Dataset) -> Optional[np.ndarray]:
+    """Near-duplicate cluster labels of the responses, if they were built."""
+    return dataset.dedup_index.labels["response"] if dataset.dedup_index is not None else None
+
+def _in_memory_error(tool: str) -> Dict[str, str]:
+    return {"error": f"{tool} needs the in-memory indexes, which are not built with QUERY_BACKEND=streaming"}
+
+def _offline_index_error(tool: str, dataset: Dataset, module: str) -> Dict[str, str]:
+    """Error of a tool whose index is built offline and is missing or stale for the dataset."""
+    if not dataset.in_memory:
+        return _in_memory_error(tool)
+    option = "" if dataset.path is None else f" --dataset {dataset.name}"
+    return {"error": f"{tool} is unavailable: its index was not built for this data (python -m {module}{option})"}
+
+def _filters(intent: Optional[str] = None, category: Optional[str] = None) -> List[Filter]:
+    """Build the backend filters of the optional intent and category arguments."""
+    filters = []
+    if intent:
+        filters.append(Filter(column="intent", op="eq", value=intent))
+    if category:
+        filters.append(Filter(column="category", op="eq", value=category))
+    return filters
 
 def select_semantic_intent(intent_name: List[str]) -> Dict[str, Any]:
     """
@@ -17,12 +55,13 @@ def select_semantic_intent(intent_name: List[str]) -> Dict[str, Any]:
     Returns:
         Dictionary with selected intents, count, and examples
     """
-    filtered_df = df[df['intent'].isin(intent_name)]
+    dataset = current_dataset()
+    filters = [Filter(column="intent", op="in", value=intent_name)]
     
     return {
         "selected_intents": intent_name,
-        "count": len(filtered_df),
-        "examples": filtered_df.head(3)[['instruction', 'intent', 'response']].to_dict('records')
+        "count": dataset.backend.count(filters),
+        "examples": dataset.backend.rows(filters, ['instruction', 'intent', 'response'], limit=3).to_dict('records')
     }
 
 def select_semantic_category(category_name: List[str]) -> Dict[str, Any]:
@@ -35,12 +74,13 @@ def select_semantic_category(category_name: List[str]) -> Dict[str, Any]:
     Returns:
         Dictionary with selected categories, count, and examples
     """
-    filtered_df = df[df['category'].isin(category_name)]
+    dataset = current_dataset()
+    filters = [Filter(column="category", op="in", value=category_name)]
     
     return {
         "selected_categories": category_name,
-        "count": len(filtered_df),
-        "examples": filtered_df.head(3)[['instruction', 'category', 'response']].to_dict('records')
+        "count": dataset.backend.count(filters),
+        "examples": dataset.backend.rows(filters, ['instruction', 'category', 'response'], limit=3).to_dict('records')
     }
 
 def sum_numbers(a: float, b: float) -> Dict[str, float]:
@@ -66,7 +106,8 @@ def count_category(category: str) -> Dict[str, int]:
     Returns:
         Dictionary with the count
     """
-    count = len(df[df['category'] == category])
+    dataset = current_dataset()
+    count = dataset.backend.count(_filters(category=category))
     return {"count": count}
 
 def count_intent(intent: str) -> Dict[str, int]:
@@ -79,10 +120,12 @@ def count_intent(intent: str) -> Dict[str, int]:
     Returns:
         Dictionary with the count
     """
-    count = len(df[df['intent'] == intent])
+    dataset = current_dataset()
+    count = dataset.backend.count(_filters(intent=intent))
     return {"count": count}
 
-def show_examples(n: int = 3, intent: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
+def show_examples(n: int = 3, intent: Optional[str] = None, category: Optional[str] = None,
+                  cursor: Optional[str] = None) -> Dict[str, Any]:
     """
     Show n example conversations.
     
@@ -90,25 +133,40 @@ def show_examples(n: int = 3, intent: Optional[str] = None, category: Optional[s
         n: Number of examples to show
         intent: Optional intent to filter by
         category: Optional category to filter by
+        cursor: Optional next_cursor of a previous call, to show the next page of examples
         
     Returns:
         Dictionary with examples
     """
-    filtered_df = df.copy()
-    
-    if intent:
-        filtered_df = filtered_df[filtered_df['intent'] == intent]
-    
-    if category:
-        filtered_df = filtered_df[filtered_df['category'] == category]
-    
-    examples = filtered_df.head(n)[['instruction', 'intent', 'category', 'response']].to_dict('records')
-    
-    return {
+    dataset = current_dataset()
+    offset = 0
+    if cursor:
+        try:
+            state = decode_cursor("show_examples", cursor)
+        except ValueError as e:
+            return {"error": str(e)}
+        if state.pop("dataset", None) != dataset.name:
+            return {"error": f"Cursor does not belong to dataset '{dataset.name}'"}
+        n, intent, category, offset = state["n"], state["intent"], state["category"], state["offset"]
+    
+    positions = dataset.backend.positions(_filters(intent, category))
+    total_matching = len(positions)
+    
+    # Deterministic order per request, near-duplicates of the examples already picked last
+    order = seeded_order(positions, request_seed("show_examples", intent, category),
+                         labels=_response_labels(dataset))
+    chosen, next_offset = page(order, offset, n)
+    examples = dataset.backend.take(chosen, ['instruction', 'intent', 'category', 'response']).to_dict('records')
+    
+    result = {
         "examples": examples,
-        "total_matching": len(filtered_df),
-        "shown": min(n, len(filtered_df))
+        "total_matching": total_matching,
+        "shown": len(examples)
     }
+    if next_offset is not None:
+        result["next_cursor"] = encode_cursor("show_examples", {"dataset": dataset.name, "n": n, "intent": intent,
+                                                               "category": category, "offset": next_offset})
+    return result
 
 def summarize(user_request: str, intent: Optional[str] = None, category: Optional[str] = None) -> Dict[str, str]:
     """
@@ -122,28 +180,41 @@ def summarize(user_request: str, intent: Optional[str] = None, category: Optiona
     Returns:
         Dictionary with the summary
     """
-    import openai
-    import os
+    from agent.llm import get_client
     
+    dataset = current_dataset()
     # Filter the dataset based on intent and category if provided
-    filtered_df = df.copy()
-    
-    if intent:
-        filtered_df = filtered_df[filtered_df['intent'] == intent]
-    
-    if category:
-        filtered_df = filtered_df[filtered_df['category'] == category]
+    positions = dataset.backend.positions(_filters(intent, category))
     
     # Extract relevant data for summarization
-    total_count = len(filtered_df)
+    total_count = len(positions)
     
     if total_count == 0:
         return {"summary": "No data found matching the specified criteria."}
     
     # Sample conversations to send to the LLM
-    # Limit to a reasonable number to avoid token limits
+    # Limit to a reasonable number to avoid token limits, one per near-duplicate response
     sample_size = min(20, total_count)
-    sample_data = filtered_df.sample(sample_size)[['instruction', 'intent', 'category', 'response']]
+    tactics = dataset.tactic_index.tactics.get(intent, []) if intent and dataset.tactic_index is not None else []
+    chosen = np.array([], dtype=np.int64)
+    if tactics:
+        # Representative conversations of every response tactic instead of a random sample
+        per_tactic = max(1, sample_size // len(tactics))
+        chosen = dataset.tactic_index.representatives(intent, per_tactic)
+        chosen = chosen[np.isin(chosen, positions)]
+    if len(chosen) < sample_size:
+        # No tactics, or representatives outside the filter (e.g. another category): fill up with a sample
+        rest = positions[~np.isin(positions, chosen)]
+        seed = request_seed("summarize", intent, category)
+        if dataset.index is not None:
+            # Deterministic sample spread over the intents, one conversation per near-duplicate response
+            sampled = stratified_sample(rest, sample_size - len(chosen), dataset.index.codes["intent"], seed,
+                                        labels=_response_labels(dataset))
+        else:
+            sampled = seeded_sample(rest, sample_size - len(chosen), seed)
+        chosen = np.concatenate([chosen, sampled])
+    sample_size = len(chosen)
+    sample_data = dataset.backend.take(chosen, ['instruction', 'intent', 'category', 'response'])
     
     # Format the data for the LLM
     formatted_data = ""
@@ -152,6 +223,11 @@ def summarize(user_request: str, intent: Optional[str] = None, category: Optiona
         formatted_data += f"Intent: {row['intent']}, Category: {row['category']}\n"
         formatted_data += f"Agent: {row['response']}\n\n"
     
+    if tactics:
+        formatted_data = "Response tactics (share of conversations, distinctive words):\n" + "".join(
+            f"- {tactic['share']:.0%}: {', '.join(tactic['keywords'])}\n" for tactic in tactics
+        ) + "\n" + formatted_data
+    
     # Create a prompt for the LLM
     prompt = f"""Based on the following {sample_size} customer service conversations 
 {f"with intent '{intent}'" if intent else ""} 
@@ -168,14 +244,9 @@ Conversations:
 {formatted_data}
 """
     
-    # Call the OpenAI API for summarization using Nebius endpoint
-    client = openai.OpenAI(
-        base_url="https://api.studio.nebius.com/v1/",
-        api_key=os.environ.get("NEBIUS_API_KEY")
-    )
-    
+    # Call the OpenAI API for summarization using Nebius endpoint (the process-wide client)
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model="Qwen/Qwen3-30B-A3B",  # Using Qwen model
             messages=[
                 {"role": "system", "content": "You are an AI assistant that summarizes customer service conversations."},
@@ -210,16 +281,14 @@ def get_intent_distribution(top_n: int = 10, category: Optional[str] = None) ->
     Returns:
         Dictionary with the intent distribution
     """
-    filtered_df = df.copy()
-    
-    if category:
-        filtered_df = filtered_df[filtered_df['category'] == category]
+    dataset = current_dataset()
+    filters = _filters(category=category)
     
-    intent_counts = filtered_df['intent'].value_counts().head(top_n).to_dict()
+    intent_counts = dataset.backend.value_counts('intent', filters, top_n)
     
     return {
         "intent_distribution": intent_counts,
-        "total_conversations": len(filtered_df),
+        "total_conversations": dataset.backend.count(filters),
         "filter_category": category
     }
 
@@ -233,38 +302,293 @@ def get_category_distribution(top_n: int = 10) -> Dict[str, Any]:
     Returns:
         Dictionary with the category distribution
     """
-    category_counts = df['category'].value_counts().head(top_n).to_dict()
+    dataset = current_dataset()
+    category_counts = dataset.backend.value_counts('category', top_n=top_n)
     
     return {
         "category_distribution": category_counts,
-        "total_conversations": len(df)
+        "total_conversations": dataset.backend.count()
     }
 
-def show_dataframe(data_type: str = "all", limit: int = 20) -> Dict[str, Any]:
+def show_dataframe(data_type: Literal["all", "category", "intent", "instruction", "response"] = "all",
+                   limit: int = 20,
+                   intent: Optional[str] = None,
+                   category: Optional[str] = None,
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
     """
     Show the dataset as a pandas dataframe.
     
     Args:
         data_type: Type of data to show ('all', 'category', 'intent', 'instruction', 'response')
         limit: Maximum number of rows to show
+        intent: Optional intent to filter by
+        category: Optional category to filter by
+        cursor: Optional next_cursor of a previous call, to show the next page of rows
         
     Returns:
         Dictionary with the dataframe data
     """
+    dataset = current_dataset()
+    offset = 0
+    if cursor:
+        try:
+            state = decode_cursor("show_dataframe", cursor)
+        except ValueError as e:
+            return {"error": str(e)}
+        if state.pop("dataset", None) != dataset.name:
+            return {"error": f"Cursor does not belong to dataset '{dataset.name}'"}
+        data_type, limit, intent, category, offset = (state["data_type"], state["limit"], state["intent"],
+                                                      state["category"], state["offset"])
+    
     if data_type == "all":
-        result_df = df.head(limit)
-    elif data_type in df.columns:
-        result_df = df[[data_type]].head(limit)
+        columns = None
+    elif data_type in ("category", "intent", "instruction", "response"):
+        columns = [data_type]
     else:
         return {"error": f"Invalid data_type: {data_type}. Valid options are 'all', 'category', 'intent', 'instruction', 'response'"}
     
+    # Pages are cut from the matching row positions in dataset order
+    positions = dataset.backend.positions(_filters(intent, category))
+    chosen, next_offset = page(positions, offset, limit)
+    result_df = dataset.backend.take(chosen, columns)
+    
     # Convert to dict for JSON serialization
-    return {
+    result = {
         "dataframe": result_df.to_dict('records'),
         "columns": result_df.columns.tolist(),
         "shape": result_df.shape,
+        "total_matching": len(positions),
+        "offset": offset,
         "pandas_df": result_df  # This will be used by the app to display as a pandas dataframe
     }
+    if next_offset is not None:
+        result["next_cursor"] = encode_cursor("show_dataframe", {"dataset": dataset.name, "data_type": data_type,
+                                                                "limit": limit, "intent": intent, "category": category,
+                                                                "offset": next_offset})
+    return result
+
+def flag_crosstab(flags: Optional[List[str]] = None,
+                  match: Literal["all", "any", "none", "exact"] = "all",
+                  by: Literal["intent", "category"] = "category",
+                  per_flag: bool = False,
+                  intent: Optional[str] = None,
+                  category: Optional[str] = None,
+                  top_n: int = 20) -> Dict[str, Any]:
+    """
+    Filter and cross-tabulate conversations by linguistic flags and intent or category.
+    
+    Args:
+        flags: Flag letters or names to filter by, e.g. ['Q', 'typo'] (B basic, C coordinated, E abbreviation, I interrogative, K keyword, L semantic_variation, M morphological_variation, N negation, P polite, Q colloquial, W offensive, Z typo)
+        match: How rows must match the flags: 'all', 'any', 'none' or 'exact' combination
+        by: Column to cross-tabulate the flags against
+        per_flag: Count each flag on its own instead of whole flag combinations
+        intent: Optional intent to filter by
+        category: Optional category to filter by
+        top_n: Number of cross-tab cells to show
+        
+    Returns:
+        Dictionary with the matching count, cross-tab and examples
+    """
+    dataset = current_dataset()
+    if dataset.index is None:
+        return _in_memory_error("flag_crosstab")
+    flag_index = dataset.index.flags
+    if flag_index is None:
+        return {"error": "The dataset has no flags column"}
+    
+    positions = dataset.backend.positions(_filters(intent, category))
+    if flags:
+        try:
+            positions = positions[flag_index.match(flags, match, positions)]
+        except ValueError as e:
+            return {"error": str(e)}
+    
+    crosstab = dataset.index.flag_crosstab(by, positions, per_flag=per_flag)
+    
+    return {
+        "matching": int(len(positions)),
+        "total_conversations": dataset.index.num_rows,
+        "crosstab": crosstab.head(top_n).to_dict('records'),
+        "cells": len(crosstab),
+        "flag_legend": flag_index.legend(),
+        "examples": dataset.backend.take(positions[:3], ['flags', 'instruction', 'intent', 'category']).to_dict('records')
+    }
+
+def duplicate_clusters(column: Literal["instruction", "response"] = "response",
+                       top_n: int = 5,
+                       intent: Optional[str] = None,
+                       category: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Find clusters of near-duplicate (templated) instructions or responses.
+    
+    Args:
+        column: Text column to look for near-duplicates in
+        top_n: Number of largest clusters to show
+        intent: Optional intent to filter by
+        category: Optional category to filter by
+        
+    Returns:
+        Dictionary with the duplicate ratio and the largest clusters with examples
+    """
+    dataset = current_dataset()
+    if dataset.dedup_index is None:
+        return _offline_index_error("duplicate_clusters", dataset, "data.dedup")
+    positions = dataset.backend.positions(_filters(intent, category))
+    clusters = dataset.dedup_index.clusters(column, positions, top_n=top_n)
+    
+    return {
+        "total_conversations": int(len(positions)),
+        "near_duplicate_ratio": round(dataset.dedup_index.duplicate_ratio(column, positions), 3),
+        "clusters": [
+            {"size": cluster["size"], "examples": dataset.backend.take(cluster["positions"][:2], [column])[column].tolist()}
+            for cluster in clusters
+        ]
+    }
+
+def response_tactics(intent: str, examples_per_tactic: int = 2) -> Dict[str, Any]:
+    """
+    Show the main response tactics agents use for an intent, precomputed by clustering the responses.
+    
+    Args:
+        intent: Intent name
+        examples_per_tactic: Number of representative responses per tactic
+        
+    Returns:
+        Dictionary with the tactics, their share of conversations, keywords and examples
+    """
+    dataset = current_dataset()
+    if dataset.tactic_index is None:
+        return _offline_index_error("response_tactics", dataset, "data.tactics")
+    tactics = dataset.tactic_index.tactics.get(intent)
+    if tactics is None:
+        return {"error": f"No response tactics for intent '{intent}'"}
+    
+    return {
+        "intent": intent,
+        "tactics": [
+            {
+                "size": tactic["size"],
+                "share": tactic["share"],
+                "keywords": tactic["keywords"],
+                "examples": dataset.backend.take(np.array(tactic["examples"][:examples_per_tactic], dtype=np.int64),
+                                         ['response'])['response'].tolist()
+            }
+            for tactic in tactics
+        ]
+    }
+
+def text_statistics(column: Literal["instruction", "response"] = "response",
+                    statistic: Literal["chars", "words", "placeholders", "vocabulary"] = "words",
+                    by: Optional[Literal["intent", "category"]] = None,
+                    intent: Optional[str] = None,
+                    category: Optional[str] = None,
+                    bins: int = 10,
+                    top_n: int = 10) -> Dict[str, Any]:
+    """
+    Get statistics of the instruction or response texts: length percentiles and histograms, placeholder usage or vocabulary size.
+    
+    Args:
+        column: Text column to describe
+        statistic: 'chars' or 'words' (length), 'placeholders' (number of {{...}} placeholders per text) or 'vocabulary' (distinct words and placeholders used)
+        by: Optional column to break the statistics down by
+        intent: Optional intent to filter by
+        category: Optional category to filter by
+        bins: Number of histogram bins
+        top_n: Maximum number of groups (and placeholders) to show
+        
+    Returns:
+        Dictionary with the statistics overall and per group
+    """
+    dataset = current_dataset()
+    if dataset.text_stats is None:
+        return _in_memory_error("text_statistics")
+    positions = dataset.backend.positions(_filters(intent, category))
+    if len(positions) == 0:
+        return {"error": "No conversations match the given filters"}
+    
+    groups = {"all": positions}
+    if by:
+        codes = dataset.index.codes[by][positions]
+        sizes = np.bincount(codes[codes >= 0], minlength=len(dataset.index.vocab[by]))
+        for code in np.argsort(-sizes, kind="stable")[:top_n]:
+            if sizes[code] > 0:
+                groups[dataset.index.vocab[by][code]] = positions[codes == code]
+    
+    if statistic == "vocabulary":
+        return {
+            "column": column,
+            "groups": {
+                name: {
+                    "rows": int(len(rows)),
+                    "vocabulary_size": dataset.text_stats.vocabulary_size(column, rows),
+                    "placeholders": dataset.text_stats.placeholder_counts(column, rows, top_n),
+                }
+                for name, rows in groups.items()
+            }
+        }
+    
+    metric = f"{column}_{statistic}"
+    # One set of bin edges, so the group histograms are comparable
+    edges = np.histogram_bin_edges(dataset.text_stats.values(metric, positions), bins=bins)
+    result = {"column": column, "statistic": statistic, "bin_edges": [round(float(e), 1) for e in edges], "groups": {}}
+    for name, rows in groups.items():
+        values = dataset.text_stats.values(metric, rows)
+        histogram, _ = np.histogram(values, bins=edges)
+        result["groups"][name] = {
+            "rows": int(len(values)),
+            "mean": round(float(values.mean()), 1),
+            "percentiles": {f"p{q}": float(v) for q, v in zip(STAT_PERCENTILES, np.percentile(values, STAT_PERCENTILES))},
+            "histogram": histogram.tolist(),
+        }
+    return result
+
+def export_data(file_format: Literal["csv.gz", "parquet"] = "csv.gz",
+                intent: Optional[str] = None,
+                category: Optional[str] = None,
+                contains: Optional[str] = None,
+                columns: Optional[List[Literal["flags", "instruction", "category", "intent", "response"]]] = None) -> Dict[str, Any]:
+    """
+    Export all matching conversations to a compressed file the user can download.
+    
+    Args:
+        file_format: 'csv.gz' or 'parquet'
+        intent: Optional intent to filter by
+        category: Optional category to filter by
+        contains: Optional text that the instruction or response must contain (case-insensitive)
+        columns: Optional columns to export (all if omitted)
+        
+    Returns:
+        Dictionary with the number of exported rows and the file name
+    """
+    dataset = current_dataset()
+    filters = _filters(intent, category)
+    if contains:
+        filters.append(Filter(column=["instruction", "response"], op="contains", value=contains))
+    
+    rows = dataset.backend.count(filters)
+    if rows == 0:
+        return {"error": "No conversations match the given filters"}
+    
+    # Rows are streamed to the file in chunks, the result is never built in memory
+    path = export_to_file(dataset.backend, filters, columns, file_format, name=dataset.name)
+    return {
+        "rows": rows,
+        "format": file_format,
+        "file": os.path.basename(path),
+        "export_path": path  # Used by the app to offer the download, not sent to the model
+    }
+
+def finish(answer: str) -> Dict[str, str]:
+    """
+    Return the final answer.
+    
+    Args:
+        answer: Final answer to the user's question
+        
+    Returns:
+        Dictionary with the answer
+    """
+    return {"answer": answer}
 
 # Map function names to their implementations
 TOOL_FUNCTIONS = {
@@ -278,5 +602,10 @@ TOOL_FUNCTIONS = {
     "get_intent_distribution": get_intent_distribution,
     "get_category_distribution": get_category_distribution,
     "show_dataframe": show_dataframe,
-    "finish": lambda answer: {"answer": answer}
+    "flag_crosstab": flag_crosstab,
+    "duplicate_clusters": duplicate_clusters,
+    "response_tactics": response_tactics,
+    "text_statistics": text_statistics,
+    "export_data": export_data,
+    "finish": finish
 }